@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Adressierung der Geräte im Netz.
+
+'ip'   jedes Gerät hat eine eigene IP (PV_HOST_IPS/WALLBOX_HOST_IPS) auf TCP_PORT,
+       Unit ID 1. Erfordert die Netzwerkkonfiguration aus der README.
+'port' alle Geräte auf einer IP, jedes auf einem eigenen Port ab TCP_PORT.
+'unit' alle Geräte auf einer IP; bis zu 247 Geräte teilen sich einen Listener
+       und werden über die Unit ID (1-247) unterschieden, weitere Geräte
+       belegen die folgenden Ports.
+
+Die Position eines Geräts in der Flotte (index, erst alle PV-Wechselrichter,
+dann alle Wallboxen) bestimmt Port und Unit ID; Simulator und Client
+(modbus2.py) berechnen die Endpunkte mit denselben Funktionen.
+"""
+
+MODES = ('ip', 'port', 'unit')
+MAX_UNITS_PER_LISTENER = 247
+
+
+def endpoint(mode, index, host, base_port):
+    """(host, port, unit_id) des Geräts an Position index; host ist im Modus 'ip' die IP des Geräts."""
+    if mode == 'ip':
+        return host, base_port, 1
+    if mode == 'port':
+        return host, base_port + index, 1
+    listener, unit = divmod(index, MAX_UNITS_PER_LISTENER)
+    return host, base_port + listener, unit + 1
+
+
+def address_label(mode, host, port, unit_id):
+    """Anzeigeadresse eines Geräts, z.B. '10.10.10.120', '127.0.0.1:5023' oder '127.0.0.1:5020/4'."""
+    if mode == 'ip':
+        return host
+    if mode == 'port':
+        return f"{host}:{port}"
+    return f"{host}:{port}/{unit_id}"
+
+
+def fleet_addresses(mode, count, first_index, host, base_port):
+    """Anzeigeadressen für count Geräte ab Flottenposition first_index (Modus 'port' und 'unit')."""
+    return [address_label(mode, *endpoint(mode, first_index + i, host, base_port)) for i in range(count)]
+
+
+def group_by_listener(endpoints):
+    """
+    Fasst (key, (host, port, unit_id)) zu {(host, port): [(unit_id, key), ...]}
+    zusammen, in der Reihenfolge des ersten Auftretens.
+    """
+    listeners = {}
+    for key, (host, port, unit_id) in endpoints:
+        listeners.setdefault((host, port), []).append((unit_id, key))
+    return listeners
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Laufende Summen über die ganze Flotte für den virtuellen Zähler.
+
+FleetAggregate hält Summen (PV-Wirkleistung, Erträge, Ladeleistung und
+-energie der Wallboxen) und Anzahlen je Zustand. apply() verrechnet bei jedem
+commit() des UI-Status nur die geänderten Geräte: der alte Beitrag eines
+Geräts wird abgezogen, der neue addiert. Der Aufwand hängt so von der Zahl
+der geänderten Geräte ab, nicht von der Flottengröße. Geräte mit einer
+reinen Statusmeldung (Initializing, Error) zählen als 'offline' und tragen
+nichts zu den Summen bei.
+"""
+
+# Abschnitt im UI-Status -> (Präfix, summierte Felder, Zustandsfeld, Zustandsnamen)
+SECTIONS = {
+    "servers": ("pv", ("active_power", "daily_yield_wh", "total_yield_kwh"), "operating_state",
+                {1: "standby", 2: "feeding", 3: "fault"}),
+    "wallboxes": ("wallbox", ("charging_power", "charged_energy_wh"), "state",
+                  {1: "ready", 2: "charging", 3: "fault"}),
+}
+OFFLINE = "offline"
+
+
+def state_name(section, record):
+    """Zustandsname eines Geräte-Dicts (Rohwerte), z.B. 'feeding'; ohne Zustand 'offline'."""
+    _, _, state_field, state_names = SECTIONS[section]
+    return state_names.get(record.get(state_field), OFFLINE)
+
+
+class FleetAggregate:
+    """Summen und Zustandszähler je Abschnitt; totals() liefert sie als flaches Dict."""
+
+    def __init__(self):
+        self.sums = {section: [0.0] * len(spec[1]) for section, spec in SECTIONS.items()}
+        self.counts = {section: dict.fromkeys((*spec[3].values(), OFFLINE), 0) for section, spec in SECTIONS.items()}
+        self.on_change = None # on_change(totals) nach jedem apply() mit Änderungen, z.B. für die Zählerregister
+
+    def _account(self, section, record, sign):
+        _, fields, state_field, state_names = SECTIONS[section]
+        state = record.get(state_field)
+        self.counts[section][state_names.get(state, OFFLINE)] += sign
+        if state is None:
+            return
+        sums = self.sums[section]
+        for i, field in enumerate(fields):
+            sums[i] += sign * record[field]
+
+    def apply(self, previous_sections, pending):
+        """
+        Verrechnet die vorgemerkten Geräte-Dicts (pending wie in SnapshotStore)
+        gegen ihren bisherigen Stand in previous_sections und liefert totals().
+        """
+        changed = False
+        for section, updates in pending.items():
+            if section not in SECTIONS:
+                continue
+            previous = previous_sections.get(section, {})
+            for key, record in updates.items():
+                old = previous.get(key)
+                if old is record:
+                    continue
+                if old is not None:
+                    self._account(section, old, -1)
+                self._account(section, record, 1)
+                changed = True
+        totals = self.totals()
+        if changed and self.on_change is not None:
+            self.on_change(totals)
+        return totals
+
+    def totals(self):
+        """Summen, Anzahlen je Zustand und net_power (PV-Erzeugung minus Ladeleistung) in W."""
+        result = {}
+        for section, (prefix, fields, _, _) in SECTIONS.items():
+            for field, value in zip(fields, self.sums[section]):
+                # Summen von Differenzen: Rundungsreste wie -1e-12 nicht als negative Werte zeigen
+                result[f"{prefix}_{field}"] = round(value, 6) + 0.0
+            counts = self.counts[section]
+            result[f"{prefix}_devices"] = sum(counts.values())
+            for state, count in counts.items():
+                result[f"{prefix}_{state}"] = count
+        result["net_power"] = result["pv_active_power"] - result["wallbox_charging_power"]
+        return result
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless Batch-Modus: simuliert die PV- und Wallbox-Flotte ohne Web-UI und
+ohne Modbus-Server in simulierter Zeit.
+
+Die Simulationen (PvSimulation/WallboxSimulation bzw. PvFleetSimulation)
+laufen unverändert über den TickScheduler, dessen Uhr aber nicht die echte
+Zeit ist, sondern eine SimulatedClock, die nach jedem Takt bis zur nächsten
+Deadline vorgestellt wird. Ohne --speed läuft die Simulation so schnell wie
+die CPU erlaubt, mit --speed N mit dem N-fachen der Echtzeit. Die
+Registerstände aller Geräte werden nach jedem Takt als Frame in eine Datei
+geschrieben (frames.py) bzw. spaltenweise aufgezeichnet (recorder.py) und
+der Durchsatz in simulierten Sekunden pro Sekunde Laufzeit ausgegeben.
+
+    python3 batch.py --duration 7d --pv-engine vector --output woche.frames
+    python3 batch.py --duration 2h --speed 60 --start 2024-06-21T04:00
+    python3 batch.py --duration 30d --pv-engine vector --record aufzeichnung/
+"""
+
+import argparse
+import datetime
+import time
+
+import main
+from control import CommandQueue
+from frames import FrameWriter
+from recorder import FrameRecorder
+
+PROGRESS_INTERVAL_SECONDS = 5
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SimulatedClock:
+    """Uhr für den TickScheduler, die nur durch advance() weiterläuft."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def parse_duration(text):
+    """Wandelt '90', '30m', '12h' oder '7d' in Sekunden um."""
+    text = text.strip().lower()
+    unit = DURATION_UNITS.get(text[-1:])
+    if unit is None:
+        return float(text)
+    return float(text[:-1]) * unit
+
+
+def run_batch(duration, output=None, speed=0.0, pv_engine='reference', start=None, start_charging=False,
+              record=None):
+    """
+    Simuliert duration Sekunden ab start (datetime, Standard: jetzt) und liefert
+    die Kennzahlen als Dict. speed=0 bedeutet so schnell wie möglich. output ist
+    eine Frame-Datei, record ein Aufzeichnungsverzeichnis (beides optional).
+    """
+    start = start or datetime.datetime.now()
+    main.publish_ui_status = False
+    main.collect_metrics = False
+    main.simulated_time = start
+    for i in range(len(main.PV_HOST_IPS)):
+        main.fault_flags[i + 1] = False
+    for i in range(len(main.WALLBOX_HOST_IPS)):
+        main.wallbox_commands[i + 1] = CommandQueue()
+        if start_charging:
+            main.wallbox_commands[i + 1].put('start_charging')
+
+    devices = list(main.iter_devices())
+    main.create_register_store()
+    sinks = []
+    try:
+        clock = SimulatedClock()
+        datablocks = main.create_datablocks(devices)
+        scheduler = main.create_tick_scheduler(devices, datablocks, pv_engine, clock=clock)
+        registers = main.register_store.as_array()
+        if output:
+            sinks.append(FrameWriter(output, devices, main.UPDATE_INTERVAL_SECONDS))
+        if record:
+            sinks.append(FrameRecorder(record, devices, main.UPDATE_INTERVAL_SECONDS))
+
+        start_timestamp = start.timestamp()
+        wall_start = time.perf_counter()
+        next_progress = wall_start + PROGRESS_INTERVAL_SECONDS
+        print(f"Batch-Simulation von {len(devices)} Geräten über {duration:.0f} s simulierte Zeit "
+              f"ab {start:%Y-%m-%d %H:%M:%S} ({'max. Geschwindigkeit' if speed <= 0 else f'{speed:g}x Echtzeit'}).")
+        try:
+            while clock.now < duration:
+                main.simulated_time = start + datetime.timedelta(seconds=clock.now)
+                wait = scheduler.run_tick()
+                for sink in sinks:
+                    sink.add(start_timestamp + clock.now, registers)
+                clock.advance(wait)
+
+                wall_now = time.perf_counter()
+                if speed > 0:
+                    delay = wall_start + clock.now / speed - wall_now
+                    if delay > 0:
+                        time.sleep(delay)
+                if wall_now >= next_progress:
+                    next_progress = wall_now + PROGRESS_INTERVAL_SECONDS
+                    elapsed = wall_now - wall_start
+                    print(f"  {clock.now / duration * 100:5.1f} %  {clock.now:.0f} s simuliert, "
+                          f"{clock.now / elapsed:.0f} sim-s/s")
+        except KeyboardInterrupt:
+            print("Batch-Simulation abgebrochen.")
+
+        wall_seconds = time.perf_counter() - wall_start
+        simulated_seconds = min(clock.now, duration)
+        ticks = scheduler.stats.ticks
+        report = {
+            "devices": len(devices),
+            "ticks": ticks,
+            "simulated_seconds": simulated_seconds,
+            "wall_seconds": wall_seconds,
+            "simulated_seconds_per_second": simulated_seconds / wall_seconds if wall_seconds else 0.0,
+            "device_ticks_per_second": ticks * len(devices) / wall_seconds if wall_seconds else 0.0,
+        }
+    finally:
+        for sink in sinks:
+            sink.close()
+        main.register_store.close()
+        main.simulated_time = None
+
+    for sink in sinks:
+        if isinstance(sink, FrameWriter):
+            report["frames_written"] = sink.frames_written
+            report["bytes_written"] = sink.bytes_written
+        else:
+            report["frames_recorded"] = sink.frames_written
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PV- und Wallbox-Simulation in simulierter Zeit (ohne UI und Modbus)")
+    parser.add_argument('--duration', type=parse_duration, default='1d',
+                        help="Simulierte Dauer, z.B. 3600, 30m, 12h, 7d (Standard: 1d)")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="Vielfaches der Echtzeit; 0 = so schnell wie möglich (Standard)")
+    parser.add_argument('--output', metavar='DATEI',
+                        help="Register-Frames aller Takte in diese Datei schreiben (Format: frames.py)")
+    parser.add_argument('--record', metavar='VERZEICHNIS',
+                        help="Register-Frames spaltenweise in diesem Verzeichnis aufzeichnen (recorder.py)")
+    parser.add_argument('--pv-engine', choices=['reference', 'vector'], default='reference',
+                        help="Simulations-Engine für die PV-Wechselrichter")
+    parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=None,
+                        help="Simulierter Startzeitpunkt, z.B. 2024-06-21T04:00 (Standard: jetzt)")
+    parser.add_argument('--interval', type=float, default=main.UPDATE_INTERVAL_SECONDS,
+                        help="Simulierte Sekunden pro Takt (Standard: %(default)s)")
+    parser.add_argument('--start-charging', action='store_true',
+                        help="Alle Wallboxen zu Beginn einen Ladevorgang starten lassen")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    main.UPDATE_INTERVAL_SECONDS = args.interval
+    report = run_batch(args.duration, args.output, args.speed, args.pv_engine, args.start, args.start_charging,
+                       args.record)
+    print(f"{report['ticks']} Takte für {report['devices']} Geräte: {report['simulated_seconds']:.0f} s "
+          f"simuliert in {report['wall_seconds']:.2f} s -> {report['simulated_seconds_per_second']:.0f} "
+          f"simulierte Sekunden pro Sekunde ({report['device_ticks_per_second']:.0f} Geräteschritte/s).")
+    if args.output:
+        print(f"{report['frames_written']} Frames ({report['bytes_written'] / 1024 / 1024:.1f} MB) "
+              f"nach {args.output} geschrieben.")
+    if args.record:
+        print(f"{report['frames_recorded']} Frames in {args.record} aufgezeichnet.")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Latenz des /data-Endpunkts in Abhängigkeit von der Geräteanzahl.
+
+"cold" ist die erste Anfrage nach einem neuen Snapshot (Formatieren und
+Serialisieren), "warm" jede weitere Anfrage derselben Version (aus dem Cache).
+Gemessen wird über den Flask-Testclient, also ohne Netzwerk.
+
+    python3 benchmarks/bench_data_endpoint.py --devices 24,240,2400
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def fill_ui_state(devices):
+    """Legt je halb PV-Wechselrichter und Wallboxen mit typischen Rohwerten an."""
+    pv_count = devices - devices // 2
+    aggregate = main.FleetAggregate()
+    store = main.SnapshotStore(("servers", "wallboxes"),
+                               {"day_cycle_increment": main.day_cycle_increment, "fleet": aggregate.totals()},
+                               derive=lambda sections, pending: {"fleet": aggregate.apply(sections, pending)})
+    store.stage("servers", {i + 1: {
+        "host_ip": f"127.0.1.{i % 250 + 1}", "operating_state": 2, "ac_voltage": 230.0 + random.random(),
+        "ac_current": 11.8, "active_power": 2701.3, "power_factor": 0.988, "frequency": 50.01,
+        "daily_yield_wh": 8123.4, "total_yield_kwh": 18234.5, "device_temperature": 43.2, "fault_code": 0, "dc_power": 2816.6,
+    } for i in range(pv_count)})
+    store.stage("wallboxes", {i + 1: {
+        "host_ip": f"127.0.2.{i % 250 + 1}", "state": 2, "charging_power": 11012.3, "soc": 54.2,
+        "charged_energy_wh": 7312.9, "fault_code": 0,
+    } for i in range(devices // 2)})
+    store.commit()
+    main.ui_state = store
+    return store
+
+
+def run(device_counts, requests=200, versions=20):
+    results = []
+    client = main.app.test_client()
+    for devices in device_counts:
+        store = fill_ui_state(devices)
+        cold = []
+        for _ in range(versions):
+            store.commit(day_cycle_increment=random.uniform(0.1, 10.0)) # neue Version
+            start = time.perf_counter()
+            response = client.get('/data')
+            cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get('/data')
+        warm = (time.perf_counter() - start) / requests
+        cold.sort()
+        results.append({
+            "suite": "data_endpoint",
+            "name": "data",
+            "devices": devices,
+            "cold_ms": cold[len(cold) // 2] * 1000,
+            "warm_ms": warm * 1000,
+            "warm_requests_per_s": 1 / warm,
+            "response_bytes": len(response.data),
+        })
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='24,240,2400', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    for result in run([int(count) for count in args.devices.split(',')], args.requests):
+        print(f"{result['devices']:6d} Geräte: cold {result['cold_ms']:8.2f} ms   warm {result['warm_ms']:6.3f} ms   "
+              f"{result['response_bytes'] / 1024:8.1f} kB")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: FC3-Latenz und -Durchsatz gegen N Modbus-Server auf Loopback-Adressen.
+
+Ein eigener Prozess startet N Geräte (je zur Hälfte PV und Wallbox) im
+asyncio-Modus auf 127.0.0.2, 127.0.0.3, ... (ab 254 Geräten weiter auf
+127.0.1.x usw.), dieser Prozess erzeugt mit modbus2.run_load Last darauf.
+Mit --addressing port oder unit liegen alle Geräte auf 127.0.0.1 (addressing.py).
+
+    python3 benchmarks/bench_modbus.py --devices 24,240 --duration 10 --concurrency 128
+    python3 benchmarks/bench_modbus.py --devices 2400 --addressing unit --connections 16
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import addressing
+import main
+import modbus2
+from control import CommandQueue
+
+STARTUP_TIMEOUT_SECONDS = 120
+LISTEN_HOST = "127.0.0.1"
+
+
+def loopback_ips(count):
+    """count Adressen 127.0.x.y ab 127.0.0.2 (y = 1..254, 127.0.0.1 bleibt frei)."""
+    return [f"127.0.{(i + 1) // 254}.{(i + 1) % 254 + 1}" for i in range(count)]
+
+
+def serve(pv_ips, wallbox_ips, pv_engine, mode, response_cache=True):
+    """Einstiegspunkt des Server-Prozesses (ohne Web-UI)."""
+    main.PV_HOST_IPS, main.WALLBOX_HOST_IPS = pv_ips, wallbox_ips
+    main.RESPONSE_CACHE = response_cache
+    main.configure_addressing(mode, listen_host=LISTEN_HOST)
+    for i in range(len(pv_ips)):
+        main.fault_flags[i + 1] = False
+    for i in range(len(wallbox_ips)):
+        main.wallbox_commands[i + 1] = CommandQueue()
+    asyncio.run(main.serve_all_async(pv_engine=pv_engine))
+
+
+def wait_until_listening(host, port, timeout=STARTUP_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run(device_counts, duration=10.0, concurrency=128, rate=0.0, pv_engine='vector', mode='ip', connections=1,
+        response_cache=True):
+    """
+    connections: Verbindungen je Gerät (ip) bzw. je Listener (port, unit);
+    response_cache=False misst den Server ohne vorkodierte FC3-Antworten.
+    """
+    main.raise_fd_limit()
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for devices in device_counts:
+        ips = loopback_ips(devices)
+        pv_count = devices - devices // 2
+        pv_ips, wallbox_ips = ips[:pv_count], ips[pv_count:]
+        process = context.Process(target=serve, args=(pv_ips, wallbox_ips, pv_engine, mode, response_cache),
+                                  daemon=True)
+        process.start()
+        try:
+            if mode == 'ip':
+                last_endpoint = (ips[-1], main.TCP_PORT)
+                targets = modbus2.build_targets(pv_ips, wallbox_ips, main.TCP_PORT, modbus2.UNIT_ID, connections)
+            else:
+                last_endpoint = addressing.endpoint(mode, devices - 1, LISTEN_HOST, main.TCP_PORT)[:2]
+                targets = modbus2.build_shared_targets(mode, LISTEN_HOST, main.TCP_PORT, pv_count,
+                                                       devices - pv_count, connections)
+            if not wait_until_listening(*last_endpoint):
+                raise RuntimeError(f"Server für {devices} Geräte nicht rechtzeitig gestartet")
+            load = asyncio.run(modbus2.run_load(targets, duration, concurrency, rate, report_interval=0))
+        finally:
+            process.terminate()
+            process.join(timeout=10)
+        name = "fc3_block_read" if mode == 'ip' else f"fc3_block_read_{mode}"
+        results.append({
+            "suite": "modbus",
+            "name": name if response_cache else f"{name}_uncached",
+            "devices": devices,
+            "addressing": mode,
+            "response_cache": response_cache,
+            "connections": load["connections"],
+            "concurrency": concurrency,
+            "target_rate": rate,
+            "requests": load["requests"],
+            "requests_per_s": load["requests_per_s"],
+            "errors": load["errors"] + load["modbus_exceptions"],
+            "mean_ms": load["latency"]["mean_ms"],
+            "p50_ms": load["latency"]["p50_ms"],
+            "p99_ms": load["latency"]["p99_ms"],
+            "max_ms": load["latency"]["max_ms"],
+        })
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='24,240', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=128)
+    parser.add_argument('--rate', type=float, default=0.0)
+    parser.add_argument('--addressing', choices=addressing.MODES, default='ip')
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Verbindungen je Gerät (ip) bzw. je Listener (port, unit)")
+    parser.add_argument('--no-response-cache', dest='response_cache', action='store_false',
+                        help="Server ohne vorkodierte FC3-Antworten (response_cache.py)")
+    args = parser.parse_args()
+
+    for result in run([int(count) for count in args.devices.split(',')], args.duration,
+                      args.concurrency, args.rate, mode=args.addressing, connections=args.connections,
+                      response_cache=args.response_cache):
+        print(f"{result['devices']:6d} Geräte: {result['requests_per_s']:8.0f} Anfragen/s   "
+              f"p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   Fehler {result['errors']}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-Benchmark: Register schreiben pro Zyklus.
+
+Vergleicht den früheren Weg (ein setValues pro Register, 15 Aufrufe für den
+PV-Block, 5 für den Wallbox-Block) mit dem Registerabbild aus register_map.py,
+das jeden Block mit einem einzigen setValues-Aufruf schreibt. Zusätzlich wird
+der Durchsatz von split_32bit_value gemessen, und für jedes Geräteprofil in
+profiles/ die Dauer von encode, decode und encode_array (je Gerät bei einer
+Flotte von FLEET_SIZE Geräten) im Vergleich zum früheren handgeschriebenen
+PV-Abbild.
+
+    python3 benchmarks/bench_register_writes.py --iterations 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+from device_profiles import PROFILE_DIRECTORY, load_profile
+
+from register_map import (
+    VOLTAGE_REGISTER, CURRENT_REGISTER, APPARENT_POWER_REGISTER,
+    ACTIVE_POWER_REGISTER, POWER_FACTOR_REGISTER, REACTIVE_POWER_REGISTER,
+    FREQUENCY_REGISTER, DAILY_YIELD_REGISTER_H, TOTAL_YIELD_REGISTER_H,
+    OPERATING_STATE_REGISTER, DEVICE_TEMP_REGISTER, FAULT_CODE_REGISTER,
+    DC_VOLTAGE_REGISTER, DC_CURRENT_REGISTER, DC_POWER_REGISTER,
+    VOLTAGE_SCALING, CURRENT_SCALING, POWER_FACTOR_SCALING, FREQUENCY_SCALING,
+    TEMP_SCALING, DC_VOLTAGE_SCALING, DC_CURRENT_SCALING,
+    WALLBOX_STATE_REGISTER, CHARGING_POWER_REGISTER, STATE_OF_CHARGE_REGISTER,
+    CHARGED_ENERGY_REGISTER, WALLBOX_FAULT_CODE_REGISTER,
+    PV_BLOCK_START, WALLBOX_BLOCK_START, split_32bit_value,
+    build_pv_register_image, build_wallbox_register_image,
+)
+
+# Typische Messwerte eines einspeisenden Wechselrichters bzw. einer ladenden Wallbox
+PV_VALUES = dict(ac_voltage=230.4, ac_current=11.87, apparent_power=2734.8, active_power=2701.3,
+                 power_factor=0.988, reactive_power=427.1, frequency=50.01, daily_yield_wh=8123.4,
+                 total_yield_kwh=1534.2, operating_state=2, device_temperature=43.2, fault_code=0,
+                 dc_voltage=351.2, dc_current=8.02, dc_power=2816.6)
+WALLBOX_VALUES = dict(state=2, charging_power=11012.3, soc=54.2, charged_energy_wh=7312.9, fault_code=0)
+BATTERY_VALUES = dict(state=2, power=-3120, soc=61.5, voltage=51.2, current=-60.9, temperature=24.5,
+                      charged_energy_wh=812345, discharged_energy_wh=790112, fault_code=0)
+PROFILE_VALUES = {"pv_inverter": PV_VALUES, "wallbox": WALLBOX_VALUES, "battery": BATTERY_VALUES}
+FLEET_SIZE = 2400
+
+
+def handwritten_pv_image(ac_voltage, ac_current, apparent_power, active_power, power_factor,
+                         reactive_power, frequency, daily_yield_wh, total_yield_kwh,
+                         operating_state, device_temperature, fault_code, dc_voltage,
+                         dc_current, dc_power):
+    """Das PV-Abbild, wie register_map.py es vor den Geräteprofilen von Hand aufgebaut hat."""
+    return [
+        int(ac_voltage * VOLTAGE_SCALING),
+        int(ac_current * CURRENT_SCALING),
+        int(apparent_power),
+        int(active_power),
+        int(power_factor * POWER_FACTOR_SCALING),
+        int(reactive_power),
+        int(frequency * FREQUENCY_SCALING),
+        *split_32bit_value(daily_yield_wh),
+        *split_32bit_value(total_yield_kwh),
+        operating_state,
+        int(device_temperature * TEMP_SCALING),
+        fault_code,
+        int(dc_voltage * DC_VOLTAGE_SCALING),
+        int(dc_current * DC_CURRENT_SCALING),
+        int(dc_power),
+    ]
+
+
+def write_pv_per_register(datablock, v):
+    datablock.setValues(VOLTAGE_REGISTER, [int(v["ac_voltage"] * VOLTAGE_SCALING)])
+    datablock.setValues(CURRENT_REGISTER, [int(v["ac_current"] * CURRENT_SCALING)])
+    datablock.setValues(APPARENT_POWER_REGISTER, [int(v["apparent_power"])])
+    datablock.setValues(ACTIVE_POWER_REGISTER, [int(v["active_power"])])
+    datablock.setValues(POWER_FACTOR_REGISTER, [int(v["power_factor"] * POWER_FACTOR_SCALING)])
+    datablock.setValues(REACTIVE_POWER_REGISTER, [int(v["reactive_power"])])
+    datablock.setValues(FREQUENCY_REGISTER, [int(v["frequency"] * FREQUENCY_SCALING)])
+    datablock.setValues(DAILY_YIELD_REGISTER_H, split_32bit_value(v["daily_yield_wh"]))
+    datablock.setValues(TOTAL_YIELD_REGISTER_H, split_32bit_value(v["total_yield_kwh"]))
+    datablock.setValues(OPERATING_STATE_REGISTER, [v["operating_state"]])
+    datablock.setValues(DEVICE_TEMP_REGISTER, [int(v["device_temperature"] * TEMP_SCALING)])
+    datablock.setValues(FAULT_CODE_REGISTER, [v["fault_code"]])
+    datablock.setValues(DC_VOLTAGE_REGISTER, [int(v["dc_voltage"] * DC_VOLTAGE_SCALING)])
+    datablock.setValues(DC_CURRENT_REGISTER, [int(v["dc_current"] * DC_CURRENT_SCALING)])
+    datablock.setValues(DC_POWER_REGISTER, [int(v["dc_power"])])
+
+
+def write_pv_image(datablock, v):
+    datablock.setValues(PV_BLOCK_START, build_pv_register_image(**v))
+
+
+def write_wallbox_per_register(datablock, v):
+    datablock.setValues(WALLBOX_STATE_REGISTER, [v["state"]])
+    datablock.setValues(CHARGING_POWER_REGISTER, [int(v["charging_power"])])
+    datablock.setValues(STATE_OF_CHARGE_REGISTER, [int(v["soc"])])
+    datablock.setValues(CHARGED_ENERGY_REGISTER, split_32bit_value(v["charged_energy_wh"]))
+    datablock.setValues(WALLBOX_FAULT_CODE_REGISTER, [v["fault_code"]])
+
+
+def write_wallbox_image(datablock, v):
+    datablock.setValues(WALLBOX_BLOCK_START, build_wallbox_register_image(**v))
+
+
+def measure(write_func, values, iterations):
+    """Liefert die mittlere Dauer eines Aufrufs von write_func in Mikrosekunden."""
+    datablock = ModbusSequentialDataBlock(0, [0] * 100)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        write_func(datablock, values)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def measure_split(iterations):
+    """Liefert die mittlere Dauer eines split_32bit_value-Aufrufs in Mikrosekunden."""
+    values = [i * 7919 % 4294967296 for i in range(1024)]
+    rounds = max(iterations // len(values), 1)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value in values:
+            split_32bit_value(value)
+    return (time.perf_counter() - start) / (rounds * len(values)) * 1e6
+
+
+def measure_call(func, args, iterations):
+    """Mittlere Dauer von func(*args) in Mikrosekunden."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(*args)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def measure_profiles(iterations):
+    """encode/decode je Profil und encode_array je Gerät einer Flotte mit FLEET_SIZE Geräten."""
+    results = []
+    for filename in sorted(os.listdir(PROFILE_DIRECTORY)):
+        profile = load_profile(os.path.join(PROFILE_DIRECTORY, filename))
+        values = PROFILE_VALUES.get(profile.name)
+        if values is None:
+            continue
+        args = [values[name] for name in profile.field_names]
+        registers = profile.encode(*args)
+        columns = [np.full(FLEET_SIZE, value) for value in args]
+        out = np.zeros((FLEET_SIZE, profile.size), dtype=np.uint16)
+        rounds = max(iterations // FLEET_SIZE, 10)
+        result = {
+            "block": f"profile_{profile.name}",
+            "encode_us": measure_call(profile.encode, args, iterations),
+            "decode_us": measure_call(profile.decode, (registers,), iterations),
+            "fleet_encode_us": measure_call(profile.encode_array, (columns, out), rounds) / FLEET_SIZE,
+        }
+        if profile.name == "pv_inverter":
+            result["handwritten_us"] = measure_call(handwritten_pv_image, args, iterations)
+        results.append(result)
+    return results
+
+
+def run(iterations):
+    """Führt alle Messungen aus und liefert die Ergebnisse als Liste von Dicts."""
+    split_us = measure_split(iterations)
+    results = [{
+        "block": "split_32bit_value",
+        "call_us": split_us,
+        "calls_per_s": 1e6 / split_us,
+    }]
+    for block, values, per_register, image in (
+        ("pv", PV_VALUES, write_pv_per_register, write_pv_image),
+        ("wallbox", WALLBOX_VALUES, write_wallbox_per_register, write_wallbox_image),
+    ):
+        per_register_us = measure(per_register, values, iterations)
+        image_us = measure(image, values, iterations)
+        results.append({
+            "block": block,
+            "per_register_us": per_register_us,
+            "image_us": image_us,
+            "speedup": per_register_us / image_us,
+        })
+    return results + measure_profiles(iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    split_result, *results = run(args.iterations)
+    print(f"split_32bit_value: {split_result['call_us']:.3f} µs/Aufruf ({split_result['calls_per_s']:.0f}/s)")
+    for result in results:
+        if result['block'].startswith("profile_"):
+            handwritten = (f"   handgeschrieben {result['handwritten_us']:6.2f} µs"
+                           if "handwritten_us" in result else "")
+            print(f"{result['block']:20s} encode {result['encode_us']:6.2f} µs   decode {result['decode_us']:6.2f} µs   "
+                  f"Flotte {result['fleet_encode_us']:6.3f} µs/Gerät{handwritten}")
+            continue
+        print(f"{result['block']:8s} einzeln: {result['per_register_us']:7.2f} µs/Zyklus   "
+              f"Abbild: {result['image_us']:7.2f} µs/Zyklus   Faktor {result['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
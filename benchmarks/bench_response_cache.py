@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: FC3-Durchsatz mit vielen pollenden Clients, mit und ohne
+vorkodierte Antworten (response_cache.py).
+
+Für jede Flottengröße startet der Server (wie in bench_modbus.py) einmal mit
+--no-response-cache und einmal mit Cache; --clients Prozesse lesen dann
+gleichzeitig die Blöcke PV 1-17 und Wallbox 20-26 aller Geräte, damit nicht
+ein einzelner Lastgenerator das Ergebnis begrenzt. Beide Läufe nutzen
+Verbindungen mit je einer offenen Anfrage (modbus2.MAX_IN_FLIGHT), damit der
+Vergleich die Kosten der Antwort misst und nicht das Pipelining, das
+pymodbus ohne Cache nicht bearbeitet.
+
+    python3 benchmarks/bench_response_cache.py --devices 24,240 --clients 4 --duration 10
+    python3 benchmarks/bench_response_cache.py --devices 1000 --addressing unit --connections 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import addressing
+import main
+import modbus2
+
+import bench_modbus
+
+
+def build_targets(mode, devices, connections):
+    ips = bench_modbus.loopback_ips(devices)
+    pv_count = devices - devices // 2
+    if mode == 'ip':
+        return modbus2.build_targets(ips[:pv_count], ips[pv_count:], main.TCP_PORT, modbus2.UNIT_ID, connections,
+                                     modbus2.MAX_IN_FLIGHT)
+    return modbus2.build_shared_targets(mode, bench_modbus.LISTEN_HOST, main.TCP_PORT, pv_count,
+                                        devices - pv_count, connections, modbus2.MAX_IN_FLIGHT)
+
+
+def client(mode, devices, connections, duration, concurrency, results):
+    """Einstiegspunkt eines Client-Prozesses: liefert das Ergebnis von run_load über results."""
+    load = asyncio.run(modbus2.run_load(build_targets(mode, devices, connections), duration, concurrency,
+                                        report_interval=0))
+    results.put((load["histogram"], load["errors"] + load["modbus_exceptions"], load["duration_s"]))
+
+
+def merge_histograms(histograms):
+    merged = modbus2.LatencyHistogram()
+    for histogram in histograms:
+        merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+        merged.count += histogram.count
+        merged.total += histogram.total
+        merged.max = max(merged.max, histogram.max)
+    return merged
+
+
+def measure(devices, response_cache, clients, duration, concurrency, mode, connections):
+    context = multiprocessing.get_context('spawn')
+    ips = bench_modbus.loopback_ips(devices)
+    pv_count = devices - devices // 2
+    server = context.Process(target=bench_modbus.serve, daemon=True,
+                             args=(ips[:pv_count], ips[pv_count:], 'vector', mode, response_cache))
+    server.start()
+    try:
+        if mode == 'ip':
+            last_endpoint = (ips[-1], main.TCP_PORT)
+        else:
+            last_endpoint = addressing.endpoint(mode, devices - 1, bench_modbus.LISTEN_HOST, main.TCP_PORT)[:2]
+        if not bench_modbus.wait_until_listening(*last_endpoint):
+            raise RuntimeError(f"Server für {devices} Geräte nicht rechtzeitig gestartet")
+        results = context.Queue()
+        processes = [context.Process(target=client, daemon=True,
+                                     args=(mode, devices, connections, duration, concurrency, results))
+                     for _ in range(clients)]
+        for process in processes:
+            process.start()
+        loads = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.join(timeout=10)
+    histogram = merge_histograms(load[0] for load in loads)
+    latency = histogram.summary()
+    elapsed = max(load[2] for load in loads)
+    return {
+        "suite": "response_cache",
+        "name": "fc3_cached" if response_cache else "fc3_uncached",
+        "devices": devices,
+        "addressing": mode,
+        "clients": clients,
+        "concurrency": clients * concurrency,
+        "requests": histogram.count,
+        "requests_per_s": histogram.count / elapsed if elapsed else 0.0,
+        "errors": sum(load[1] for load in loads),
+        "p50_ms": latency["p50_ms"],
+        "p99_ms": latency["p99_ms"],
+    }
+
+
+def run(device_counts, duration=10.0, clients=4, concurrency=64, mode='ip', connections=1):
+    """
+    Je Flottengröße ein Ergebnis ohne und eines mit Cache; letzteres mit
+    speedup gegenüber ersterem und dessen Fehlern (uncached_errors).
+    """
+    main.raise_fd_limit()
+    results = []
+    for devices in device_counts:
+        uncached = measure(devices, False, clients, duration, concurrency, mode, connections)
+        cached = measure(devices, True, clients, duration, concurrency, mode, connections)
+        if uncached["requests_per_s"]:
+            cached["speedup"] = cached["requests_per_s"] / uncached["requests_per_s"]
+        cached["uncached_errors"] = uncached["errors"]
+        results += [uncached, cached]
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='24,240', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=4, help="Client-Prozesse")
+    parser.add_argument('--concurrency', type=int, default=64, help="Parallele Anfragen je Client-Prozess")
+    parser.add_argument('--addressing', choices=addressing.MODES, default='ip')
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Verbindungen je Gerät (ip) bzw. je Listener (port, unit) und Client")
+    args = parser.parse_args()
+
+    for result in run([int(count) for count in args.devices.split(',')], args.duration, args.clients,
+                      args.concurrency, args.addressing, args.connections):
+        speedup = ""
+        if "speedup" in result:
+            speedup = f"   {result['speedup']:.2f}x (Fehler ohne Cache {result['uncached_errors']})"
+        print(f"{result['devices']:6d} Geräte {result['name']:13s} {result['requests_per_s']:8.0f} Anfragen/s   "
+              f"p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   Fehler {result['errors']}{speedup}")
+
+
+if __name__ == "__main__":
+    main_cli()
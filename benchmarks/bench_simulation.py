@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Kosten eines Simulationstakts pro Gerät.
+
+Misst PvSimulation.step (Referenzmodus), PvFleetSimulation.step (vektorisiert)
+und WallboxSimulation.step (im Ladevorgang) jeweils inklusive Registerabbild und
+UI-Status, wie ein Takt des TickScheduler sie ausführt.
+
+    python3 benchmarks/bench_simulation.py --devices 24,240,2400 --ticks 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+import main
+from shared_store import REGISTERS_PER_DEVICE
+
+
+def _datablocks(count):
+    return [ModbusSequentialDataBlock(0, [0] * REGISTERS_PER_DEVICE) for _ in range(count)]
+
+
+def _measure_ticks(tick, ticks, rounds=3):
+    """Beste mittlere Taktdauer aus rounds Durchgängen (kleine Flotten schwanken stark)."""
+    tick() # Aufwärmen
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(ticks):
+            tick()
+            main.ui_state.commit()
+        best = min(best, (time.perf_counter() - start) / ticks)
+    return best
+
+
+def bench_pv_reference(devices, ticks):
+    simulations = [main.PvSimulation(i + 1, f"127.0.1.{i % 250 + 1}") for i in range(devices)]
+    datablocks = _datablocks(devices)
+
+    def tick():
+        for simulation, datablock in zip(simulations, datablocks):
+            simulation.step(datablock, main.UPDATE_INTERVAL_SECONDS)
+    return _measure_ticks(tick, ticks)
+
+
+def bench_pv_vector(devices, ticks):
+    simulation = main.PvFleetSimulation(range(1, devices + 1), [f"127.0.1.{i % 250 + 1}" for i in range(devices)])
+    datablocks = _datablocks(devices)
+    return _measure_ticks(lambda: simulation.step(datablocks, main.UPDATE_INTERVAL_SECONDS), ticks)
+
+
+def bench_wallbox(devices, ticks):
+    simulations = []
+    for i in range(devices):
+        simulation = main.WallboxSimulation(i + 1, f"127.0.2.{i % 250 + 1}")
+        simulation.state, simulation.soc = 2, 20 # Ladevorgang: teuerster Zweig
+        simulations.append(simulation)
+    datablocks = _datablocks(devices)
+
+    def tick():
+        for simulation, datablock in zip(simulations, datablocks):
+            simulation.step(datablock, main.UPDATE_INTERVAL_SECONDS)
+    return _measure_ticks(tick, ticks)
+
+
+BENCHMARKS = (
+    ("pv_reference", bench_pv_reference),
+    ("pv_vector", bench_pv_vector),
+    ("wallbox", bench_wallbox),
+)
+
+
+def run(device_counts, ticks=20):
+    """Liefert je Simulation und Geräteanzahl die Taktdauer und die Kosten pro Gerät."""
+    results = []
+    for devices in device_counts:
+        main.ui_state = main.SnapshotStore(("servers", "wallboxes"), {"day_cycle_increment": main.day_cycle_increment})
+        for name, bench in BENCHMARKS:
+            tick_seconds = bench(devices, ticks)
+            results.append({
+                "suite": "simulation",
+                "name": name,
+                "devices": devices,
+                "tick_ms": tick_seconds * 1000,
+                "per_device_us": tick_seconds / devices * 1e6,
+                "device_steps_per_s": devices / tick_seconds,
+            })
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='24,240,2400', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--ticks', type=int, default=20)
+    args = parser.parse_args()
+
+    for result in run([int(count) for count in args.devices.split(',')], args.ticks):
+        print(f"{result['name']:13s} {result['devices']:6d} Geräte: {result['tick_ms']:9.2f} ms/Takt "
+              f"{result['per_device_us']:8.2f} µs/Gerät")
+
+
+if __name__ == "__main__":
+    main_cli()
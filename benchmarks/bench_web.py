@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lasttest: /data-Latenz unter gleichzeitigen Clients je Web-Server (web_serving.py).
+
+Ein eigener Prozess füllt den UI-Status mit N Geräten, veröffentlicht wie der
+Simulationstakt jede Sekunde eine neue Version und bedient die Flask-App mit
+waitress, dem Thread-Server von werkzeug oder dem Entwicklungsserver. Dabei
+misst er, wie spät sein Takt-Thread aufwacht. --clients Prozesse mit je
+--concurrency Threads fragen über persistente Verbindungen ab:
+
+    plain        GET /data ohne gzip und ETag (wie vor web_serving.py)
+    full         GET /data mit Accept-Encoding: gzip
+    conditional  wie full, mit If-None-Match der letzten Antwort (304 bis zur nächsten Version)
+    page         GET /data?type=wallbox&ids=...&limit=50 (zufälliger ID-Bereich)
+
+    python3 benchmarks/bench_web.py --devices 240,2400 --clients 2 --concurrency 8 --duration 5
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main
+import modbus2
+import web_serving
+
+import bench_data_endpoint
+import bench_modbus
+import bench_response_cache
+
+HOST = "127.0.0.1"
+PORT = 5090
+SCENARIOS = ("plain", "full", "conditional", "page")
+TICK_SECONDS = 1.0
+PAGE_SIZE = 50
+
+
+def serve(devices, server, stop, results):
+    """Einstiegspunkt des Server-Prozesses; meldet am Ende die Verspätungen des Takt-Threads."""
+    store = bench_data_endpoint.fill_ui_state(devices)
+    web = threading.Thread(target=web_serving.serve, args=(main.app, HOST, PORT, server, main.UI_THREADS),
+                           daemon=True)
+    web.start()
+    lateness = modbus2.LatencyHistogram()
+    deadline = time.monotonic()
+    while not stop.is_set():
+        deadline += TICK_SECONDS
+        time.sleep(max(deadline - time.monotonic(), 0))
+        lateness.add(max(time.monotonic() - deadline, 0))
+        for section, devices_in_section in store.current.sections.items():
+            # neue Dicts für alle Geräte wie nach einem Takt der Simulationen
+            store.stage(section, {key: dict(record, fault_code=0) for key, record in devices_in_section.items()})
+        store.commit()
+    results.put(lateness)
+
+
+def client(scenario, devices, concurrency, duration, results):
+    """Einstiegspunkt eines Client-Prozesses: concurrency Threads mit je einer Verbindung."""
+    histograms = []
+    totals = {"errors": 0, "bytes": 0, "not_modified": 0}
+    lock = threading.Lock()
+    end = time.monotonic() + duration
+    wallboxes = devices // 2
+
+    def worker():
+        connection = http.client.HTTPConnection(HOST, PORT, timeout=30)
+        etag = None
+        local = modbus2.LatencyHistogram()
+        errors = received = not_modified = 0
+        while time.monotonic() < end:
+            path = "/data"
+            headers = {} if scenario == "plain" else {"Accept-Encoding": "gzip"}
+            if scenario == "page":
+                first = random.randint(1, max(wallboxes - PAGE_SIZE, 1))
+                path = f"/data?type=wallbox&ids={first}-{first + PAGE_SIZE - 1}&limit={PAGE_SIZE}"
+            elif scenario == "conditional" and etag:
+                headers["If-None-Match"] = etag
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                continue
+            local.add(time.perf_counter() - start)
+            if response.status == 304:
+                not_modified += 1
+            elif response.status != 200:
+                errors += 1
+            etag = response.getheader("ETag") or etag
+            received += len(body)
+        connection.close()
+        with lock:
+            histograms.append(local)
+            totals["errors"] += errors
+            totals["bytes"] += received
+            totals["not_modified"] += not_modified
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((bench_response_cache.merge_histograms(histograms), totals))
+
+
+def measure(devices, server, scenario, clients, concurrency, duration):
+    context = multiprocessing.get_context('spawn')
+    stop, server_results, client_results = context.Event(), context.Queue(), context.Queue()
+    process = context.Process(target=serve, args=(devices, server, stop, server_results), daemon=True)
+    process.start()
+    try:
+        if not bench_modbus.wait_until_listening(HOST, PORT):
+            raise RuntimeError(f"Web-Server {server} nicht rechtzeitig gestartet")
+        processes = [context.Process(target=client, daemon=True,
+                                     args=(scenario, devices, concurrency, duration, client_results))
+                     for _ in range(clients)]
+        for client_process in processes:
+            client_process.start()
+        loads = [client_results.get() for _ in processes]
+        for client_process in processes:
+            client_process.join()
+        stop.set()
+        lateness = server_results.get(timeout=30)
+    finally:
+        process.terminate()
+        process.join(timeout=10)
+    histogram = bench_response_cache.merge_histograms(load[0] for load in loads)
+    latency = histogram.summary()
+    return {
+        "suite": "web",
+        "name": f"{server}_{scenario}",
+        "devices": devices,
+        "clients": clients,
+        "concurrency": clients * concurrency,
+        "requests": histogram.count,
+        "requests_per_s": histogram.count / duration,
+        "errors": sum(load[1]["errors"] for load in loads),
+        "not_modified": sum(load[1]["not_modified"] for load in loads),
+        "bytes_per_request": sum(load[1]["bytes"] for load in loads) / histogram.count if histogram.count else 0,
+        "p50_ms": latency["p50_ms"],
+        "p99_ms": latency["p99_ms"],
+        "tick_lateness_p99_ms": lateness.percentile(0.99) * 1000,
+        "tick_lateness_max_ms": lateness.max * 1000,
+    }
+
+
+def run(device_counts, duration=5.0, clients=2, concurrency=8, servers=web_serving.SERVERS, scenarios=SCENARIOS):
+    results = []
+    for devices in device_counts:
+        for server in servers:
+            for scenario in scenarios:
+                results.append(measure(devices, server, scenario, clients, concurrency, duration))
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', default='240,2400', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--clients', type=int, default=2, help="Client-Prozesse")
+    parser.add_argument('--concurrency', type=int, default=8, help="Verbindungen je Client-Prozess")
+    parser.add_argument('--servers', default=','.join(web_serving.SERVERS))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    args = parser.parse_args()
+
+    for result in run([int(count) for count in args.devices.split(',')], args.duration, args.clients,
+                      args.concurrency, args.servers.split(','), args.scenarios.split(',')):
+        print(f"{result['devices']:6d} Geräte {result['name']:22s} {result['requests_per_s']:7.0f} Anfragen/s   "
+              f"p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   "
+              f"{result['bytes_per_request'] / 1024:7.1f} kB   Takt p99 {result['tick_lateness_p99_ms']:6.1f} ms   "
+              f"Fehler {result['errors']}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Führt alle Benchmarks für mehrere Flottengrößen aus und schreibt die
+Ergebnisse mit Umgebungsdaten (Python, Plattform, Git-Commit, Paketversionen)
+als JSON. Mit --compare wird gegen eine frühere Ergebnisdatei verglichen und
+jede Kennzahl markiert, die sich um mehr als --threshold verschlechtert hat.
+
+    python3 benchmarks/run_benchmarks.py --devices 24,240,2400 --output results.json
+    python3 benchmarks/run_benchmarks.py --devices 24,240 --compare results.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy
+import pymodbus
+
+import addressing
+
+import bench_data_endpoint
+import bench_modbus
+import bench_register_writes
+import bench_response_cache
+import bench_simulation
+import bench_web
+
+SUITES = ("register_writes", "simulation", "data_endpoint", "modbus", "response_cache", "web")
+DEFAULT_THRESHOLD = 0.10
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "numpy": numpy.__version__,
+        "pymodbus": pymodbus.__version__,
+    }
+
+
+def run_suites(suites, device_counts, args):
+    results = []
+    if "register_writes" in suites:
+        for result in bench_register_writes.run(args.iterations):
+            block = result.pop("block")
+            results.append({"suite": "register_writes", "name": block, "devices": None, **result})
+    if "simulation" in suites:
+        results += bench_simulation.run(device_counts, args.ticks)
+    if "data_endpoint" in suites:
+        results += bench_data_endpoint.run(device_counts)
+    if "modbus" in suites:
+        results += bench_modbus.run(device_counts, args.modbus_duration, args.concurrency,
+                                    mode=args.addressing, connections=args.connections)
+    if "response_cache" in suites:
+        results += bench_response_cache.run(device_counts, args.modbus_duration, args.clients,
+                                            max(args.concurrency // args.clients, 1), args.addressing,
+                                            args.connections)
+    if "web" in suites:
+        results += bench_web.run(device_counts, args.web_duration, args.clients)
+    return results
+
+
+def metric_direction(name):
+    """+1 wenn größer besser ist, -1 wenn kleiner besser ist, None für reine Angaben."""
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith(("_us", "_ms")):
+        return -1
+    return None
+
+
+def result_key(result):
+    return (result["suite"], result["name"], result.get("devices"))
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Liefert je vergleichbarer Kennzahl (key, metric, alt, neu, relative Änderung, verschlechtert)."""
+    old_results = {result_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in results:
+        old = old_results.get(result_key(result))
+        if old is None:
+            continue
+        for metric, value in result.items():
+            direction = metric_direction(metric)
+            old_value = old.get(metric)
+            if direction is None or not old_value or not isinstance(value, (int, float)):
+                continue
+            change = (value - old_value) / old_value
+            rows.append((result_key(result), metric, old_value, value, change, change * direction < -threshold))
+    return rows
+
+
+def print_results(results):
+    for result in results:
+        metrics = "   ".join(f"{metric} {value:.4g}" for metric, value in result.items()
+                             if metric_direction(metric) is not None)
+        devices = "" if result.get("devices") is None else f"{result['devices']} Geräte"
+        print(f"{result['suite']:15s} {result['name']:22s} {devices:12s} {metrics}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark-Suite des Simulators")
+    parser.add_argument('--devices', default='24,240,2400', help="Geräteanzahlen, kommagetrennt")
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"Auswahl aus {', '.join(SUITES)}")
+    parser.add_argument('--iterations', type=int, default=100000, help="Wiederholungen der Register-Messungen")
+    parser.add_argument('--ticks', type=int, default=20, help="Takte je Simulationsmessung")
+    parser.add_argument('--modbus-duration', type=float, default=10.0, help="Sekunden Last je Flottengröße")
+    parser.add_argument('--concurrency', type=int, default=128, help="Parallele Anfragen im Modbus-Benchmark")
+    parser.add_argument('--clients', type=int, default=4,
+                        help="Client-Prozesse im Cache-Benchmark (teilen sich --concurrency) und im Web-Lasttest")
+    parser.add_argument('--web-duration', type=float, default=5.0,
+                        help="Sekunden Last je Web-Server und Szenario im Web-Lasttest")
+    parser.add_argument('--addressing', choices=addressing.MODES, default='ip',
+                        help="Adressierung der Geräte im Modbus-Benchmark (addressing.py)")
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Verbindungen je Gerät (ip) bzw. je Listener (port, unit) im Modbus-Benchmark")
+    parser.add_argument('--output', help="Ergebnisse als JSON schreiben")
+    parser.add_argument('--compare', help="Frühere Ergebnisdatei zum Vergleich")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative Verschlechterung, ab der eine Kennzahl markiert wird")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unbekannte Suite(s): {', '.join(sorted(unknown))}")
+    device_counts = [int(count) for count in args.devices.split(',')]
+
+    report = {"environment": environment(), "devices": device_counts,
+              "results": run_suites(suites, device_counts, args)}
+    print_results(report["results"])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Ergebnisse in {args.output} gespeichert.")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report["results"], baseline, args.threshold)
+        regressions = [row for row in rows if row[5]]
+        print(f"\nVergleich mit {args.compare} (Commit {baseline['environment'].get('git_commit')}):")
+        for (suite, name, devices), metric, old, new, change, regressed in rows:
+            marker = "  <-- VERSCHLECHTERT" if regressed else ""
+            print(f"{suite:15s} {name:22s} {devices if devices is not None else '':>6} {metric:22s} "
+                  f"{old:12.4g} -> {new:12.4g} ({change:+.1%}){marker}")
+        print(f"{len(regressions)} von {len(rows)} Kennzahlen um mehr als {args.threshold:.0%} verschlechtert.")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Verbindungsgrenzen und Gegendruck für die Modbus-Listener.
+
+Ein Client, der sehr viele Verbindungen öffnet, nie schließt oder ohne Pause
+fragt, soll nicht die Dateideskriptoren und die Event-Loop der ganzen Flotte
+belegen. LimitedModbusTcpServer setzt dafür die Grenzen aus ConnectionLimits
+durch:
+
+* Verbindungen über max_connections (je Prozess) oder max_per_listener
+  werden direkt nach dem Annehmen wieder geschlossen.
+* Verbindungen ohne Anfrage seit idle_timeout Sekunden werden geschlossen.
+* client_rate begrenzt die Anfragen je Client-IP und Listener pro Sekunde
+  (Token Bucket, Vorrat für eine Sekunde); alle Verbindungen einer IP teilen
+  sich den Vorrat, ein neuer Verbindungsaufbau füllt ihn also nicht auf.
+* Höchstens max_pending Anfragen je Listener warten auf pymodbus.
+
+Abgewiesene Anfragen bekommen sofort die Modbus-Exception 0x06 (Server
+Device Busy). Die Zähler stehen in ConnectionLimits.counts().
+"""
+
+import struct
+import threading
+import time
+
+from pymodbus.constants import ExcCodes
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server.requesthandler import ServerRequestHandler
+
+MAX_CONNECTIONS = 4096
+MAX_CONNECTIONS_PER_LISTENER = 256
+IDLE_TIMEOUT_SECONDS = 120.0
+MAX_PENDING_REQUESTS = 128
+MIN_REAP_INTERVAL_SECONDS = 1.0
+
+# MBAP-Kopf und Funktionscode: Transaktions-ID, Protokoll, Länge, Unit ID, FC
+_HEADER = struct.Struct('>HHHBB')
+_EXCEPTION = struct.Struct('>HHHBBB')
+
+COUNTERS = ("accepted", "rejected_global", "rejected_listener", "reaped_idle", "busy_rate", "busy_queue")
+
+
+def busy_response(data, offset):
+    """Exception-Antwort 0x06 auf die Anfrage bei data[offset:]."""
+    transaction_id, _, _, unit_id, function_code = _HEADER.unpack_from(data, offset)
+    return _EXCEPTION.pack(transaction_id, 0, 3, unit_id, function_code | 0x80, ExcCodes.DEVICE_BUSY)
+
+
+class ConnectionLimits:
+    """
+    Grenzen und Zähler aller LimitedModbusTcpServer eines Prozesses (und
+    gemeldete Zähler der Shards). 0 schaltet eine Grenze ab.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_per_listener=MAX_CONNECTIONS_PER_LISTENER,
+                 idle_timeout=IDLE_TIMEOUT_SECONDS, client_rate=0.0, max_pending=MAX_PENDING_REQUESTS):
+        self.max_connections = max_connections
+        self.max_per_listener = max_per_listener
+        self.idle_timeout = idle_timeout
+        self.client_rate = client_rate
+        self.max_pending = max_pending
+        self.open = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.remote = {} # z.B. Shard-ID -> Zähler aus counts() des Shards
+        self.lock = threading.Lock() # Threads-Modus: eine Event-Loop je Listener
+
+    def settings(self):
+        """Grenzen als Keyword-Argumente, z.B. für die Worker-Prozesse in shards.py."""
+        return {"max_connections": self.max_connections, "max_per_listener": self.max_per_listener,
+                "idle_timeout": self.idle_timeout, "client_rate": self.client_rate,
+                "max_pending": self.max_pending}
+
+    def admit(self, server):
+        """Nimmt eine Verbindung an (True) oder zählt sie als abgewiesen."""
+        with self.lock:
+            if self.max_connections and self.open >= self.max_connections:
+                self.counters["rejected_global"] += 1
+                return False
+            if self.max_per_listener and server.open_connections >= self.max_per_listener:
+                self.counters["rejected_listener"] += 1
+                return False
+            self.open += 1
+            server.open_connections += 1
+            self.counters["accepted"] += 1
+            return True
+
+    def release(self, server):
+        with self.lock:
+            self.open -= 1
+            server.open_connections -= 1
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def counts(self):
+        totals = dict(self.counters, open=self.open)
+        for remote in list(self.remote.values()):
+            for name in totals:
+                totals[name] += remote.get(name, 0)
+        return totals
+
+
+class LimitedRequestHandler(ServerRequestHandler):
+    """
+    Prüft jede vollständige Anfrage am Anfang des Empfangspuffers gegen die
+    Grenzen des Servers; cached_answer() kann sie direkt beantworten, sonst
+    geht sie an pymodbus (wie dort nur eine Anfrage je Aufruf).
+    """
+
+    def __init__(self, owner, trace_packet, trace_pdu, trace_connect):
+        super().__init__(owner, trace_packet, trace_pdu, trace_connect)
+        self.admitted = False
+        self.last_activity = time.monotonic()
+        self.bucket = None # [Vorrat, Zeitpunkt, Verbindungen] der Client-IP, falls client_rate gesetzt
+
+    def callback_connected(self):
+        server = self.server
+        if not server.limits.admit(server):
+            self.close() # ohne callback_disconnected, die Verbindung erscheint nicht in den Metriken
+            return
+        self.admitted = True
+        if server.limits.client_rate:
+            peer = self.transport.get_extra_info('peername')
+            host = peer[0] if peer else None
+            self.bucket = server.buckets.setdefault(host, [server.limits.client_rate, time.monotonic(), 0])
+            self.bucket[2] += 1
+        super().callback_connected()
+
+    def callback_disconnected(self, exc):
+        if self.admitted:
+            self.admitted = False
+            self.server.limits.release(self.server)
+            if self.bucket is not None:
+                self.bucket[2] -= 1
+        super().callback_disconnected(exc)
+
+    def take_token(self):
+        """False, wenn die Client-IP ihr Anfragekontingent ausgeschöpft hat."""
+        bucket = self.bucket
+        if bucket is None:
+            return True
+        rate = self.server.limits.client_rate
+        now = time.monotonic()
+        tokens = min(bucket[0] + (now - bucket[1]) * rate, max(rate, 1.0))
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1.0
+        return True
+
+    def cached_answer(self, data, offset):
+        """Antwort ab dem Protokollfeld auf die Anfrage bei data[offset:] oder None (für pymodbus)."""
+        return None
+
+    def reject(self, data, offset, reason, addr):
+        self.server.limits.count(reason)
+        self.low_level_send(busy_response(data, offset), addr=addr)
+
+    def callback_data(self, data, addr=None):
+        self.last_activity = time.monotonic()
+        server = self.server
+        used = 0
+        while len(data) - used >= _HEADER.size:
+            _, protocol, length, _, _ = _HEADER.unpack_from(data, used)
+            size = 6 + length
+            if protocol or length < 2 or len(data) - used < size:
+                break # ungültig (pymodbus antwortet) oder unvollständig (wartet auf den Rest)
+            if not self.take_token():
+                self.reject(data, used, "busy_rate", addr)
+                used += size
+                continue
+            response = self.cached_answer(data, used)
+            if response is not None:
+                self.low_level_send(data[used:used + 2] + response, addr=addr)
+                used += size
+                continue
+            if server.limits.max_pending and server.pending >= server.limits.max_pending:
+                self.reject(data, used, "busy_queue", addr)
+                used += size
+                continue
+            break
+        if used == len(data):
+            return used
+        used += super().callback_data(data[used:], addr)
+        if self.last_pdu:
+            server.pending += 1 # wieder abgezogen, wenn handle_request() fertig ist
+        return used
+
+    async def handle_request(self):
+        try:
+            await super().handle_request()
+        finally:
+            self.server.pending -= 1
+
+
+class LimitedModbusTcpServer(ModbusTcpServer):
+    """
+    ModbusTcpServer mit den Grenzen aus limits (eine ConnectionLimits je
+    Prozess). tracers() liefert optional je Verbindung eigene (trace_pdu,
+    trace_connect), z.B. aus metrics.modbus_tracers().
+    """
+
+    handler_class = LimitedRequestHandler
+
+    def __init__(self, context, limits=None, tracers=None, **kwargs):
+        super().__init__(context, **kwargs)
+        self.limits = limits or ConnectionLimits(0, 0, 0.0, 0.0, 0)
+        self.tracers = tracers
+        self.open_connections = 0
+        self.pending = 0
+        self.buckets = {} # Client-IP -> [Vorrat, Zeitpunkt, offene Verbindungen]
+        self.reaper = None
+
+    def callback_new_connection(self):
+        if self.reaper is None and (self.limits.idle_timeout or self.limits.client_rate):
+            self.schedule_reap()
+        trace_pdu, trace_connect = self.tracers() if self.tracers else (self.trace_pdu, self.trace_connect)
+        return self.handler_class(self, self.trace_packet, trace_pdu, trace_connect)
+
+    def schedule_reap(self):
+        interval = max(self.limits.idle_timeout / 4, MIN_REAP_INTERVAL_SECONDS)
+        self.reaper = self.loop.call_later(interval, self.reap)
+
+    def reap(self):
+        """
+        Schließt Verbindungen ohne Anfrage seit idle_timeout und vergisst die
+        wieder vollen Token Buckets von Client-IPs ohne offene Verbindung.
+        """
+        now = time.monotonic()
+        idle_timeout = self.limits.idle_timeout
+        if idle_timeout:
+            for handler in list(self.active_connections.values()):
+                if handler.admitted and now - handler.last_activity > idle_timeout:
+                    self.limits.count("reaped_idle")
+                    handler.callback_disconnected(None)
+                    handler.close()
+        rate = self.limits.client_rate
+        if rate:
+            full = max(rate, 1.0)
+            for host, bucket in list(self.buckets.items()):
+                if not bucket[2] and bucket[0] + (now - bucket[1]) * rate >= full:
+                    del self.buckets[host]
+        if self.transport:
+            self.schedule_reap()
+        else:
+            self.reaper = None
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Steuerbefehle an Geräte ohne Abfrage im Takt.
+
+CommandQueue sammelt die Befehle eines Geräts in Eingangsreihenfolge, egal ob
+sie per Modbus, aus dem Web-UI oder von einem Shard-Supervisor kommen. Ein
+verbundener Verarbeiter (connect) wird bei jedem Befehl sofort eingeplant,
+typischerweise per TickScheduler.call_soon im Takt-Thread der Simulation.
+ControlDeviceContext meldet Schreibzugriffe von Clients (FC6/FC16) auf
+Steuerregister als Ereignis, statt dass die Simulation die Register in jedem
+Takt lesen muss. Schreibzugriffe der Simulation selbst gehen direkt an den
+Datenblock und lösen kein Ereignis aus.
+"""
+
+from collections import deque
+
+from pymodbus.datastore import ModbusDeviceContext
+
+MAX_PENDING_COMMANDS = 64 # ohne Verarbeiter (z.B. wiedergegebenes Gerät) werden ältere Befehle verworfen
+
+
+class CommandQueue:
+    """Befehle (action, value) eines Geräts; put() ist threadsicher."""
+
+    def __init__(self):
+        self.commands = deque(maxlen=MAX_PENDING_COMMANDS)
+        self.dispatch = None
+
+    def connect(self, dispatch):
+        """dispatch() plant die Verarbeitung ein; bereits wartende Befehle werden sofort eingeplant."""
+        self.dispatch = dispatch
+        if self.commands:
+            dispatch()
+
+    def put(self, action, value=None):
+        self.commands.append((action, value))
+        dispatch = self.dispatch
+        if dispatch is not None:
+            dispatch()
+
+    def drain(self):
+        """Liefert alle wartenden Befehle in Eingangsreihenfolge und entfernt sie."""
+        commands = self.commands
+        while commands:
+            try:
+                yield commands.popleft()
+            except IndexError: # gleichzeitig von einem anderen Leser geleert
+                return
+
+
+class ControlDeviceContext(ModbusDeviceContext):
+    """
+    Gerätekontext, der nach jedem Client-Schreibzugriff auf Holding Register
+    on_write(register, value) für jedes betroffene Register aus
+    control_registers aufruft (Registernummern wie im Datenblock).
+    """
+
+    def __init__(self, control_registers, on_write, **blocks):
+        super().__init__(**blocks)
+        self.control_registers = frozenset(control_registers)
+        self.on_write = on_write
+
+    def setValues(self, func_code, address, values):
+        result = super().setValues(func_code, address, values)
+        if result is None and self.decode(func_code) == 'h':
+            first = address + 1 # wie ModbusDeviceContext: Datenblock-Adresse = Protokolladresse + 1
+            for register in self.control_registers:
+                if first <= register < first + len(values):
+                    self.on_write(register, values[register - first])
+        return result
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Filter und Seiten für GET /data bei großen Flotten.
+
+    /data?type=wallbox&state=charging,fault
+    /data?type=pv&ids=100-199&limit=50&offset=50
+
+type wählt die Abschnitte (pv, wallbox), ids einen Bereich von Geräte-IDs
+('7' oder '100-199'), state Zustandsnamen wie in aggregate.py (pv: feeding,
+standby, fault, offline; wallbox: charging, ready, fault, offline). offset und
+limit gelten je Abschnitt. Die Geräte liegen je Snapshot einmal nach ID
+sortiert vor, ein ID-Bereich wird per Bisektion gefunden; nur der Zustand
+muss je Gerät im Bereich geprüft werden.
+"""
+
+from bisect import bisect_left
+
+from aggregate import OFFLINE, SECTIONS, state_name
+
+TYPES = {"pv": "servers", "wallbox": "wallboxes"}
+PARAMETERS = ("type", "ids", "state", "offset", "limit")
+
+
+class DataQuery:
+    """Geprüfte Parameter einer /data-Anfrage; parse() liefert None ohne Filterparameter."""
+
+    def __init__(self, sections, first_id=None, last_id=None, states=None, offset=0, limit=None):
+        self.sections = sections
+        self.first_id = first_id
+        self.last_id = last_id
+        self.states = states
+        self.offset = offset
+        self.limit = limit
+
+    @classmethod
+    def parse(cls, args):
+        """args: Query-Parameter (z.B. request.args); ValueError mit Meldung bei ungültigen Werten."""
+        if not any(name in args for name in PARAMETERS):
+            return None
+        sections = tuple(TYPES.values())
+        if args.get("type"):
+            try:
+                sections = tuple(dict.fromkeys(TYPES[name.strip()] for name in args["type"].split(",")))
+            except KeyError:
+                raise ValueError(f"Invalid type (allowed: {', '.join(TYPES)})") from None
+        first_id = last_id = None
+        if args.get("ids"):
+            first, _, last = args["ids"].partition("-")
+            try:
+                first_id = int(first)
+                last_id = int(last) if last else first_id
+            except ValueError:
+                raise ValueError("Invalid ids (expected e.g. 7 or 100-199)") from None
+        states = None
+        if args.get("state"):
+            states = frozenset(name.strip() for name in args["state"].split(","))
+            known = {OFFLINE}.union(*(SECTIONS[section][3].values() for section in sections))
+            if states - known:
+                raise ValueError(f"Invalid state (allowed: {', '.join(sorted(known))})")
+        try:
+            offset = int(args.get("offset") or 0)
+            limit = int(args["limit"]) if args.get("limit") else None
+        except ValueError:
+            raise ValueError("Invalid offset or limit") from None
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("Offset and limit must not be negative")
+        return cls(sections, first_id, last_id, states, offset, limit)
+
+    def select(self, section, items, raw_items):
+        """
+        Wählt aus items (sortierte Liste (ID, Dict)) die passenden Einträge; der
+        Zustand wird an raw_items (gleiche Reihenfolge, Rohwerte) geprüft.
+        Liefert (Anzahl aller Treffer, Einträge der Seite).
+        """
+        start, stop = 0, len(items)
+        if self.first_id is not None:
+            start = bisect_left(raw_items, (self.first_id,))
+            stop = bisect_left(raw_items, (self.last_id + 1,), start)
+        if self.states is None:
+            matches = range(start, stop)
+        else:
+            matches = [i for i in range(start, stop) if state_name(section, raw_items[i][1]) in self.states]
+        end = None if self.limit is None else self.offset + self.limit
+        return len(matches), [items[i] for i in matches[self.offset:end]]
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Deklarative Geräteprofile (JSON) und daraus übersetzte Kodierer.
+
+Ein Profil beschreibt den Registerblock eines Gerätetyps:
+
+    {"name": "wallbox", "word_order": "big", "fields": [
+        {"name": "soc", "register": 22, "type": "UINT16", "scale": 1},
+        {"name": "charged_energy_wh", "register": 23, "type": "UINT32"}, ...]}
+
+Typen sind INT16, UINT16, INT32, UINT32 und FLOAT32; word_order ("big" =
+High Word zuerst, "little" = Low Word zuerst) gilt für 32-Bit-Werte und kann
+je Feld überschrieben werden. Kodiert wird int(wert * scale) (abgeschnitten
+wie bisher in register_map.py; INT16 und 32-Bit-Werte im Zweierkomplement),
+dekodiert roh / scale. Lücken zwischen den Feldern werden mit 0 gefüllt.
+
+parse_profile() übersetzt ein Profil beim Laden in Quelltext: encode baut den
+ganzen Block in einem Listenliteral auf (so schnell wie die früheren
+handgeschriebenen Funktionen, FLOAT32 über struct), decode ist die Umkehrung,
+encode_array kodiert ganze Flotten mit NumPy. Neue Gerätetypen brauchen so
+nur eine Profildatei in profiles/.
+"""
+
+import json
+import keyword
+import os
+import struct
+
+import numpy as np
+
+PROFILE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+# Typ -> Anzahl Register
+TYPES = {'INT16': 1, 'UINT16': 1, 'INT32': 2, 'UINT32': 2, 'FLOAT32': 2}
+WORD_ORDERS = ('big', 'little')
+
+
+class ProfileField:
+    __slots__ = ("name", "register", "type", "scale", "word_order", "unit")
+
+    def __init__(self, name, register, type, scale=1, word_order='big', unit=None):
+        self.name = name
+        self.register = register
+        self.type = type
+        self.scale = scale
+        self.word_order = word_order
+        self.unit = unit
+
+    @property
+    def size(self):
+        return TYPES[self.type]
+
+
+class DeviceProfile:
+    """Übersetztes Profil: start/size beschreiben den Block, encode/decode/encode_array kodieren ihn."""
+
+    def __init__(self, name, fields, description=""):
+        self.name = name
+        self.description = description
+        self.fields = sorted(fields, key=lambda field: field.register)
+        self.start = self.fields[0].register
+        self.size = self.fields[-1].register + self.fields[-1].size - self.start
+        self.field_names = tuple(field.name for field in self.fields)
+        self.encode, self.decode = _compile_codec(self)
+        self._array_plan = [(field.register - self.start, field) for field in self.fields]
+
+    def offset(self, name):
+        """Position des Felds name im Block."""
+        return next(field.register for field in self.fields if field.name == name) - self.start
+
+    def encode_array(self, columns, out=None):
+        """
+        Kodiert eine Flotte: columns enthält je Feld (in Profilreihenfolge) ein
+        Array oder einen Skalar, out ist ein uint16-Array (Geräte x size).
+        """
+        if out is None:
+            rows = max((np.size(column) for column in columns), default=1)
+            out = np.zeros((rows, self.size), dtype=np.uint16)
+        for (offset, field), column in zip(self._array_plan, columns):
+            if field.scale != 1:
+                column = np.multiply(column, field.scale)
+            if field.type == 'FLOAT32':
+                words = np.asarray(column, dtype='>f4').reshape(-1).view('>u2').reshape(-1, 2)
+                high, low = words[:, 0], words[:, 1]
+            else:
+                values = np.asarray(column).astype(np.int64)
+                if field.size == 1:
+                    out[:, offset] = values & 0xFFFF
+                    continue
+                high, low = (values >> 16) & 0xFFFF, values & 0xFFFF
+            if field.word_order == 'little':
+                high, low = low, high
+            out[:, offset] = high
+            out[:, offset + 1] = low
+        return out
+
+
+def _compile_codec(profile):
+    """
+    Erzeugt encode(*werte) -> [register] und decode(register) -> {name: wert}
+    als Quelltext, der den Block wie ein handgeschriebenes Listenliteral in
+    einem Ausdruck aufbaut; nur FLOAT32 geht über struct.
+    """
+    arguments, prologue, words, results = [], [], [], []
+    position = profile.start
+    for field in profile.fields:
+        words.extend(["0"] * (field.register - position))
+        position = field.register + field.size
+        name = field.name
+        arguments.append(name)
+        scaled = name if field.scale == 1 else f"{name} * {field.scale!r}"
+        index = field.register - profile.start
+        if field.type == 'FLOAT32':
+            prologue.append(f"{name} = _float_words({scaled})")
+            pair = [f"{name}[0]", f"{name}[1]"]
+            high, low = (index, index + 1) if field.word_order == 'big' else (index + 1, index)
+            raw = f"_float_value(registers[{high}], registers[{low}])"
+        elif field.size == 2:
+            prologue.append(f"{name} = int({scaled})")
+            pair = [f"{name} >> 16 & 0xFFFF", f"{name} & 0xFFFF"]
+            high, low = (index, index + 1) if field.word_order == 'big' else (index + 1, index)
+            raw = f"(registers[{high}] << 16 | registers[{low}])"
+            if field.type == 'INT32':
+                raw = f"(({raw} ^ 0x80000000) - 0x80000000)"
+        else:
+            # UINT16 ohne Maske wie bisher, INT16 im Zweierkomplement
+            words.append(f"int({scaled})" if field.type == 'UINT16' else f"int({scaled}) & 0xFFFF")
+            raw = f"registers[{index}]" if field.type == 'UINT16' else f"((registers[{index}] ^ 0x8000) - 0x8000)"
+        if field.size == 2:
+            words.extend(pair if field.word_order == 'big' else pair[::-1])
+        results.append(f"{name!r}: {raw}" if field.scale == 1 else f"{name!r}: {raw} / {field.scale!r}")
+
+    lines = [f"def encode({', '.join(arguments)}):"]
+    lines += [f"    {line}" for line in prologue]
+    lines.append(f"    return [{', '.join(words)}]")
+    lines.append("def decode(registers):")
+    lines.append(f"    return {{{', '.join(results)}}}")
+    namespace = {"_float_words": _float_words, "_float_value": _float_value}
+    exec(compile("\n".join(lines) + "\n", f"<profile {profile.name}>", "exec"), namespace)
+    return namespace["encode"], namespace["decode"]
+
+
+_FLOAT32 = struct.Struct('>f')
+_WORDS = struct.Struct('>HH')
+
+
+def _float_words(value):
+    """FLOAT32 als (High Word, Low Word)."""
+    return _WORDS.unpack(_FLOAT32.pack(value))
+
+
+def _float_value(high, low):
+    return _FLOAT32.unpack(_WORDS.pack(high, low))[0]
+
+
+def parse_profile(data):
+    """Prüft ein Profil (dict wie in der JSON-Datei) und liefert das übersetzte DeviceProfile."""
+    name = data.get("name", "profile")
+    default_order = data.get("word_order", "big")
+    fields = []
+    for entry in data.get("fields", []):
+        field = ProfileField(entry["name"], int(entry["register"]), entry.get("type", "UINT16").upper(),
+                             entry.get("scale", 1), entry.get("word_order", default_order), entry.get("unit"))
+        if (not field.name.isidentifier() or keyword.iskeyword(field.name) or field.name.startswith('_')
+                or field.name == "registers"):
+            raise ValueError(f"Profil {name}: ungültiger Feldname {field.name!r}")
+        if field.type not in TYPES:
+            raise ValueError(f"Profil {name}: unbekannter Typ {field.type} (erlaubt: {', '.join(TYPES)})")
+        if field.word_order not in WORD_ORDERS:
+            raise ValueError(f"Profil {name}: unbekannte Wortreihenfolge {field.word_order!r}")
+        if not isinstance(field.scale, (int, float)) or field.scale == 0:
+            raise ValueError(f"Profil {name}: ungültige Skalierung {field.scale!r} für {field.name}")
+        fields.append(field)
+    if not fields:
+        raise ValueError(f"Profil {name} enthält keine Felder")
+    if len({field.name for field in fields}) != len(fields):
+        raise ValueError(f"Profil {name}: doppelte Feldnamen")
+    fields.sort(key=lambda field: field.register)
+    for previous, field in zip(fields, fields[1:]):
+        if field.register < previous.register + previous.size:
+            raise ValueError(f"Profil {name}: {field.name} überlappt {previous.name} (Register {field.register})")
+    return DeviceProfile(name, fields, data.get("description", ""))
+
+
+def load_profile(name_or_path):
+    """Lädt ein Profil aus profiles/<name>.json oder aus einem Dateipfad."""
+    path = name_or_path
+    if not os.path.exists(path):
+        path = os.path.join(PROFILE_DIRECTORY, f"{name_or_path}.json")
+    with open(path, encoding="utf-8") as f:
+        return parse_profile(json.load(f))
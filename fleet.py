@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Vektorisierte Simulation einer ganzen PV-Flotte.
+
+Statt pro Wechselrichter eine Python-Schleife mit skalaren random.random()-
+und math.sin-Aufrufen zu durchlaufen, hält PvFleet den Zustand aller
+Wechselrichter in NumPy-Arrays und berechnet einen Zyklus für die gesamte
+Flotte in einem Schritt. Die Formeln entsprechen PvSimulation.step in main.py
+(Referenzmodus).
+"""
+
+import datetime
+
+import numpy as np
+
+from register_map import PV_BLOCK_SIZE, PV_PROFILE
+
+INVERTER_EFFICIENCY = 0.97
+FAULT_DURATION_TICKS = 15  # 15 Zyklen * 2s/Zyklus = 30s Fehler
+
+
+class PvFleet:
+    """
+    Zustand aller PV-Wechselrichter als Arrays. Index i gehört zu instance_ids[i].
+    today ist das Startdatum der Simulation (Standard: heute).
+    """
+
+    def __init__(self, instance_ids, seed=None, today=None):
+        self.instance_ids = np.asarray(instance_ids, dtype=np.int64)
+        size = len(self.instance_ids)
+        self.rng = np.random.default_rng(seed)
+
+        self.day_cycle_counter = (self.instance_ids * 30.0) % 360
+        self.total_yield_kwh = self.rng.uniform(500, 2000, size)
+        self.daily_yield_wh = np.zeros(size)
+        self.fault_timer = np.zeros(size, dtype=np.int64)
+        self.max_dc_current = 10.0 + (self.instance_ids % 3 - 1)
+        self.last_reset_day = (today or datetime.date.today()).day
+
+        # Ergebnisse des letzten Zyklus (für Web-UI und Tests)
+        self.registers = np.zeros((size, PV_BLOCK_SIZE), dtype=np.uint16)
+        self.values = {}
+
+    def __len__(self):
+        return len(self.instance_ids)
+
+    def inject_fault(self, index):
+        """Setzt Wechselrichter index für FAULT_DURATION_TICKS Zyklen in den Fehlerzustand."""
+        self.fault_timer[index] = FAULT_DURATION_TICKS
+
+    def reset_daily_yield_if_needed(self, today=None):
+        """Setzt den Tagesertrag aller Wechselrichter beim Datumswechsel zurück."""
+        current_day = (today or datetime.date.today()).day
+        if current_day != self.last_reset_day:
+            self.daily_yield_wh[:] = 0.0
+            self.last_reset_day = current_day
+            return True
+        return False
+
+    def step(self, day_cycle_increment, interval_seconds):
+        """
+        Berechnet einen Zyklus für alle Wechselrichter und gibt das Registerabbild
+        (Register 1-17 ab PV_BLOCK_START, eine Zeile pro Wechselrichter, uint16) zurück.
+        """
+        size = len(self.instance_ids)
+        noise = self.rng.random((6, size))
+
+        # 1. DC-Seite simulieren
+        sine_wave = (np.sin(np.radians(self.day_cycle_counter)) + 1) / 2
+        dc_voltage = 350.0 + (noise[0] - 0.5) * 20
+        dc_current = sine_wave * self.max_dc_current + noise[1] * 0.05
+        dc_current[dc_current < 0.05] = 0.0
+        dc_power = dc_voltage * dc_current
+
+        # 2. AC-Werte berechnen
+        ac_power_potential = dc_power * INVERTER_EFFICIENCY
+        ac_voltage = 230.0 + (noise[2] - 0.5) * 2
+        ac_current = np.where(ac_power_potential > 1.0, ac_power_potential / ac_voltage, 0.0)
+
+        apparent_power = ac_voltage * ac_current
+        power_factor = np.where(apparent_power > 100, 0.98 + noise[3] * 0.02, 0.90 + noise[3] * 0.05)
+        active_power = apparent_power * power_factor
+        reactive_power = np.sqrt(np.maximum(apparent_power**2 - active_power**2, 0.0))
+
+        # 3. Netz- und Statusparameter
+        frequency = 50.0 + (noise[4] - 0.5) * 0.04
+        device_temperature = 25.0 + (active_power / 150.0) + (noise[5] - 0.5)
+
+        faulted = self.fault_timer > 0
+        operating_state = np.where(faulted, 3, np.where(active_power > 10, 2, 1))
+        fault_code = np.where(faulted, 101, 0)
+        self.fault_timer[faulted] -= 1
+        active_power[faulted] = 0.0 # Im Fehlerfall keine Leistung
+
+        # 4. Energiezähler
+        energy_this_interval_wh = active_power * (interval_seconds / 3600.0)
+        self.daily_yield_wh += energy_this_interval_wh
+        self.total_yield_kwh += energy_this_interval_wh / 1000.0
+
+        # 5. Registerabbild aufbauen (Profil pv_inverter, int() schneidet wie im Referenzmodus ab)
+        PV_PROFILE.encode_array((
+            ac_voltage, ac_current, apparent_power, active_power, power_factor, reactive_power,
+            frequency, self.daily_yield_wh, self.total_yield_kwh, operating_state,
+            device_temperature, fault_code, dc_voltage, dc_current, dc_power,
+        ), self.registers)
+
+        self.values = {
+            "ac_voltage": ac_voltage,
+            "ac_current": ac_current,
+            "active_power": active_power,
+            "power_factor": power_factor,
+            "frequency": frequency,
+            "daily_yield_wh": self.daily_yield_wh,
+            "total_yield_kwh": self.total_yield_kwh,
+            "operating_state": operating_state,
+            "device_temperature": device_temperature,
+            "fault_code": fault_code,
+            "dc_power": dc_power,
+        }
+
+        self.day_cycle_counter = (self.day_cycle_counter + day_cycle_increment) % 360
+        return self.registers
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Register-Frames auf der Platte.
+
+Ein Frame ist der Registerstand aller Geräte zu einem Simulationszeitpunkt:
+Zeitstempel (Sekunden seit Unix-Epoche, float64) und ein uint16-Array
+(Geräte x FRAME_REGISTERS). Die Frame-Datei enthält die Frames lückenlos
+hintereinander (NumPy-Record-Format ohne eigenen Header) und kann daher per
+np.memmap gelesen werden; Geräteliste und Format stehen in <datei>.json.
+"""
+
+import json
+
+import numpy as np
+
+from register_map import REMOTE_CONTROL_REGISTER
+
+FRAME_REGISTERS = REMOTE_CONTROL_REGISTER + 1 # Register 0-26 (PV- und Wallbox-Block)
+FORMAT_VERSION = 1
+
+
+def frame_dtype(device_count, register_count=FRAME_REGISTERS):
+    return np.dtype([('time', '<f8'), ('registers', '<u2', (device_count, register_count))])
+
+
+def header_path(path):
+    return f"{path}.json"
+
+
+class FrameWriter:
+    """
+    Hängt Frames gepuffert an eine Frame-Datei an: add() kopiert nur in einen
+    vorbelegten Puffer, geschrieben wird blockweise alle buffer_frames Frames.
+    devices ist eine Liste von (sim_type, instance_id, host_ip) in Zeilenreihenfolge.
+    """
+
+    def __init__(self, path, devices, interval, register_count=FRAME_REGISTERS, buffer_frames=256):
+        self.path = path
+        self.devices = [list(device) for device in devices]
+        self.dtype = frame_dtype(len(self.devices), register_count)
+        self.buffer = np.zeros(buffer_frames, dtype=self.dtype)
+        self.buffered = 0
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.file = open(path, 'wb')
+        with open(header_path(path), 'w') as header_file:
+            json.dump({
+                "format_version": FORMAT_VERSION,
+                "devices": self.devices,
+                "register_count": register_count,
+                "interval_seconds": interval,
+            }, header_file, indent=2)
+
+    def add(self, timestamp, registers):
+        """Übernimmt einen Frame; registers: Array (Geräte x Register) oder breiter (wird abgeschnitten)."""
+        record = self.buffer[self.buffered]
+        record['time'] = timestamp
+        record['registers'] = registers[:, :self.dtype['registers'].shape[1]]
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.buffered:
+            data = self.buffer[:self.buffered].tobytes()
+            self.file.write(data)
+            self.frames_written += self.buffered
+            self.bytes_written += len(data)
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_frames(path):
+    """
+    Öffnet eine Frame-Datei schreibgeschützt per Memory-Mapping, ohne sie zu laden.
+    Liefert (header, frames); frames['time'][i] und frames['registers'][i] sind Frame i.
+    """
+    with open(header_path(path)) as header_file:
+        header = json.load(header_file)
+    dtype = frame_dtype(len(header["devices"]), header["register_count"])
+    frames = np.memmap(path, dtype=dtype, mode='r')
+    return header, frames
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Push-Aktualisierungen für das Web-UI per Server-Sent Events.
+
+Ein DeltaBroadcaster erstellt in festen Abständen einen Schnappschuss der
+UI-Daten, vergleicht ihn mit dem vorherigen und serialisiert nur die
+geänderten Felder. Jeder Frame wird genau einmal in Bytes umgewandelt und
+an alle verbundenen Clients verteilt; neue oder zu weit zurückgefallene
+Clients bekommen einen (ebenfalls gemeinsam zwischengespeicherten) Voll-Frame.
+
+Frame-Format (data-Feld des SSE-Events, JSON):
+    {"v": 12, "full": true, "sections": {"servers": {"1": {...}}, ...}, "values": {...}}
+    {"v": 13, "sections": {"servers": {"1": {"active_power": "812 W"}}}}
+Ein Gerät, dessen Felder entfallen sind, wird mit "__replace": true komplett
+übertragen, ein entferntes Gerät mit null.
+
+Jeder offene Stream belegt einen Thread des Web-Servers. Über max_clients
+hinaus liefert client_stream() None, /stream antwortet dann mit 503 und das
+Dashboard fragt /data per Polling ab.
+"""
+
+import json
+import threading
+from collections import deque
+
+KEEPALIVE_SECONDS = 15
+MAX_CLIENTS = 64
+
+
+def _diff_section(old, new):
+    """Geänderte Felder je Gerät zwischen zwei Ständen eines Abschnitts."""
+    delta = {}
+    for key, entry in new.items():
+        previous = old.get(key)
+        if previous is entry:
+            continue
+        if previous is None:
+            delta[key] = entry
+            continue
+        if previous.keys() - entry.keys():
+            delta[key] = {**entry, "__replace": True}
+            continue
+        changed = {field: value for field, value in entry.items() if previous.get(field) != value}
+        if changed:
+            delta[key] = changed
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+def _sse_event(version, event, payload):
+    data = json.dumps(payload, separators=(',', ':'), default=str)
+    return f"id: {version}\nevent: {event}\ndata: {data}\n\n".encode('utf-8')
+
+
+class DeltaBroadcaster:
+    """
+    snapshot() muss ein Tupel (sections, values) liefern: sections ist ein Dict
+    von Abschnitt -> {Geräte-ID: Dict}, values ein Dict einfacher Einzelwerte.
+    Die Geräte-Dicts dürfen nach der Übergabe nicht mehr verändert werden.
+    max_clients begrenzt die gleichzeitigen Streams (None: unbegrenzt).
+    """
+
+    def __init__(self, snapshot, interval=1.0, history=64, max_clients=MAX_CLIENTS):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.version = 0
+        self.frames = deque(maxlen=history)
+        self.sections = {}
+        self.values = {}
+        self.full_cache = None
+        self.condition = threading.Condition()
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.clients = 0
+        self.max_clients = max_clients
+        self.rejected = 0
+
+    def start(self):
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.publish() # erster Client bekommt sofort den aktuellen Stand
+            self.thread = threading.Thread(target=self._run, name="live-stream")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"Fehler beim Erstellen des Live-Frames: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def wake(self):
+        """Erstellt den nächsten Frame sofort statt erst nach interval (z.B. nach einem Steuerbefehl)."""
+        self.wakeup.set()
+
+    def publish(self):
+        """Erstellt einen Delta-Frame, falls sich seit dem letzten Frame etwas geändert hat."""
+        sections, values = self.snapshot()
+        section_deltas = {}
+        for name, entries in sections.items():
+            entries = {str(key): entry for key, entry in entries.items()}
+            delta = _diff_section(self.sections.get(name, {}), entries)
+            if delta:
+                section_deltas[name] = delta
+            sections[name] = entries
+        changed_values = {key: value for key, value in values.items() if self.values.get(key) != value}
+        if not section_deltas and not changed_values:
+            return False
+
+        payload = {"v": self.version + 1, "sections": section_deltas}
+        if changed_values:
+            payload["values"] = changed_values
+        with self.condition:
+            self.version += 1
+            self.sections = sections
+            self.values = dict(values)
+            self.full_cache = None
+            self.frames.append((self.version, _sse_event(self.version, 'delta', payload)))
+            self.condition.notify_all()
+        return True
+
+    def full_frame(self):
+        """Voll-Frame des aktuellen Stands (einmal pro Version serialisiert)."""
+        with self.condition:
+            if self.full_cache is None or self.full_cache[0] != self.version:
+                payload = {"v": self.version, "full": True, "sections": self.sections, "values": self.values}
+                self.full_cache = (self.version, _sse_event(self.version, 'full', payload))
+            return self.full_cache
+
+    def client_stream(self):
+        """
+        Iterierbare SSE-Antwort (erst ein Voll-Frame, danach nur Deltas) oder
+        None, wenn schon max_clients Streams offen sind. close() gibt den Platz
+        wieder frei.
+        """
+        self.start()
+        with self.condition:
+            if self.max_clients is not None and self.clients >= self.max_clients:
+                self.rejected += 1
+                return None
+            self.clients += 1
+        return _Subscription(self, self._frames())
+
+    def release(self):
+        with self.condition:
+            self.clients -= 1
+
+    def _frames(self):
+        version, frame = self.full_frame()
+        yield frame
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version > version, timeout=KEEPALIVE_SECONDS)
+                pending = [entry for entry in self.frames if entry[0] > version]
+                in_sync = bool(pending) and pending[0][0] == version + 1
+            if not pending:
+                yield b": keepalive\n\n"
+                continue
+            if not in_sync:
+                # Zu weit zurückgefallen: Frames sind aus dem Verlauf gefallen
+                version, frame = self.full_frame()
+                yield frame
+                continue
+            for version, frame in pending:
+                yield frame
+
+
+class _Subscription:
+    """
+    Ein belegter Stream-Platz. Der WSGI-Server ruft close() auch dann auf, wenn
+    der Client vor dem ersten Frame geht (ein Generator liefe dann nie in sein
+    finally).
+    """
+
+    def __init__(self, broadcaster, frames):
+        self.broadcaster = broadcaster
+        self.frames = frames
+        self.closed = False
+
+    def __iter__(self):
+        return self.frames
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.frames.close()
+            self.broadcaster.release()
@@ -1,362 +1,632 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import asyncio
+import functools
+import json
 import threading
 import time
 import math
 import random
 import datetime
-from pymodbus.server import StartTcpServer
+import numpy as np
+try:
+    import resource
+except ImportError: # z.B. Windows
+    resource = None
 from pymodbus.datastore import ModbusSequentialDataBlock
 from pymodbus.datastore import ModbusDeviceContext, ModbusServerContext
-from flask import Flask, render_template, jsonify, request
-
-# --- Globale Daten und Sperren ---
-# Thread-sichere Datenablage für den UI-Status
-server_data = {}
-wallbox_data = {} # NEU für Wallboxen
-data_lock = threading.Lock()
-
+from flask import Flask, Response, render_template, jsonify, request
+import addressing
+from aggregate import FleetAggregate
+from fleet import PvFleet
+from frames import FRAME_REGISTERS
+from live_stream import DeltaBroadcaster
+from connection_limits import ConnectionLimits, LimitedModbusTcpServer
+from control import CommandQueue, ControlDeviceContext
+from data_query import DataQuery
+from metrics import CONTENT_TYPE, REGISTRY, SchedulerMetrics, TimedLock, modbus_tracers
+from readiness import DeviceReadiness
+from recorder import FrameRecorder
+from replay import TraceReplay
+from response_cache import CachingModbusTcpServer, ResponseCache, VersionedDataBlock
+from scheduler import TickScheduler
+from shared_store import REGISTERS_PER_DEVICE, SharedRegisterStore
+from snapshots import SnapshotStore
+import web_serving
+from register_map import (
+    REMOTE_CONTROL_REGISTER, PV_BLOCK_START, WALLBOX_BLOCK_START, METER_BLOCK_START, METER_PROFILE,
+    build_pv_register_image, build_wallbox_register_image, build_meter_register_image,
+    decode_pv_register_image, decode_wallbox_register_image,
+)
+
+# --- Globale Daten ---
 # Globale Konfiguration für die Simulation
 fault_flags = {}
-wallbox_controls = {} # NEU für Wallboxen
+wallbox_commands = {} # Befehle je Wallbox (control.CommandQueue), per Modbus-Schreibzugriff oder Web-UI
 day_cycle_increment = 0.2
+fleet_aggregate = FleetAggregate() # Summen der Flotte, bei jedem commit() nur um geänderte Geräte nachgeführt
+# UI-Status als versionierte Snapshots mit Rohwerten ("servers": PV, "wallboxes": Wallboxen)
+# und den Summen der Flotte als Einzelwert "fleet"
+ui_state = SnapshotStore(("servers", "wallboxes"),
+                         {"day_cycle_increment": day_cycle_increment, "fleet": fleet_aggregate.totals()},
+                         lock=TimedLock("ui_state"),
+                         derive=lambda sections, pending: {"fleet": fleet_aggregate.apply(sections, pending)})
+register_store = None # SharedRegisterStore, falls mit --shared-memory gestartet
+tick_scheduler = None # TickScheduler, der alle Simulationen taktet
+simulated_time = None # datetime der Simulation im Batch-Modus (batch.py), sonst Echtzeit
+publish_ui_status = True # False: Simulationen legen keine UI-Daten ab (Batch-Modus ohne Web-UI)
+collect_metrics = True # False: Takt-Metriken für /metrics abschalten (Batch-Modus mit simulierter Uhr)
+scheduler_metrics = SchedulerMetrics()
+device_readiness = DeviceReadiness() # Startzustand je Gerät für /ready
+frame_recorder = None # FrameRecorder, falls mit --record gestartet
+trace_replay = None # TraceReplay, falls mit --replay gestartet
+response_cache = ResponseCache() # Zähler der vorkodierten FC3-Antworten aller Listener
+connection_limits = ConnectionLimits() # Verbindungsgrenzen und Überlastzähler aller Listener
+meter_datablock = None # Register des virtuellen Zählers, falls mit --meter gestartet
 
 # --- Konfiguration ---
 PV_HOST_IPS = [f"10.10.10.{120 + i}" for i in range(12)]
 WALLBOX_HOST_IPS = [f"10.10.10.{140 + i}" for i in range(12)] # NEU für Wallboxen
-TCP_PORT = 5020
+TCP_PORT = 5020 # im Modus 'port' und 'unit' der erste Port
+ADDRESSING = 'ip' # 'ip': eigene IP je Gerät, 'port': eigener Port je Gerät, 'unit': Unit IDs (addressing.py)
+LISTEN_HOST = "127.0.0.1" # gemeinsame IP aller Geräte in den Modi 'port' und 'unit'
 UPDATE_INTERVAL_SECONDS = 2
+MIN_REPLAY_INTERVAL_SECONDS = 0.05
+BRING_UP_TIMEOUT_SECONDS = 30 # Threads-Modus: so lange auf das Binden aller Listener warten
+RESPONSE_CACHE = True # FC3-Antworten je Registerversion nur einmal kodieren (response_cache.py)
+METER_HOST_IP = "10.10.10.160" # virtueller Zähler im Modus 'ip'; in 'port'/'unit' der Port nach dem letzten Gerät
+
+def current_date():
+    """Aktuelles Datum der Simulation (für den täglichen Reset des Tagesertrags)."""
+    if simulated_time is not None:
+        return simulated_time.date()
+    return datetime.date.today()
+
+# Rohwerte eines PV-Wechselrichters im UI-Status (zusätzlich "host_ip")
+PV_STATUS_FIELDS = ("operating_state", "ac_voltage", "ac_current", "active_power", "power_factor",
+                    "frequency", "daily_yield_wh", "total_yield_kwh", "device_temperature", "fault_code",
+                    "dc_power")
+
+def format_pv_status(record):
+    """Formatiert die Rohwerte eines PV-Wechselrichters für die Web-UI."""
+    if "operating_state" not in record:
+        return record # reine Statusmeldung (Initializing, Error)
+    operating_state = record["operating_state"]
+    return {
+        "host_ip": record["host_ip"],
+        "status": "Running" if operating_state != 3 else "Fault",
+        "ac_voltage": f"{record['ac_voltage']:.1f} V",
+        "ac_current": f"{record['ac_current']:.2f} A",
+        "active_power": f"{record['active_power']:.0f} W",
+        "power_factor": f"{record['power_factor']:.2f}",
+        "frequency": f"{record['frequency']:.2f} Hz",
+        "daily_yield": f"{record['daily_yield_wh'] / 1000.0:.3f} kWh",
+        "op_state": operating_state,
+        "temp": f"{record['device_temperature']:.1f} °C",
+        "fault_code": record["fault_code"],
+        "dc_power": f"{record['dc_power']:.0f} W"
+    }
+
+def format_fleet_totals(totals):
+    """Formatiert die Summen der Flotte (aggregate.py) für /data."""
+    return {
+        "pv_active_power": f"{totals['pv_active_power'] / 1000.0:.2f} kW",
+        "wallbox_charging_power": f"{totals['wallbox_charging_power'] / 1000.0:.2f} kW",
+        "net_power": f"{totals['net_power'] / 1000.0:.2f} kW",
+        "pv_daily_yield": f"{totals['pv_daily_yield_wh'] / 1000.0:.3f} kWh",
+        "pv_total_yield": f"{totals['pv_total_yield_kwh']:.0f} kWh",
+        "wallbox_charged_energy": f"{totals['wallbox_charged_energy_wh'] / 1000.0:.3f} kWh",
+        **{name: value for name, value in totals.items() if isinstance(value, int)}, # Anzahlen je Zustand
+    }
+
+def format_wallbox_status(record):
+    """Formatiert die Rohwerte einer Wallbox für die Web-UI."""
+    if "state" not in record:
+        return record # reine Statusmeldung (Initializing, Error)
+    status_map = {1: "Bereit", 2: "Ladevorgang", 3: "Fehler"}
+    return {
+        "host_ip": record["host_ip"],
+        "status": status_map.get(record["state"], "Unbekannt"),
+        "charging_power": f"{record['charging_power']:.0f} W",
+        "soc": f"{record['soc']:.1f} %",
+        "charged_energy": f"{record['charged_energy_wh'] / 1000.0:.3f} kWh",
+        "fault_code": record["fault_code"],
+        "state": record["state"]
+    }
+
+
+class PvSimulation:
+    """
+    Zustand eines simulierten PV-Wechselrichters. Ein Aufruf von step()
+    entspricht einem Simulationszyklus und schreibt die neuen Werte in den
+    Modbus Datastore und in die Web-UI-Daten.
+    """
 
-# --- PV-Register-Adressen (Holding Registers, beginnend bei 0) ---
-# Hinweis: Die Adressen sind um 1 verschoben gegenüber der üblichen Modbus-Dokumentation
-VOLTAGE_REGISTER = 1          # AC Spannung (U)
-CURRENT_REGISTER = 2          # AC Strom (I)
-APPARENT_POWER_REGISTER = 3   # Scheinleistung (S = U*I), ehemals POWER_REGISTER
-
-# NEUE REGISTER
-# Leistungswerte
-ACTIVE_POWER_REGISTER = 4     # Wirkleistung (P = S * cos(phi)), Einheit: W
-POWER_FACTOR_REGISTER = 5     # Leistungsfaktor (cos(phi)), skaliert * 100
-REACTIVE_POWER_REGISTER = 6   # Blindleistung (Q), Einheit: VAR
-
-# Netzparameter
-FREQUENCY_REGISTER = 7        # Netzfrequenz, skaliert * 100 (z.B. 5001 für 50.01 Hz)
-
-# Energiezähler (32-Bit Werte, belegen je 2 Register)
-DAILY_YIELD_REGISTER_H = 8    # Tagesertrag High Word, Einheit: Wh
-DAILY_YIELD_REGISTER_L = 9    # Tagesertrag Low Word
-TOTAL_YIELD_REGISTER_H = 10   # Gesamtertrag High Word, Einheit: kWh
-TOTAL_YIELD_REGISTER_L = 11   # Gesamtertrag Low Word
-
-# Status und Diagnose
-OPERATING_STATE_REGISTER = 12 # Betriebszustand (0=Aus, 1=Standby, 2=Einspeisung, 3=Fehler)
-DEVICE_TEMP_REGISTER = 13     # Gerätetemperatur, skaliert * 10 (°C)
-FAULT_CODE_REGISTER = 14      # Fehlercode
-
-# DC-Seite
-DC_VOLTAGE_REGISTER = 15      # DC-Spannung, skaliert * 10 (V)
-DC_CURRENT_REGISTER = 16      # DC-Strom, skaliert * 10 (A)
-DC_POWER_REGISTER = 17        # DC-Leistung (P_DC), Einheit: W
-
-# Skalierungsfaktoren
-VOLTAGE_SCALING = 10.0
-CURRENT_SCALING = 100.0
-POWER_FACTOR_SCALING = 100.0
-FREQUENCY_SCALING = 100.0
-TEMP_SCALING = 10.0
-DC_VOLTAGE_SCALING = 10.0
-DC_CURRENT_SCALING = 100.0
-
-# --- Wallbox-Register-Adressen ---
-WALLBOX_STATE_REGISTER = 20      # 1:Bereit, 2:Ladevorgang, 3:Fehler
-CHARGING_POWER_REGISTER = 21     # Ladeleistung in W
-STATE_OF_CHARGE_REGISTER = 22    # SoC in %
-CHARGED_ENERGY_REGISTER = 23     # Geladene Energie (UINT32), Wh
-WALLBOX_FAULT_CODE_REGISTER = 25 # Fehlercode (0=OK, 201=Ladefehler)
-REMOTE_CONTROL_REGISTER = 26     # Fernsteuerung (1=Start, 2=Stop)
-
-
-def split_32bit_value(value):
-    """Teilt einen 32-Bit-Wert in zwei 16-Bit-Werte (High und Low Word)."""
-    value = int(value)
-    high_word = (value >> 16) & 0xFFFF
-    low_word = value & 0xFFFF
-    return [high_word, low_word]
-
-def simulate_pv_values(datablock, instance_id, host_ip):
-    """
-    Diese Funktion läuft in einem separaten Thread und aktualisiert
-    kontinuierlich die Werte im Modbus Datastore für eine bestimmte Instanz.
-    """
-    global fault_flags, day_cycle_increment
-    print(f"Starte Simulation der PV-Werte für Instanz {instance_id}...")
-    
-    day_cycle_counter = instance_id * 30
-    total_yield_kwh = random.uniform(500, 2000)
-    daily_yield_wh = 0.0
-    last_reset_day = datetime.date.today().day
-    fault_timer = 0
-
-    while True:
-        try:
-            # Fehlerinjektion prüfen
-            if fault_flags.get(instance_id):
-                fault_timer = 15  # 15 Zyklen * 2s/Zyklus = 30s Fehler
-                fault_flags[instance_id] = False
-                print(f"Manueller Fehler für Instanz {instance_id} injiziert.")
-
-            current_day = datetime.date.today().day
-            if current_day != last_reset_day:
-                daily_yield_wh = 0.0
-                last_reset_day = current_day
-                print(f"[{instance_id}] Tagesertrag zurückgesetzt.")
-
-            # 1. DC-Seite simulieren
-            sine_wave = (math.sin(math.radians(day_cycle_counter)) + 1) / 2
-            dc_voltage = 350.0 + (random.random() - 0.5) * 20
-            max_dc_current = 10.0 + (instance_id % 3 - 1)
-            dc_current = sine_wave * max_dc_current + (random.random() * 0.05)
-            if dc_current < 0.05: dc_current = 0.0
-            dc_power = dc_voltage * dc_current
-
-            # 2. AC-Werte berechnen
-            inverter_efficiency = 0.97
-            ac_power_potential = dc_power * inverter_efficiency
-            ac_voltage = 230.0 + (random.random() - 0.5) * 2
-            ac_current = ac_power_potential / ac_voltage if ac_power_potential > 1.0 else 0.0
-            
-            apparent_power = ac_voltage * ac_current
-            power_factor = 0.98 + (random.random() * 0.02) if apparent_power > 100 else 0.90 + (random.random() * 0.05)
-            active_power = apparent_power * power_factor
-            reactive_power = math.sqrt(apparent_power**2 - active_power**2) if apparent_power > active_power else 0.0
-
-            # 3. Netz- und Statusparameter
-            frequency = 50.0 + (random.random() - 0.5) * 0.04
-            device_temperature = 25.0 + (active_power / 150.0) + (random.random() - 0.5)
-
-            if fault_timer > 0:
-                operating_state, fault_code, fault_timer = 3, 101, fault_timer - 1
-                active_power = 0 # Im Fehlerfall keine Leistung
-            elif active_power > 10:
-                operating_state, fault_code = 2, 0
-            else:
-                operating_state, fault_code = 1, 0
-
-            # 4. Energiezähler
-            energy_this_interval_wh = active_power * (UPDATE_INTERVAL_SECONDS / 3600.0)
-            daily_yield_wh += energy_this_interval_wh
-            total_yield_kwh += (energy_this_interval_wh / 1000.0)
-
-            # 5. Werte in Register schreiben
-            datablock.setValues(VOLTAGE_REGISTER, [int(ac_voltage * VOLTAGE_SCALING)])
-            datablock.setValues(CURRENT_REGISTER, [int(ac_current * CURRENT_SCALING)])
-            datablock.setValues(APPARENT_POWER_REGISTER, [int(apparent_power)])
-            datablock.setValues(ACTIVE_POWER_REGISTER, [int(active_power)])
-            datablock.setValues(POWER_FACTOR_REGISTER, [int(power_factor * POWER_FACTOR_SCALING)])
-            datablock.setValues(REACTIVE_POWER_REGISTER, [int(reactive_power)])
-            datablock.setValues(FREQUENCY_REGISTER, [int(frequency * FREQUENCY_SCALING)])
-            datablock.setValues(DAILY_YIELD_REGISTER_H, split_32bit_value(daily_yield_wh))
-            datablock.setValues(TOTAL_YIELD_REGISTER_H, split_32bit_value(total_yield_kwh))
-            datablock.setValues(OPERATING_STATE_REGISTER, [operating_state])
-            datablock.setValues(DEVICE_TEMP_REGISTER, [int(device_temperature * TEMP_SCALING)])
-            datablock.setValues(FAULT_CODE_REGISTER, [fault_code])
-            datablock.setValues(DC_VOLTAGE_REGISTER, [int(dc_voltage * DC_VOLTAGE_SCALING)])
-            datablock.setValues(DC_CURRENT_REGISTER, [int(dc_current * DC_CURRENT_SCALING)])
-            datablock.setValues(DC_POWER_REGISTER, [int(dc_power)])
-
-            # 6. Daten für Web-UI aktualisieren
-            with data_lock:
-                status_text = "Running" if operating_state != 3 else "Fault"
-                server_data[instance_id] = {
-                    "host_ip": host_ip,
-                    "status": status_text,
-                    "ac_voltage": f"{ac_voltage:.1f} V",
-                    "ac_current": f"{ac_current:.2f} A",
-                    "active_power": f"{active_power:.0f} W",
-                    "power_factor": f"{power_factor:.2f}",
-                    "frequency": f"{frequency:.2f} Hz",
-                    "daily_yield": f"{daily_yield_wh / 1000.0:.3f} kWh",
-                    "op_state": operating_state,
-                    "temp": f"{device_temperature:.1f} °C",
-                    "fault_code": fault_code,
-                    "dc_power": f"{dc_power:.0f} W"
-                }
-            
-            day_cycle_counter = (day_cycle_counter + day_cycle_increment) % 360
-            time.sleep(UPDATE_INTERVAL_SECONDS)
-            
-        except Exception as e:
-            print(f"Fehler im Update-Thread für Instanz {instance_id}: {e}")
-            with data_lock:
-                server_data[instance_id] = {"status": f"Error: {e}"}
-            time.sleep(10)
-
-
-def simulate_wallbox_values(datablock, instance_id, host_ip):
-    """
-    Diese Funktion läuft in einem separaten Thread und simuliert die Werte
-    einer Wallbox. Die Ladeleistung ist konstant, aber die Ladegeschwindigkeit
-    wird durch die globale Simulationsgeschwindigkeit skaliert.
-    """
-    global wallbox_controls, day_cycle_increment
-    print(f"Starte Simulation der Wallbox-Werte für Instanz {instance_id}...")
-
-    # Zustandvariablen
-    state = 1  # 1:Bereit, 2:Ladevorgang, 3:Fehler
-    soc = 0
-    charged_energy = 0.0
-    fault_code = 0
-    fault_timer = 0
-
-    while True:
-        try:
-            # 1. Steuerbefehle verarbeiten (Modbus hat Vorrang)
-            control_action = None
+    def __init__(self, instance_id, host_ip):
+        self.instance_id = instance_id
+        self.host_ip = host_ip
+        self.day_cycle_counter = instance_id * 30
+        self.total_yield_kwh = random.uniform(500, 2000)
+        self.daily_yield_wh = 0.0
+        self.last_reset_day = current_date().day
+        self.fault_timer = 0
+
+    def step(self, datablock, dt=UPDATE_INTERVAL_SECONDS):
+        """Ein Simulationszyklus; dt ist die seit dem letzten Zyklus vergangene Zeit in s."""
+        instance_id = self.instance_id
+
+        # Fehlerinjektion prüfen
+        if fault_flags.get(instance_id):
+            self.fault_timer = 15  # 15 Zyklen * 2s/Zyklus = 30s Fehler
+            fault_flags[instance_id] = False
+            print(f"Manueller Fehler für Instanz {instance_id} injiziert.")
+
+        current_day = current_date().day
+        if current_day != self.last_reset_day:
+            self.daily_yield_wh = 0.0
+            self.last_reset_day = current_day
+            print(f"[{instance_id}] Tagesertrag zurückgesetzt.")
+
+        # 1. DC-Seite simulieren
+        sine_wave = (math.sin(math.radians(self.day_cycle_counter)) + 1) / 2
+        dc_voltage = 350.0 + (random.random() - 0.5) * 20
+        max_dc_current = 10.0 + (instance_id % 3 - 1)
+        dc_current = sine_wave * max_dc_current + (random.random() * 0.05)
+        if dc_current < 0.05: dc_current = 0.0
+        dc_power = dc_voltage * dc_current
+
+        # 2. AC-Werte berechnen
+        inverter_efficiency = 0.97
+        ac_power_potential = dc_power * inverter_efficiency
+        ac_voltage = 230.0 + (random.random() - 0.5) * 2
+        ac_current = ac_power_potential / ac_voltage if ac_power_potential > 1.0 else 0.0
+
+        apparent_power = ac_voltage * ac_current
+        power_factor = 0.98 + (random.random() * 0.02) if apparent_power > 100 else 0.90 + (random.random() * 0.05)
+        active_power = apparent_power * power_factor
+        reactive_power = math.sqrt(apparent_power**2 - active_power**2) if apparent_power > active_power else 0.0
+
+        # 3. Netz- und Statusparameter
+        frequency = 50.0 + (random.random() - 0.5) * 0.04
+        device_temperature = 25.0 + (active_power / 150.0) + (random.random() - 0.5)
+
+        if self.fault_timer > 0:
+            operating_state, fault_code = 3, 101
+            self.fault_timer -= 1
+            active_power = 0 # Im Fehlerfall keine Leistung
+        elif active_power > 10:
+            operating_state, fault_code = 2, 0
+        else:
+            operating_state, fault_code = 1, 0
+
+        # 4. Energiezähler
+        energy_this_interval_wh = active_power * (dt / 3600.0)
+        self.daily_yield_wh += energy_this_interval_wh
+        self.total_yield_kwh += (energy_this_interval_wh / 1000.0)
+
+        # 5. Werte in Register schreiben (ein Abbild für Register 1-17)
+        datablock.setValues(PV_BLOCK_START, build_pv_register_image(
+            ac_voltage, ac_current, apparent_power, active_power, power_factor, reactive_power,
+            frequency, self.daily_yield_wh, self.total_yield_kwh, operating_state,
+            device_temperature, fault_code, dc_voltage, dc_current, dc_power))
+
+        # 6. Rohwerte für Web-UI vormerken (veröffentlicht wird einmal pro Takt)
+        if publish_ui_status:
+            ui_state.stage("servers", {instance_id: {
+                "host_ip": self.host_ip,
+                "operating_state": operating_state,
+                "ac_voltage": ac_voltage,
+                "ac_current": ac_current,
+                "active_power": active_power,
+                "power_factor": power_factor,
+                "frequency": frequency,
+                "daily_yield_wh": self.daily_yield_wh,
+                "total_yield_kwh": self.total_yield_kwh,
+                "device_temperature": device_temperature,
+                "fault_code": fault_code,
+                "dc_power": dc_power,
+            }})
+
+        self.day_cycle_counter = (self.day_cycle_counter + day_cycle_increment) % 360
+
+    def report_error(self, e):
+        print(f"Fehler im Update-Thread für Instanz {self.instance_id}: {e}")
+        ui_state.stage("servers", {self.instance_id: {"status": f"Error: {e}"}})
+
+
+# Werte, die ein Client in REMOTE_CONTROL_REGISTER schreibt
+REMOTE_COMMANDS = {1: 'start_charging', 2: 'stop_charging'}
+NOMINAL_CHARGING_POWER = 11000.0
+
+class WallboxSimulation:
+    """
+    Zustand einer simulierten Wallbox. Die Ladeleistung ist konstant, aber die
+    Ladegeschwindigkeit wird durch die globale Simulationsgeschwindigkeit skaliert.
+    Steuerbefehle kommen über commands (control.CommandQueue) und werden mit
+    run_commands() sofort verarbeitet, nicht erst im nächsten Takt.
+    """
 
-            # Befehl aus Modbus-Register lesen
+    def __init__(self, instance_id, host_ip):
+        self.instance_id = instance_id
+        self.host_ip = host_ip
+        self.state = 1  # 1:Bereit, 2:Ladevorgang, 3:Fehler
+        self.soc = 0
+        self.charged_energy = 0.0
+        self.fault_code = 0
+        self.fault_timer = 0
+        self.charging_power = 0.0
+        self.commands = wallbox_commands.setdefault(instance_id, CommandQueue())
+
+    def handle_command(self, action, value=None):
+        """Wendet einen Steuerbefehl auf den Zustand an."""
+        instance_id = self.instance_id
+        if action == 'set_soc' and self.state == 1:
             try:
-                remote_command = datablock.getValues(REMOTE_CONTROL_REGISTER, 1)[0]
-                if remote_command == 1:
-                    control_action = 'start_charging'
-                    print(f"[Wallbox {instance_id}] Start-Befehl via Modbus erhalten.")
-                    datablock.setValues(REMOTE_CONTROL_REGISTER, [0]) # Befehl quittieren
-                elif remote_command == 2:
-                    control_action = 'stop_charging'
-                    print(f"[Wallbox {instance_id}] Stop-Befehl via Modbus erhalten.")
-                    datablock.setValues(REMOTE_CONTROL_REGISTER, [0]) # Befehl quittieren
-            except IndexError:
-                pass # Register noch nicht initialisiert
-
-            # Befehl aus UI verarbeiten, falls kein Modbus-Befehl vorliegt
-            if not control_action:
-                control_action = wallbox_controls.get(instance_id, {}).pop('action', None)
-
-            # Steuerlogik
-            if control_action == 'set_soc' and state == 1:
-                try:
-                    new_soc = int(wallbox_controls.get(instance_id, {}).pop('value', soc))
-                    if 0 <= new_soc <= 100:
-                        soc = new_soc
-                        print(f"[Wallbox {instance_id}] SoC auf {soc}% gesetzt.")
-                except (ValueError, TypeError):
-                    pass
-            elif control_action == 'start_charging' and state != 3:
-                state = 2
-                if soc < 20: soc = 20
-                charged_energy = 0.0
-                print(f"[Wallbox {instance_id}] Ladevorgang gestartet.")
-            elif control_action == 'stop_charging':
-                state = 1
-                print(f"[Wallbox {instance_id}] Ladevorgang gestoppt.")
-            elif control_action == 'inject_fault':
-                state = 3
-                fault_code = 201
-                fault_timer = 30
-                print(f"[Wallbox {instance_id}] Fehler injiziert.")
-
-            # 2. Simulationslogik basierend auf dem Zustand
-            if state == 2:  # Ladevorgang
-                # Ladeleistung ist konstant bei ca. 11 kW
-                charging_power = 11000 + (random.random() - 0.5) * 100
-
-                # Berechne die Energie für ein reales Zeitintervall
-                energy_this_interval_wh = charging_power * (UPDATE_INTERVAL_SECONDS / 3600.0)
-
-                # Skaliere die Energie basierend auf der Simulationsgeschwindigkeit
-                base_speed_increment = 0.2  # Basis-Geschwindigkeit der Simulation
-                speed_scaling_factor = day_cycle_increment / base_speed_increment
-                scaled_energy_this_interval_wh = energy_this_interval_wh * speed_scaling_factor
-
-                # Aktualisiere Zähler und SoC mit der skalierten Energie
-                charged_energy += scaled_energy_this_interval_wh
-
-                # Annahme Batteriekapazität 60kWh für SoC-Berechnung
-                soc_increase = (scaled_energy_this_interval_wh / 60000.0) * 100
-                soc += soc_increase
-
-                if soc >= 100:
-                    soc = 100
-                    state = 1
-                    print(f"[Wallbox {instance_id}] Ladevorgang abgeschlossen (SoC 100%).")
-
-            elif state == 1:  # Bereit
-                charging_power = 0
-
-            elif state == 3:  # Fehler
-                charging_power = 0
-                fault_timer -= 1
-                if fault_timer <= 0:
-                    state = 1
-                    fault_code = 0
-                    print(f"[Wallbox {instance_id}] Fehlerzustand beendet.")
-
-            # 3. Werte in Register schreiben
-            datablock.setValues(WALLBOX_STATE_REGISTER, [state])
-            datablock.setValues(CHARGING_POWER_REGISTER, [int(charging_power)])
-            datablock.setValues(STATE_OF_CHARGE_REGISTER, [int(soc)])
-            datablock.setValues(CHARGED_ENERGY_REGISTER, split_32bit_value(charged_energy))
-            datablock.setValues(WALLBOX_FAULT_CODE_REGISTER, [fault_code])
-
-            # 4. Daten für Web-UI aktualisieren
-            with data_lock:
-                status_map = {1: "Bereit", 2: "Ladevorgang", 3: "Fehler"}
-                wallbox_data[instance_id] = {
-                    "host_ip": host_ip,
-                    "status": status_map.get(state, "Unbekannt"),
-                    "charging_power": f"{charging_power:.0f} W",
-                    "soc": f"{soc:.1f} %",
-                    "charged_energy": f"{charged_energy / 1000.0:.3f} kWh",
-                    "fault_code": fault_code,
-                    "state": state
-                }
-
-            time.sleep(UPDATE_INTERVAL_SECONDS)
-
-        except Exception as e:
-            print(f"Fehler im Wallbox-Update-Thread für Instanz {instance_id}: {e}")
-            with data_lock:
-                wallbox_data[instance_id] = {"status": f"Error: {e}"}
-            time.sleep(10)
+                new_soc = int(self.soc if value is None else value)
+                if 0 <= new_soc <= 100:
+                    self.soc = new_soc
+                    print(f"[Wallbox {instance_id}] SoC auf {self.soc}% gesetzt.")
+            except (ValueError, TypeError):
+                pass
+        elif action == 'start_charging' and self.state != 3:
+            if self.state != 2:
+                self.charging_power = NOMINAL_CHARGING_POWER
+            self.state = 2
+            if self.soc < 20: self.soc = 20
+            self.charged_energy = 0.0
+            print(f"[Wallbox {instance_id}] Ladevorgang gestartet.")
+        elif action == 'stop_charging':
+            self.state = 1
+            self.charging_power = 0.0
+            print(f"[Wallbox {instance_id}] Ladevorgang gestoppt.")
+        elif action == 'inject_fault':
+            self.state = 3
+            self.fault_code = 201
+            self.fault_timer = 30
+            self.charging_power = 0.0
+            print(f"[Wallbox {instance_id}] Fehler injiziert.")
+
+    def run_commands(self, datablock):
+        """
+        Verarbeitet alle wartenden Befehle und schreibt das Registerabbild und den
+        UI-Status sofort, damit Modbus-Clients, /data und der Live-Stream die
+        Zustandsänderung ohne Warten auf den Takt sehen.
+        """
+        handled = False
+        for action, value in self.commands.drain():
+            self.handle_command(action, value)
+            handled = True
+        if handled:
+            datablock.setValues(REMOTE_CONTROL_REGISTER, [0]) # Befehl quittieren
+            self.write_registers(datablock)
+            if publish_ui_status:
+                ui_state.commit()
+                live_updates.wake()
+
+    def write_registers(self, datablock):
+        """Registerabbild (Register 20-25) und Rohwerte für die Web-UI."""
+        datablock.setValues(WALLBOX_BLOCK_START, build_wallbox_register_image(
+            self.state, self.charging_power, self.soc, self.charged_energy, self.fault_code))
+        if publish_ui_status:
+            ui_state.stage("wallboxes", {self.instance_id: {
+                "host_ip": self.host_ip,
+                "state": self.state,
+                "charging_power": self.charging_power,
+                "soc": self.soc,
+                "charged_energy_wh": self.charged_energy,
+                "fault_code": self.fault_code,
+            }})
+
+    def step(self, datablock, dt=UPDATE_INTERVAL_SECONDS):
+        """Ein Simulationszyklus; dt ist die seit dem letzten Zyklus vergangene Zeit in s."""
+        instance_id = self.instance_id
+
+        # 1. Noch nicht verarbeitete Steuerbefehle (ohne verbundenen Verarbeiter, z.B. Batch-Modus)
+        for action, value in self.commands.drain():
+            self.handle_command(action, value)
+
+        # 2. Simulationslogik basierend auf dem Zustand
+        if self.state == 2:  # Ladevorgang
+            # Ladeleistung ist konstant bei ca. 11 kW
+            charging_power = 11000 + (random.random() - 0.5) * 100
+
+            # Berechne die Energie für das tatsächlich vergangene Zeitintervall
+            energy_this_interval_wh = charging_power * (dt / 3600.0)
+
+            # Skaliere die Energie basierend auf der Simulationsgeschwindigkeit
+            base_speed_increment = 0.2  # Basis-Geschwindigkeit der Simulation
+            speed_scaling_factor = day_cycle_increment / base_speed_increment
+            scaled_energy_this_interval_wh = energy_this_interval_wh * speed_scaling_factor
+
+            # Aktualisiere Zähler und SoC mit der skalierten Energie
+            self.charged_energy += scaled_energy_this_interval_wh
+
+            # Annahme Batteriekapazität 60kWh für SoC-Berechnung
+            soc_increase = (scaled_energy_this_interval_wh / 60000.0) * 100
+            self.soc += soc_increase
+
+            if self.soc >= 100:
+                self.soc = 100
+                self.state = 1
+                print(f"[Wallbox {instance_id}] Ladevorgang abgeschlossen (SoC 100%).")
+
+        elif self.state == 1:  # Bereit
+            charging_power = 0
+
+        elif self.state == 3:  # Fehler
+            charging_power = 0
+            self.fault_timer -= 1
+            if self.fault_timer <= 0:
+                self.state = 1
+                self.fault_code = 0
+                print(f"[Wallbox {instance_id}] Fehlerzustand beendet.")
+
+        # 3. Werte in Register schreiben (ein Abbild für Register 20-25) und für die Web-UI vormerken
+        self.charging_power = charging_power
+        self.write_registers(datablock)
+
+    def report_error(self, e):
+        print(f"Fehler im Wallbox-Update-Thread für Instanz {self.instance_id}: {e}")
+        ui_state.stage("wallboxes", {self.instance_id: {"status": f"Error: {e}"}})
+
+
+class PvFleetSimulation:
+    """
+    Simuliert alle PV-Wechselrichter gemeinsam mit der vektorisierten Engine
+    aus fleet.py. step() erwartet die Datenblöcke aller Instanzen in der
+    Reihenfolge von instance_ids und schreibt pro Gerät den Block 1-17 am Stück.
+    """
+
+    def __init__(self, instance_ids, host_ips):
+        self.instance_ids = list(instance_ids)
+        self.host_ips = list(host_ips)
+        self.index_by_id = {instance_id: i for i, instance_id in enumerate(self.instance_ids)}
+        self.fleet = PvFleet(self.instance_ids, today=current_date())
+
+    def step(self, datablocks, dt=UPDATE_INTERVAL_SECONDS):
+        # Fehlerinjektion prüfen
+        for instance_id, flag in fault_flags.items():
+            if flag and instance_id in self.index_by_id:
+                self.fleet.inject_fault(self.index_by_id[instance_id])
+                fault_flags[instance_id] = False
+                print(f"Manueller Fehler für Instanz {instance_id} injiziert.")
 
+        if self.fleet.reset_daily_yield_if_needed(current_date()):
+            print("Tagesertrag aller PV-Instanzen zurückgesetzt.")
+
+        registers = self.fleet.step(day_cycle_increment, dt)
+        for datablock, row in zip(datablocks, registers.tolist()):
+            datablock.setValues(PV_BLOCK_START, row)
+
+        if not publish_ui_status:
+            return
+        columns = [self.fleet.values[name].tolist() for name in PV_STATUS_FIELDS]
+        ui_state.stage("servers", {
+            instance_id: dict(zip(PV_STATUS_FIELDS, row), host_ip=host_ip)
+            for instance_id, host_ip, row in zip(self.instance_ids, self.host_ips, zip(*columns))
+        })
+
+    def report_error(self, e):
+        print(f"Fehler im Update-Thread der PV-Flotte: {e}")
+        error = {"status": f"Error: {e}"}
+        ui_state.stage("servers", {instance_id: error for instance_id in self.instance_ids})
+
+
+def connect_wallbox_commands(scheduler, simulation, datablock):
+    """Lässt Befehle an eine Wallbox sofort im Takt-Thread bzw. -Task von scheduler verarbeiten."""
+    handler = functools.partial(simulation.run_commands, datablock)
+    simulation.commands.connect(lambda: scheduler.call_soon(handler))
+
+def wallbox_write_handler(instance_id):
+    """on_write für ControlDeviceContext: Schreibzugriffe auf Register 26 als Befehle der Wallbox."""
+    commands = wallbox_commands.setdefault(instance_id, CommandQueue())
+    def on_write(register, value):
+        action = REMOTE_COMMANDS.get(value)
+        if action is not None:
+            commands.put(action)
+    return on_write
 
 # --- Web UI (Flask) ---
 app = Flask(__name__, template_folder='.')
 UI_HOST = "0.0.0.0"
 UI_PORT = 5010
+UI_SERVER = 'waitress' # 'waitress', 'threaded' (werkzeug ohne Debugger) oder 'dev' (web_serving.py)
+UI_THREADS = web_serving.DEFAULT_THREADS
+LIVE_STREAM_INTERVAL_SECONDS = 1.0
+STREAM_RETRY_SECONDS = 60 # Retry-After bei 503 auf /stream, das Dashboard versucht es im selben Abstand erneut
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/data')
-def data():
-    with data_lock:
+def format_ui_sections(snapshot):
+    """Formatierte Geräte-Dicts eines Snapshots (für /data und den Live-Stream)."""
+    return {
+        "servers": {instance_id: format_pv_status(record)
+                    for instance_id, record in snapshot.sections["servers"].items()},
+        "wallboxes": {instance_id: format_wallbox_status(record)
+                      for instance_id, record in snapshot.sections["wallboxes"].items()},
+    }
+
+def sorted_sections(snapshot, raw=False):
+    """Geräte je Abschnitt als nach ID sortierte Liste (ID, Dict), einmal pro Version."""
+    def build(s):
+        sections = s.sections if raw else s.cached('formatted', format_ui_sections)
+        return {section: sorted(devices.items()) for section, devices in sections.items()}
+    return snapshot.cached('sorted_raw' if raw else 'sorted', build)
+
+def encode_data(snapshot, raw=False, query=None):
+    """
+    JSON-Antwort für /data; raw=True liefert die unformatierten Zahlenwerte.
+    Mit query (data_query.DataQuery) nur die gewählten Abschnitte und Geräte,
+    dazu je Abschnitt die Anzahl aller Treffer in "matched".
+    """
+    sections = sorted_sections(snapshot, raw)
+    fleet = snapshot.values["fleet"]
+    if query is None:
         response_data = {
-            "servers": sorted(server_data.items()),
-            "wallboxes": sorted(wallbox_data.items()), # NEU
-            "day_cycle_increment": day_cycle_increment
+            "servers": sections["servers"],
+            "wallboxes": sections["wallboxes"], # NEU
         }
-    return jsonify(response_data)
+    else:
+        raw_sections = sorted_sections(snapshot, raw=True)
+        response_data = {"matched": {}}
+        for section in query.sections:
+            response_data["matched"][section], response_data[section] = query.select(
+                section, sections[section], raw_sections[section])
+        response_data.update(offset=query.offset, limit=query.limit)
+    response_data.update({
+        "fleet": dict(fleet if raw else format_fleet_totals(fleet), meter=meter_address()),
+        "day_cycle_increment": snapshot.values["day_cycle_increment"],
+        "version": snapshot.version
+    })
+    return json.dumps(response_data, separators=(',', ':')).encode('utf-8')
+
+@app.route('/data')
+def data():
+    """
+    Aktueller Snapshot als JSON, einmal pro Version serialisiert und komprimiert
+    (?raw=1: Rohwerte). Filter und Seiten siehe data_query.py; mit ETag und 304.
+    """
+    snapshot = ui_state.current
+    raw = bool(request.args.get('raw'))
+    try:
+        query = DataQuery.parse(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    name = 'data_raw' if raw else 'data'
+    if query is not None:
+        return web_serving.json_response(snapshot.version, lambda: encode_data(snapshot, raw, query))
+    body = lambda: snapshot.cached(name, lambda s: encode_data(s, raw))
+    return web_serving.json_response(snapshot.version, body,
+                                     lambda: snapshot.cached(f'{name}_gzip', lambda s: web_serving.compress(body())))
+
+def ui_snapshot():
+    """Stand der UI-Daten für den Live-Stream (Geräte-Dicts werden nur ersetzt, nie verändert)."""
+    snapshot = ui_state.current
+    return dict(snapshot.cached('formatted', format_ui_sections)), dict(snapshot.values)
+
+live_updates = DeltaBroadcaster(ui_snapshot, interval=LIVE_STREAM_INTERVAL_SECONDS)
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events: ein Voll-Frame, danach nur geänderte Felder; 503, wenn alle Plätze belegt sind."""
+    frames = live_updates.client_stream()
+    if frames is None:
+        response = jsonify({"status": "error", "message": "Too many live streams, poll /data instead"})
+        response.headers['Retry-After'] = str(STREAM_RETRY_SECONDS)
+        return response, 503
+    return Response(frames, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stats')
+def stats():
+    """Zähler des Simulationstakts (Verspätung, ausgelassene Takte), des FC3-Antwort-Caches und der Verbindungen."""
+    counters = {"response_cache": response_cache.as_dict() if RESPONSE_CACHE else None,
+                "connections": connection_limits.counts()}
+    if tick_scheduler is None:
+        return jsonify({"scheduler": None, **counters})
+    return jsonify({"scheduler": tick_scheduler.stats.as_dict(),
+                    "interval_seconds": tick_scheduler.interval,
+                    "simulations": len(tick_scheduler),
+                    **counters})
+
+def scheduler_counters():
+    if tick_scheduler is None:
+        return []
+    stats = tick_scheduler.stats
+    return [(("ticks",), stats.ticks), (("late_ticks",), stats.late_ticks), (("missed_ticks",), stats.missed_ticks)]
+
+REGISTRY.callback('modsim_scheduler_ticks_total', 'Zähler des zentralen Simulationstakts', ('kind',),
+                  scheduler_counters, kind='counter')
+REGISTRY.callback('modsim_ui_snapshot_version', 'Version des aktuellen UI-Snapshots', (),
+                  lambda: [((), ui_state.current.version)])
+
+def response_cache_counters():
+    counts = response_cache.counts()
+    return [(("hit",), counts["hits"]), (("miss",), counts["misses"]), (("bypass",), counts["bypassed"])]
+
+REGISTRY.callback('modsim_response_cache_requests_total',
+                  'FC3-Anfragen aus dem Antwort-Cache (hit), neu kodiert (miss) oder an pymodbus (bypass)',
+                  ('result',), response_cache_counters, kind='counter')
+REGISTRY.callback('modsim_response_cache_entries', 'Vorkodierte FC3-Antworten',
+                  (), lambda: [((), response_cache.counts()["entries"])])
+
+def connection_limit_counters(*names):
+    counts = connection_limits.counts()
+    return [((label,), counts[name]) for label, name in names]
+
+REGISTRY.callback('modsim_modbus_connections_rejected_total',
+                  'Abgewiesene Modbus-TCP-Verbindungen nach Grenze (global je Prozess, listener)', ('limit',),
+                  lambda: connection_limit_counters(("global", "rejected_global"), ("listener", "rejected_listener")),
+                  kind='counter')
+REGISTRY.callback('modsim_modbus_connections_reaped_total', 'Wegen Inaktivität geschlossene Modbus-TCP-Verbindungen',
+                  (), lambda: [((), connection_limits.counts()["reaped_idle"])], kind='counter')
+REGISTRY.callback('modsim_modbus_busy_responses_total',
+                  'Mit Exception 0x06 (Server Device Busy) abgewiesene Anfragen nach Grund (rate, queue)', ('reason',),
+                  lambda: connection_limit_counters(("rate", "busy_rate"), ("queue", "busy_queue")),
+                  kind='counter')
+
+REGISTRY.callback('modsim_devices', 'Geräte je Startzustand (starting, listening, failed)', ('state',),
+                  lambda: [((state,), count) for state, count in device_readiness.counts.items()])
+
+@app.route('/ready')
+def ready():
+    """
+    Startzustand der Flotte: 200, sobald alle Listener gebunden sind, sonst 503
+    (noch im Start oder Fehler). ?detail=1 liefert den Zustand jedes Geräts.
+    """
+    summary = device_readiness.summary(detail=request.args.get('detail') in ('1', 'true'))
+    return jsonify(summary), 200 if summary["ready"] else 503
+
+@app.route('/metrics')
+def metrics():
+    """Metriken im Prometheus-Textformat (Takt, Modbus-Anfragen, Sperren, Threads, Fehler)."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/replay', methods=['GET', 'POST'])
+def replay_control():
+    """Status der Trace-Wiedergabe; POST mit offset/time (Sprung), speed oder loop steuert sie."""
+    if trace_replay is None:
+        return jsonify({"status": "error", "message": "No trace replay active"}), 404
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if 'speed' in data:
+                speed = float(data['speed'])
+                if speed <= 0:
+                    return jsonify({"status": "error", "message": "Speed must be positive"}), 400
+                trace_replay.speed = speed
+            if 'loop' in data:
+                trace_replay.loop = bool(data['loop'])
+            if 'offset' in data:
+                trace_replay.seek(trace_replay.first_time + float(data['offset']))
+            elif 'time' in data:
+                trace_replay.seek(float(data['time']))
+        except (ValueError, TypeError):
+            return jsonify({"status": "error", "message": "Invalid replay parameter"}), 400
+    return jsonify(trace_replay.status())
 
 @app.route('/start_charging/<int:instance_id>', methods=['POST'])
 def start_charging(instance_id):
-    if instance_id in wallbox_controls:
-        wallbox_controls[instance_id]['action'] = 'start_charging'
+    if instance_id in wallbox_commands:
+        wallbox_commands[instance_id].put('start_charging')
         return jsonify({"status": "success", "message": f"Start charging command sent to wallbox {instance_id}"})
     return jsonify({"status": "error", "message": "Invalid wallbox ID"}), 404
 
 @app.route('/stop_charging/<int:instance_id>', methods=['POST'])
 def stop_charging(instance_id):
-    if instance_id in wallbox_controls:
-        wallbox_controls[instance_id]['action'] = 'stop_charging'
+    if instance_id in wallbox_commands:
+        wallbox_commands[instance_id].put('stop_charging')
         return jsonify({"status": "success", "message": f"Stop charging command sent to wallbox {instance_id}"})
     return jsonify({"status": "error", "message": "Invalid wallbox ID"}), 404
 
 @app.route('/inject_wallbox_fault/<int:instance_id>', methods=['POST'])
 def inject_wallbox_fault(instance_id):
-    if instance_id in wallbox_controls:
-        wallbox_controls[instance_id]['action'] = 'inject_fault'
+    if instance_id in wallbox_commands:
+        wallbox_commands[instance_id].put('inject_fault')
         return jsonify({"status": "success", "message": f"Fault injection command sent to wallbox {instance_id}"})
     return jsonify({"status": "error", "message": "Invalid wallbox ID"}), 404
 
@@ -372,9 +642,8 @@ def set_soc(instance_id):
     except (ValueError, TypeError):
         return jsonify({"status": "error", "message": "Invalid SoC value"}), 400
 
-    if instance_id in wallbox_controls:
-        wallbox_controls[instance_id]['action'] = 'set_soc'
-        wallbox_controls[instance_id]['value'] = soc_value
+    if instance_id in wallbox_commands:
+        wallbox_commands[instance_id].put('set_soc', soc_value)
         return jsonify({"status": "success", "message": f"Set SoC command sent to wallbox {instance_id}"})
     return jsonify({"status": "error", "message": "Invalid wallbox ID"}), 404
 
@@ -397,6 +666,7 @@ def set_cycle_speed():
             new_speed = float(data['speed'])
             if 0.1 <= new_speed <= 10.0:
                 day_cycle_increment = new_speed
+                ui_state.commit(day_cycle_increment=new_speed)
                 print(f"Zyklusgeschwindigkeit auf {new_speed} gesetzt.")
                 return jsonify({"status": "success", "message": f"Cycle speed set to {day_cycle_increment}"})
             else:
@@ -406,76 +676,572 @@ def set_cycle_speed():
     return jsonify({"status": "error", "message": "Missing or invalid 'speed' parameter"}), 400
 
 def run_flask_app():
-    print(f"UI wird auf http://{UI_HOST}:{UI_PORT} gestartet...")
-    app.run(host=UI_HOST, port=UI_PORT, debug=True, use_reloader=False)
+    print(f"UI wird auf http://{UI_HOST}:{UI_PORT} gestartet ({UI_SERVER})...")
+    web_serving.serve(app, UI_HOST, UI_PORT, UI_SERVER, UI_THREADS)
 
-def start_modbus_server_instance(host_ip, instance_id, sim_type='pv'):
+def device_label(sim_type, instance_id):
+    """Bezeichnung eines Geräts in den Metriken, z.B. 'pv:3'."""
+    return f"{sim_type}:{instance_id}"
+
+def create_modbus_server(host, port, members, datablocks):
     """
-    Initialisiert und startet eine einzelne Modbus TCP Server Instanz
-    für einen PV-Wechselrichter oder eine Wallbox.
+    ModbusTcpServer für alle Geräte eines Listeners (members aus group_listeners()),
+    mit Anfrage- und Verbindungsmetriken und den Grenzen aus connection_limits.
+    Braucht eine laufende Event-Loop. Mit RESPONSE_CACHE beantwortet er
+    FC3-Anfragen aus vorkodierten Antworten; diese erscheinen nicht in den
+    Anfragemetriken, sondern in response_cache.
     """
-    datablock = ModbusSequentialDataBlock(0, [0] * 100)
-    device_context = ModbusDeviceContext(hr=datablock)
-    context = {1: device_context}
-
+    context = build_server_context({unit_id: datablocks[(sim_type, instance_id)]
+                                    for unit_id, (sim_type, instance_id, _) in members},
+                                   {unit_id: wallbox_write_handler(instance_id)
+                                    for unit_id, (sim_type, instance_id, _) in members if sim_type == 'wallbox'})
+    tracers = modbus_tracers(f"{host}:{port}", {unit_id: device_label(sim_type, instance_id)
+                                                for unit_id, (sim_type, instance_id, _) in members})
+    if RESPONSE_CACHE:
+        return CachingModbusTcpServer(context, cache=response_cache, limits=connection_limits, tracers=tracers,
+                                      address=(host, port))
+    return LimitedModbusTcpServer(context, limits=connection_limits, tracers=tracers, address=(host, port))
+
+async def start_listener(host, port, members, datablocks):
+    """
+    Bindet einen Listener und meldet das Ergebnis für alle seine Geräte in
+    device_readiness und im UI-Status (ohne commit). Liefert den laufenden
+    Server oder None, wenn der Port nicht gebunden werden konnte.
+    """
+    keys = [device_label(sim_type, instance_id) for _, (sim_type, instance_id, _) in members]
+    server = create_modbus_server(host, port, members, datablocks)
+    try:
+        await server.serve_forever(background=True)
+    except (RuntimeError, OSError) as e:
+        print(f"Modbus-Server auf {host}:{port} ({len(members)} Geräte) nicht gestartet: {e}")
+        for _, (sim_type, instance_id, host_ip) in members:
+            set_device_status(host_ip, instance_id, sim_type, f"Error: {e}", commit=False)
+        device_readiness.failed(keys, e)
+        return None
+    device_readiness.listening(keys)
+    return server
+
+def serve_listener(host, port, members, datablocks):
+    """Bedient einen Listener in einer eigenen Event-Loop (ein Thread je Listener im Threads-Modus)."""
+    async def serve():
+        server = await start_listener(host, port, members, datablocks)
+        if server is None:
+            ui_state.commit()
+            return
+        await server.serving
+    asyncio.run(serve())
+
+def device_index(sim_type, instance_id):
+    """Position eines Geräts in der Flotte: erst alle PV-Wechselrichter, dann alle Wallboxen."""
     if sim_type == 'pv':
-        with data_lock:
-            server_data[instance_id] = {"host_ip": host_ip, "status": "Initializing"}
-        print(f"Initialisiere PV Modbus Datastore für Instanz {instance_id} auf {host_ip}:{TCP_PORT}...")
-        target_func = simulate_pv_values
-    elif sim_type == 'wallbox':
-        with data_lock:
-            wallbox_data[instance_id] = {"host_ip": host_ip, "status": "Initializing"}
-        print(f"Initialisiere Wallbox Modbus Datastore für Instanz {instance_id} auf {host_ip}:{TCP_PORT}...")
-        target_func = simulate_wallbox_values
+        return instance_id - 1
+    return len(PV_HOST_IPS) + instance_id - 1
+
+def device_endpoint(sim_type, instance_id):
+    """(host, port, unit_id), unter denen ein Gerät erreichbar ist (siehe addressing.py)."""
+    if ADDRESSING == 'ip':
+        host = (PV_HOST_IPS if sim_type == 'pv' else WALLBOX_HOST_IPS)[instance_id - 1]
+    else:
+        host = LISTEN_HOST
+    return addressing.endpoint(ADDRESSING, device_index(sim_type, instance_id), host, TCP_PORT)
+
+def group_listeners(devices):
+    """{(host, port): [(unit_id, (sim_type, instance_id, host_ip)), ...]} für die Geräte aus devices."""
+    return addressing.group_by_listener((device, device_endpoint(device[0], device[1])) for device in devices)
+
+def meter_endpoint():
+    """(host, port, unit_id) des virtuellen Zählers: METER_HOST_IP im Modus 'ip', sonst der Port nach dem letzten Gerät."""
+    if ADDRESSING == 'ip':
+        return METER_HOST_IP, TCP_PORT, 1
+    device_count = len(PV_HOST_IPS) + len(WALLBOX_HOST_IPS)
+    if not device_count:
+        return LISTEN_HOST, TCP_PORT, 1
+    return LISTEN_HOST, addressing.endpoint(ADDRESSING, device_count - 1, LISTEN_HOST, TCP_PORT)[1] + 1, 1
+
+def meter_address():
+    """Anzeigeadresse des virtuellen Zählers oder None, wenn er nicht aktiv ist."""
+    if meter_datablock is None:
+        return None
+    return addressing.address_label(ADDRESSING, *meter_endpoint())
+
+def configure_addressing(mode, pv_count=None, wallbox_count=None, listen_host=None, base_port=None):
+    """
+    Stellt die Adressierung der Flotte ein. In den Modi 'port' und 'unit' enthalten
+    PV_HOST_IPS/WALLBOX_HOST_IPS danach die Anzeigeadressen der Geräte (z.B.
+    '127.0.0.1:5020/3'), ihre Länge bleibt die Flottengröße. Im Modus 'ip' können
+    die Anzahlen die konfigurierten IP-Listen nur kürzen.
+    """
+    global ADDRESSING, LISTEN_HOST, TCP_PORT, PV_HOST_IPS, WALLBOX_HOST_IPS
+    pv_count = len(PV_HOST_IPS) if pv_count is None else pv_count
+    wallbox_count = len(WALLBOX_HOST_IPS) if wallbox_count is None else wallbox_count
+    if mode == 'ip' and (pv_count > len(PV_HOST_IPS) or wallbox_count > len(WALLBOX_HOST_IPS)):
+        raise ValueError("Im Modus 'ip' braucht jedes Gerät eine eigene IP in PV_HOST_IPS/WALLBOX_HOST_IPS")
+    ADDRESSING = mode
+    LISTEN_HOST = listen_host or LISTEN_HOST
+    TCP_PORT = base_port or TCP_PORT
+    if mode == 'ip':
+        PV_HOST_IPS, WALLBOX_HOST_IPS = PV_HOST_IPS[:pv_count], WALLBOX_HOST_IPS[:wallbox_count]
     else:
+        PV_HOST_IPS = addressing.fleet_addresses(mode, pv_count, 0, LISTEN_HOST, TCP_PORT)
+        WALLBOX_HOST_IPS = addressing.fleet_addresses(mode, wallbox_count, pv_count, LISTEN_HOST, TCP_PORT)
+
+def create_datablock(sim_type, instance_id):
+    """
+    Legt den Holding-Register-Block einer Instanz an: privat als Python-Liste
+    oder, falls ein gemeinsamer Registerspeicher aktiv ist, als Fenster darin.
+    Beide zählen ihre Schreibzugriffe (version) für den FC3-Antwort-Cache.
+    """
+    if register_store is not None:
+        return register_store.datablock(device_index(sim_type, instance_id))
+    return VersionedDataBlock(0, [0] * REGISTERS_PER_DEVICE)
+
+def create_register_store(name=None):
+    """Legt den gemeinsamen Registerspeicher für alle PV-Wechselrichter und Wallboxen an."""
+    global register_store
+    device_count = len(PV_HOST_IPS) + len(WALLBOX_HOST_IPS)
+    register_store = SharedRegisterStore.create(device_count, REGISTERS_PER_DEVICE, name=name)
+    print(f"Gemeinsamer Registerspeicher '{register_store.name}' für {device_count} Geräte angelegt "
+          f"({device_count * REGISTERS_PER_DEVICE * 2 / 1024:.1f} kB).")
+    return register_store
+
+def build_device_context(datablock, on_write=None):
+    """
+    Erzeugt den Gerätekontext für einen Datenblock. Coils, Discrete Inputs und
+    Input Register werden nicht simuliert und bekommen nur einen Platzhalter,
+    statt pymodbus' Standardblöcke mit je 65536 Einträgen (~1,5 MB pro Gerät).
+    Mit on_write meldet der Kontext Client-Schreibzugriffe auf
+    REMOTE_CONTROL_REGISTER (control.ControlDeviceContext).
+    """
+    blocks = dict(
+        di=ModbusSequentialDataBlock(0, [0]),
+        co=ModbusSequentialDataBlock(0, [0]),
+        ir=ModbusSequentialDataBlock(0, [0]),
+        hr=datablock,
+    )
+    if on_write is None:
+        return ModbusDeviceContext(**blocks)
+    return ControlDeviceContext((REMOTE_CONTROL_REGISTER,), on_write, **blocks)
+
+def build_server_context(datablocks_by_unit, write_handlers=None):
+    """
+    Server-Kontext mit einem Gerätekontext je Unit ID ({unit_id: Datenblock});
+    write_handlers ordnet Unit IDs ein on_write für build_device_context() zu.
+    """
+    write_handlers = write_handlers or {}
+    return ModbusServerContext(devices={unit_id: build_device_context(datablock, write_handlers.get(unit_id))
+                                        for unit_id, datablock in datablocks_by_unit.items()}, single=False)
+
+UI_SECTIONS = {'pv': "servers", 'wallbox': "wallboxes"}
+
+def set_device_status(host_ip, instance_id, sim_type, status, commit=True):
+    """
+    Setzt eine reine Statusmeldung (z.B. 'Initializing') für eine Instanz im UI-Status.
+    Mit commit=False wird sie nur vorgemerkt, etwa beim Start vieler Geräte in einer Schleife.
+    """
+    section = UI_SECTIONS.get(sim_type)
+    if section is None:
+        return # der virtuelle Zähler hat keinen eigenen Eintrag im UI-Status
+    ui_state.stage(section, {instance_id: {"host_ip": host_ip, "status": status}})
+    if commit:
+        ui_state.commit()
+
+def init_device_status(host_ip, instance_id, sim_type, commit=True):
+    """Trägt eine Instanz als 'Initializing' in die Web-UI-Daten ein."""
+    set_device_status(host_ip, instance_id, sim_type, "Initializing", commit)
+
+def enable_meter():
+    """
+    Legt die Register des virtuellen Zählers an (Belegung: profiles/fleet_meter.json).
+    Sie werden ab jetzt bei jeder Änderung der Summen in fleet_aggregate neu geschrieben.
+    """
+    global meter_datablock
+    meter_datablock = VersionedDataBlock(0, [0] * REGISTERS_PER_DEVICE)
+    fleet_aggregate.on_change = write_meter_registers
+    write_meter_registers(ui_state.current.values["fleet"])
+    return meter_datablock
+
+def write_meter_registers(totals):
+    meter_datablock.setValues(METER_BLOCK_START, build_meter_register_image(
+        *(totals[name] for name in METER_PROFILE.field_names)))
+
+def meter_listener():
+    """(host, port, members, datablocks) des virtuellen Zählers für start_listener() und serve_listener()."""
+    host, port, unit_id = meter_endpoint()
+    device = ('meter', 1, addressing.address_label(ADDRESSING, host, port, unit_id))
+    return host, port, [(unit_id, device)], {('meter', 1): meter_datablock}
+
+
+# --- asyncio-Modus: alle Server in einer Event-Loop ---
+SIMULATION_CLASSES = {'pv': PvSimulation, 'wallbox': WallboxSimulation}
+
+def get_rss_kb():
+    """Liefert den aktuellen Resident Set Size des Prozesses in kB."""
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Spitzenwert, Linux: kB
+    return 0
+
+def raise_fd_limit():
+    """Hebt das Soft-Limit für Dateideskriptoren an, damit tausende Listener Platz haben."""
+    if resource is None:
         return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as e:
+        print(f"Dateideskriptor-Limit konnte nicht erhöht werden: {e}")
+
+def iter_devices():
+    """Liefert (sim_type, instance_id, host_ip) für alle konfigurierten Geräte."""
+    for i, host_ip in enumerate(PV_HOST_IPS):
+        yield 'pv', i + 1, host_ip
+    for i, host_ip in enumerate(WALLBOX_HOST_IPS):
+        yield 'wallbox', i + 1, host_ip
 
-    update_thread = threading.Thread(target=target_func, args=(datablock, instance_id, host_ip))
-    update_thread.daemon = True
-    update_thread.start()
+def create_datablocks(devices):
+    """Legt die Datenblöcke aller Geräte an, Schlüssel ist (sim_type, instance_id)."""
+    return {(sim_type, instance_id): create_datablock(sim_type, instance_id)
+            for sim_type, instance_id, _ in devices}
 
-    print(f"Modbus TCP Slave ({sim_type}) für Instanz {instance_id} wird auf {host_ip}:{TCP_PORT} gestartet...")
-    StartTcpServer(context=context, address=(host_ip, TCP_PORT))
+def create_pv_fleet_simulation(instance_ids=None):
+    if instance_ids is None:
+        instance_ids = range(1, len(PV_HOST_IPS) + 1)
+    return PvFleetSimulation(instance_ids, [PV_HOST_IPS[instance_id - 1] for instance_id in instance_ids])
 
+def create_tick_scheduler(devices, datablocks, pv_engine='reference', clock=time.monotonic):
+    """
+    Legt den zentralen TickScheduler an und registriert die Simulationen aller
+    Geräte. Mit pv_engine='vector' rechnet eine PvFleetSimulation alle
+    PV-Wechselrichter gemeinsam. clock ersetzt die monotone Uhr (z.B. durch
+    die simulierte Uhr im Batch-Modus).
+    """
+    global tick_scheduler
+    tick_scheduler = TickScheduler(UPDATE_INTERVAL_SECONDS, clock=clock,
+                                   on_tick=ui_state.commit if publish_ui_status else None,
+                                   metrics=scheduler_metrics if collect_metrics else None)
+    fleet_ids = []
+    for sim_type, instance_id, host_ip in devices:
+        if sim_type == 'pv' and pv_engine == 'vector':
+            fleet_ids.append(instance_id)
+            continue
+        simulation = SIMULATION_CLASSES[sim_type](instance_id, host_ip)
+        datablock = datablocks[(sim_type, instance_id)]
+        tick_scheduler.add(simulation, datablock, device_label(sim_type, instance_id))
+        if sim_type == 'wallbox':
+            connect_wallbox_commands(tick_scheduler, simulation, datablock)
+    if fleet_ids:
+        tick_scheduler.add(create_pv_fleet_simulation(fleet_ids),
+                           [datablocks[('pv', instance_id)] for instance_id in fleet_ids], "pv:fleet")
+    return tick_scheduler
+
+def create_frame_source(devices, datablocks):
+    """
+    Liefert eine Funktion, die die Register 0-26 der Geräte (in der Reihenfolge
+    von devices) als uint16-Array (Geräte x Register) ausliest.
+    """
+    if register_store is not None:
+        registers = register_store.as_array()
+        rows = [device_index(sim_type, instance_id) for sim_type, instance_id, _ in devices]
+        return lambda: registers[rows, :FRAME_REGISTERS]
+    blocks = [datablocks[(sim_type, instance_id)] for sim_type, instance_id, _ in devices]
+    return lambda: np.array([block.getValues(0, FRAME_REGISTERS) for block in blocks], dtype=np.uint16)
+
+def start_recording(directory, devices, datablocks, scheduler):
+    """Zeichnet nach jedem Takt die Register aller Geräte spaltenweise auf (recorder.py)."""
+    global frame_recorder
+    frame_recorder = FrameRecorder(directory, devices, scheduler.interval)
+    read_frame = create_frame_source(devices, datablocks)
+    scheduler.add_tick_callback(lambda: frame_recorder.add(time.time(), read_frame()))
+    print(f"Register-Frames von {len(devices)} Geräten werden in {directory} aufgezeichnet.")
+    return frame_recorder
+
+def publish_replayed_frame(sim_type, instance_id, host_ip, registers):
+    """Übernimmt einen wiedergegebenen Registerblock als Rohwerte in den UI-Status."""
+    if not publish_ui_status:
+        return
+    if sim_type == 'pv':
+        ui_state.stage("servers", {instance_id: dict(decode_pv_register_image(registers), host_ip=host_ip)})
+    else:
+        ui_state.stage("wallboxes", {instance_id: dict(decode_wallbox_register_image(registers), host_ip=host_ip)})
+
+def create_trace_replay(path, speed=1.0, loop=False, start=None, only=None):
+    """
+    Öffnet eine Frame-Datei für die Wiedergabe (replay.py). start ist ein
+    datetime oder ein Versatz in Sekunden ab Beginn der Trace.
+    """
+    global trace_replay
+    trace_replay = TraceReplay(path, speed, loop, on_frame=publish_replayed_frame, only=only)
+    if isinstance(start, datetime.datetime):
+        trace_replay.seek(start.timestamp())
+    elif start is not None:
+        trace_replay.seek(trace_replay.first_time + start)
+    return trace_replay
+
+def start_replay(devices, datablocks):
+    """
+    Bindet die in der Trace enthaltenen Geräte an die Wiedergabe. Liefert einen
+    eigenen TickScheduler im Takt der Trace (oder None) und die Geräte, die
+    weiterhin simuliert werden.
+    """
+    if trace_replay is None:
+        return None, devices
+    replayed = trace_replay.bind(devices, datablocks)
+    interval = max(trace_replay.interval / trace_replay.speed, MIN_REPLAY_INTERVAL_SECONDS)
+    scheduler = TickScheduler(interval, on_tick=ui_state.commit,
+                              metrics=scheduler_metrics if collect_metrics else None)
+    scheduler.add(trace_replay, None, "replay")
+    print(f"{len(replayed)} Geräte geben {trace_replay.path} wieder "
+          f"({trace_replay.speed:g}x, Takt {interval:.2f} s{', Schleife' if trace_replay.loop else ''}).")
+    return scheduler, [device for device in devices if (device[0], device[1]) not in replayed]
+
+async def serve_all_async(pv_engine='reference', devices=None, record=None):
+    """
+    Startet alle PV- und Wallbox-Instanzen in einer einzigen asyncio Event-Loop:
+    ein ModbusTcpServer je (IP, Port) und ein Task mit dem TickScheduler für
+    alle Simulationen, ohne eigene Threads pro Gerät. devices schränkt den
+    Start auf eine Teilmenge von iter_devices() ein (z.B. für shards.py),
+    record ist optional ein Verzeichnis für die Aufzeichnung der Register.
+    """
+    raise_fd_limit()
+    rss_before_kb = get_rss_kb()
+    start_time = time.perf_counter()
+
+    devices = list(iter_devices() if devices is None else devices)
+    datablocks = create_datablocks(devices)
+    listeners = group_listeners(devices)
+    for sim_type, instance_id, host_ip in devices:
+        init_device_status(host_ip, instance_id, sim_type, commit=False)
+    device_readiness.expect(device_label(sim_type, instance_id) for sim_type, instance_id, _ in devices)
+    starts = [start_listener(host, port, members, datablocks) for (host, port), members in listeners.items()]
+    if meter_datablock is not None:
+        device_readiness.expect([device_label('meter', 1)])
+        starts.append(start_listener(*meter_listener()))
+    # Alle Listener gleichzeitig binden (der Zähler als letzter fällt beim zip() unten heraus)
+    results = await asyncio.gather(*starts)
+    servers = [server for server in results if server is not None]
+    started = [device for server, members in zip(results, listeners.values()) if server is not None
+               for _, device in members]
+    ui_state.commit()
+    replay_scheduler, simulated = start_replay(started, datablocks)
+    scheduler = create_tick_scheduler(simulated, datablocks, pv_engine)
+    if record:
+        start_recording(record, started, datablocks, scheduler)
+
+    elapsed = time.perf_counter() - start_time
+    rss_delta_kb = get_rss_kb() - rss_before_kb
+    device_count = max(len(started), 1)
+    print(f"{len(started)} Geräte auf {len(servers)} Modbus TCP Listenern in einer Event-Loop gestartet "
+          f"({elapsed:.2f} s, {elapsed / device_count * 1000:.2f} ms/Gerät, "
+          f"RSS +{rss_delta_kb / 1024:.1f} MB, {rss_delta_kb / device_count:.1f} kB/Gerät).")
+    print("Drücken Sie Strg+C zum Beenden.")
+
+    try:
+        if replay_scheduler is None:
+            await scheduler.run_async()
+        else:
+            await asyncio.gather(scheduler.run_async(), replay_scheduler.run_async())
+    finally:
+        for server in servers:
+            await server.shutdown()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PV- und Wallbox-Simulator mit Modbus TCP")
+    parser.add_argument('--mode', choices=['threads', 'asyncio'], default='threads',
+                        help="threads: ein Server- und Simulations-Thread je Gerät (Standard), "
+                             "asyncio: alle Server und Simulationen in einer Event-Loop")
+    parser.add_argument('--pv-engine', choices=['reference', 'vector'], default='reference',
+                        help="reference: skalare Simulation je Wechselrichter (Standard), "
+                             "vector: alle Wechselrichter gemeinsam mit NumPy (fleet.py)")
+    add_addressing_arguments(parser)
+    parser.add_argument('--shared-memory', nargs='?', const='', default=None, metavar='NAME',
+                        help="Register aller Geräte in einem gemeinsamen SharedMemory-Segment "
+                             "ablegen (optional mit festem Namen), damit andere Prozesse sie "
+                             "ohne Kopie lesen und schreiben können")
+    parser.add_argument('--record', metavar='VERZEICHNIS',
+                        help="Register aller Geräte nach jedem Takt spaltenweise in diesem "
+                             "Verzeichnis aufzeichnen (recorder.py)")
+    parser.add_argument('--replay', metavar='TRACE',
+                        help="Register-Frames aus dieser Frame-Datei (frames.py) wiedergeben statt "
+                             "die enthaltenen Geräte zu simulieren")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="Wiedergabegeschwindigkeit als Vielfaches der Echtzeit (Standard: 1)")
+    parser.add_argument('--replay-loop', action='store_true',
+                        help="Trace am Ende von vorn wiedergeben")
+    parser.add_argument('--replay-start', type=parse_replay_start, default=None, metavar='ZEIT',
+                        help="Startpunkt der Wiedergabe: Sekunden ab Beginn der Trace oder "
+                             "Zeitpunkt, z.B. 2024-06-21T12:00")
+    parser.add_argument('--replay-devices', type=parse_device_list, default=None, metavar='LISTE',
+                        help="Nur diese Geräte wiedergeben, z.B. pv:1,pv:2,wallbox:3 "
+                             "(Standard: alle Geräte der Trace)")
+    add_serving_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_addressing_arguments(parser, args)
+    return args
+
+def add_serving_arguments(parser):
+    """Optionen der Modbus-Server (auch von shards.py genutzt)."""
+    parser.add_argument('--meter', action='store_true',
+                        help="Virtuellen Zähler mit den Summen der Flotte als eigenes Modbus-Gerät "
+                             "bedienen (METER_HOST_IP bzw. Port nach dem letzten Gerät)")
+    parser.add_argument('--no-response-cache', dest='response_cache', action='store_false',
+                        help="FC3-Anfragen immer über pymodbus beantworten statt aus vorkodierten "
+                             "Antworten (response_cache.py)")
+    parser.add_argument('--max-connections', type=int, default=connection_limits.max_connections,
+                        help="Modbus-Verbindungen je Prozess, darüber wird sofort geschlossen (0: unbegrenzt)")
+    parser.add_argument('--max-connections-per-listener', type=int, default=connection_limits.max_per_listener,
+                        help="Modbus-Verbindungen je Listener (0: unbegrenzt)")
+    parser.add_argument('--idle-timeout', type=float, default=connection_limits.idle_timeout,
+                        help="Verbindungen ohne Anfrage nach so vielen Sekunden schließen (0: nie)")
+    parser.add_argument('--client-rate', type=float, default=connection_limits.client_rate,
+                        help="Anfragen/s je Client-IP und Listener, darüber Exception 0x06 (0: unbegrenzt)")
+    parser.add_argument('--max-pending', type=int, default=connection_limits.max_pending,
+                        help="Wartende Anfragen je Listener, darüber Exception 0x06 (0: unbegrenzt)")
+    parser.add_argument('--ui-server', choices=web_serving.SERVERS, default=UI_SERVER,
+                        help="Server des Web-UI: waitress (Standard, ohne waitress der Thread-Server von "
+                             "werkzeug), threaded oder dev (Flask-Entwicklungsserver mit Debugger)")
+    parser.add_argument('--ui-threads', type=int, default=UI_THREADS,
+                        help="Worker-Threads von waitress; jeder offene Live-Stream belegt einen, "
+                             f"{web_serving.FREE_THREADS} bleiben immer für die übrigen Anfragen frei")
+    parser.add_argument('--max-stream-clients', type=int, default=live_updates.max_clients,
+                        help="Gleichzeitige Live-Streams, darüber 503 und Polling im Dashboard (0: unbegrenzt, "
+                             f"bei waitress höchstens --ui-threads minus {web_serving.FREE_THREADS})")
+
+def apply_serving_arguments(args):
+    """Übernimmt die Optionen aus add_serving_arguments() in die globale Konfiguration."""
+    global RESPONSE_CACHE, UI_SERVER, UI_THREADS, connection_limits
+    RESPONSE_CACHE = args.response_cache
+    UI_SERVER, UI_THREADS = args.ui_server, args.ui_threads
+    live_updates.max_clients = web_serving.stream_limit(UI_SERVER, UI_THREADS, args.max_stream_clients or None)
+    connection_limits = ConnectionLimits(args.max_connections, args.max_connections_per_listener,
+                                         args.idle_timeout, args.client_rate, args.max_pending)
+
+def add_addressing_arguments(parser):
+    """Optionen für configure_addressing() (auch von shards.py genutzt)."""
+    parser.add_argument('--addressing', choices=addressing.MODES, default=ADDRESSING,
+                        help="ip: eigene IP je Gerät auf TCP_PORT (Standard), port: alle Geräte auf "
+                             "--listen-host mit eigenem Port ab --port, unit: bis zu 247 Geräte je "
+                             "Port, unterschieden über die Unit ID")
+    parser.add_argument('--listen-host', default=LISTEN_HOST,
+                        help=f"IP für die Modi port und unit (Standard: {LISTEN_HOST})")
+    parser.add_argument('--port', type=int, default=TCP_PORT,
+                        help=f"Modbus-Port bzw. erster Port (Standard: {TCP_PORT})")
+    parser.add_argument('--pv-count', type=int, default=None,
+                        help="Anzahl PV-Wechselrichter (Standard: Anzahl in PV_HOST_IPS)")
+    parser.add_argument('--wallbox-count', type=int, default=None,
+                        help="Anzahl Wallboxen (Standard: Anzahl in WALLBOX_HOST_IPS)")
+
+def apply_addressing_arguments(parser, args):
+    try:
+        configure_addressing(args.addressing, args.pv_count, args.wallbox_count, args.listen_host, args.port)
+    except ValueError as e:
+        parser.error(str(e))
 
-def main():
+def parse_replay_start(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text)
+
+def parse_device_list(text):
+    """'pv:1,wallbox:3' -> {('pv', 1), ('wallbox', 3)}"""
+    devices = set()
+    for item in text.split(','):
+        sim_type, _, instance_id = item.strip().partition(':')
+        if sim_type not in SIMULATION_CLASSES or not instance_id.isdigit():
+            raise argparse.ArgumentTypeError(f"Ungültiges Gerät '{item}' (erwartet z.B. pv:1 oder wallbox:3)")
+        devices.add((sim_type, int(instance_id)))
+    return devices
+
+def main(argv=None):
     """
     Hauptfunktion: Initialisiert und startet mehrere Modbus Server Instanzen und das Web-UI.
     """
-    global fault_flags, wallbox_controls
+    global fault_flags, wallbox_commands
+    args = parse_args(argv)
+    apply_serving_arguments(args)
     # Initialisierung für PV-Wechselrichter
     for i in range(len(PV_HOST_IPS)):
         fault_flags[i + 1] = False
     # Initialisierung für Wallboxen
     for i in range(len(WALLBOX_HOST_IPS)):
-        wallbox_controls[i + 1] = {}
+        wallbox_commands[i + 1] = CommandQueue()
+
+    if args.shared_memory is not None:
+        create_register_store(args.shared_memory or None)
+    if args.meter:
+        enable_meter()
+    if args.replay:
+        create_trace_replay(args.replay, args.replay_speed, args.replay_loop, args.replay_start,
+                            args.replay_devices)
 
     ui_thread = threading.Thread(target=run_flask_app)
     ui_thread.daemon = True
     ui_thread.start()
 
+    try:
+        if args.mode == 'asyncio':
+            try:
+                asyncio.run(serve_all_async(pv_engine=args.pv_engine, record=args.record))
+            except KeyboardInterrupt:
+                print("Server werden heruntergefahren...")
+        else:
+            run_threads(args)
+    finally:
+        if frame_recorder is not None:
+            frame_recorder.close()
+        if register_store is not None:
+            register_store.close()
+
+def run_threads(args):
+    """Startet je Listener einen Server-Thread und einen Takt-Thread für alle Simulationen."""
+    devices = list(iter_devices())
+    datablocks = create_datablocks(devices)
+    replay_scheduler, simulated = start_replay(devices, datablocks)
+    scheduler = create_tick_scheduler(simulated, datablocks, args.pv_engine)
+    if args.record:
+        start_recording(args.record, devices, datablocks, scheduler)
+
+    start_time = time.perf_counter()
+    for sim_type, instance_id, host_ip in devices:
+        init_device_status(host_ip, instance_id, sim_type, commit=False)
+    ui_state.commit()
+    device_readiness.expect(device_label(sim_type, instance_id) for sim_type, instance_id, _ in devices)
+    listeners = [(host, port, members, datablocks) for (host, port), members in group_listeners(devices).items()]
+    if meter_datablock is not None:
+        device_readiness.expect([device_label('meter', 1)])
+        listeners.append(meter_listener())
+
+    # Ein Server-Thread je Listener (im Modus 'ip' und 'port' je Gerät); alle binden gleichzeitig
     server_threads = []
-    # PV-Simulatoren starten
-    for i, host_ip in enumerate(PV_HOST_IPS):
-        server_thread = threading.Thread(target=start_modbus_server_instance, args=(host_ip, i + 1, 'pv'))
-        server_thread.daemon = True
-        server_threads.append(server_thread)
-        server_thread.start()
-        print(f"PV-Server-Thread für {host_ip} gestartet.")
-        time.sleep(0.1)
-
-    # Wallbox-Simulatoren starten
-    for i, host_ip in enumerate(WALLBOX_HOST_IPS):
-        server_thread = threading.Thread(target=start_modbus_server_instance, args=(host_ip, i + 1, 'wallbox'))
+    for listener in listeners:
+        server_thread = threading.Thread(target=serve_listener, args=listener)
         server_thread.daemon = True
         server_threads.append(server_thread)
         server_thread.start()
-        print(f"Wallbox-Server-Thread für {host_ip} gestartet.")
-        time.sleep(0.1)
 
-    total_instances = len(PV_HOST_IPS) + len(WALLBOX_HOST_IPS)
-    print(f"{total_instances} Modbus TCP Server Instanzen gestartet.")
+    scheduler_thread = threading.Thread(target=scheduler.run_forever)
+    scheduler_thread.daemon = True
+    scheduler_thread.start()
+    print(f"Takt-Thread für {len(scheduler)} Simulationen gestartet.")
+    if replay_scheduler is not None:
+        replay_thread = threading.Thread(target=replay_scheduler.run_forever)
+        replay_thread.daemon = True
+        replay_thread.start()
+
+    if not device_readiness.wait(BRING_UP_TIMEOUT_SECONDS):
+        print(f"Nicht alle Listener nach {BRING_UP_TIMEOUT_SECONDS} s gebunden.")
+    summary = device_readiness.summary()
+    print(f"{summary['listening']} von {summary['devices']} Geräten auf {len(server_threads)} Modbus TCP Listenern "
+          f"gestartet ({time.perf_counter() - start_time:.2f} s, {summary['failed']} Fehler).")
+    ui_state.commit()
     print("Drücken Sie Strg+C zum Beenden.")
 
     try:
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus-Metriken des Simulators ohne zusätzliche Abhängigkeit.
+
+Counter, Gauge und Histogram halten ihre Werte je Label-Kombination in einem
+kleinen Kind-Objekt; labels() legt es beim ersten Zugriff an, danach kostet
+eine Beobachtung nur ein bisect und zwei Additionen. Histogramm-Kinder sind
+ohne Sperre, weil jedes genau einen Schreiber hat (den Takt eines Geräts, die
+Event-Loop seines Servers oder den Halter der gemessenen Sperre); Zähler, die
+aus mehreren Threads erhöht werden können, sperren. Die Textdarstellung (Prometheus-Format 0.0.4) entsteht
+erst beim Abruf von /metrics. Darüber liegen die Anbindungen an TickScheduler
+(SchedulerMetrics), pymodbus (modbus_tracers) und die UI-Snapshots (TimedLock).
+"""
+
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        """Kind-Objekt für eine Label-Kombination (wird beim ersten Aufruf angelegt)."""
+        try:
+            return self.children[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} erwartet die Labels {self.labelnames}")
+            with self.lock:
+                return self.children.setdefault(values, self._new_child(values))
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for child in list(self.children.values()):
+            child.render(self.name, lines)
+
+
+class _Value:
+    __slots__ = ("label_text", "value", "lock")
+
+    def __init__(self, label_text):
+        self.label_text = label_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, lines):
+        lines.append(f'{name}{self.label_text} {_format_value(self.value)}')
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self, values):
+        return _Value(_label_text(self.labelnames, values))
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValues:
+    __slots__ = ("buckets", "label_texts", "counts", "sum")
+
+    def __init__(self, buckets, labelnames, values):
+        self.buckets = buckets
+        self.label_texts = [_label_text(labelnames + ('le',), values + (_format_value(bound),))
+                            for bound in buckets + (float('inf'),)]
+        self.label_texts.append(_label_text(labelnames, values))
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name, lines):
+        counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for label_text, count in zip(self.label_texts, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{label_text} {cumulative}')
+        lines.append(f'{name}_sum{self.label_texts[-1]} {_format_value(total)}')
+        lines.append(f'{name}_count{self.label_texts[-1]} {cumulative}')
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self, values):
+        return _HistogramValues(self.buckets, self.labelnames, values)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class CallbackMetric:
+    """Metrik, deren Werte erst beim Abruf von callback() als [(Label-Werte, Wert), ...] geliefert werden."""
+
+    def __init__(self, name, documentation, labelnames, callback, kind='gauge'):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.documentation}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for values, value in self.callback():
+            lines.append(f'{self.name}{_label_text(self.labelnames, values)} {_format_value(value)}')
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=()):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, labelnames, callback, kind='gauge'):
+        return self.register(CallbackMetric(name, documentation, labelnames, callback, kind))
+
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat."""
+        lines = []
+        for metric in self.metrics:
+            metric.render(lines)
+        lines.append('')
+        return '\n'.join(lines)
+
+
+# --- Metriken des Simulators ---
+REGISTRY = Registry()
+
+STEP_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5)
+LATENESS_BUCKETS = (1e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+REQUEST_BUCKETS = (5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.05, 0.1)
+LOCK_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 0.01, 0.1)
+
+STEP_SECONDS = REGISTRY.histogram(
+    'modsim_step_duration_seconds', 'Dauer von step() je Simulation', ('device',), STEP_BUCKETS)
+STEP_LATENESS_SECONDS = REGISTRY.histogram(
+    'modsim_step_lateness_seconds', 'Beginn von step() nach der Deadline des Takts', ('device',), LATENESS_BUCKETS)
+SIMULATION_ERRORS = REGISTRY.counter(
+    'modsim_simulation_errors_total', 'Ausnahmen in step() (danach 10 s Pause)', ('device', 'exception'))
+MODBUS_REQUEST_SECONDS = REGISTRY.histogram(
+    'modsim_modbus_request_duration_seconds', 'Modbus-Anfragen vom Empfang bis zum Senden der Antwort',
+    ('device', 'function'), REQUEST_BUCKETS)
+MODBUS_EXCEPTIONS = REGISTRY.counter(
+    'modsim_modbus_exception_responses_total', 'Modbus-Exception-Antworten', ('device', 'function', 'code'))
+MODBUS_CONNECTIONS = REGISTRY.gauge(
+    'modsim_modbus_connections', 'Offene Modbus-TCP-Verbindungen je Listener', ('listener',))
+MODBUS_CONNECTIONS_ACCEPTED = REGISTRY.counter(
+    'modsim_modbus_connections_accepted_total', 'Angenommene Modbus-TCP-Verbindungen je Listener', ('listener',))
+LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    'modsim_lock_wait_seconds', 'Wartezeit auf eine Sperre', ('lock',), LOCK_BUCKETS)
+LOCK_HOLD_SECONDS = REGISTRY.histogram(
+    'modsim_lock_hold_seconds', 'Haltedauer einer Sperre', ('lock',), LOCK_BUCKETS)
+REGISTRY.callback('modsim_threads', 'Laufende Python-Threads', (), lambda: [((), threading.active_count())])
+
+
+class SchedulerMetrics:
+    """Anbindung eines TickScheduler: Dauer und Verspätung je Simulation, Fehler je Simulation."""
+
+    def device(self, label):
+        """Histogramme (Dauer, Verspätung) einer Simulation; der Scheduler merkt sie sich je Eintrag."""
+        return STEP_SECONDS.labels(label), STEP_LATENESS_SECONDS.labels(label)
+
+    def count_error(self, label, exception):
+        SIMULATION_ERRORS.labels(label, type(exception).__name__).inc()
+
+
+def modbus_tracers(listener, devices):
+    """
+    Liefert eine Funktion, die für jede neue Verbindung eines pymodbus-Servers
+    ein eigenes Paar (trace_pdu, trace_connect) erzeugt. listener benennt den
+    Socket (für die Verbindungszähler), devices ordnet die Unit IDs den
+    Gerätenamen zu. Die Latenz wird vom Dekodieren der Anfrage bis zum Kodieren
+    der Antwort gemessen und je Verbindung über die Transaktions-ID zugeordnet;
+    die Clients zählen ihre IDs unabhängig voneinander.
+    """
+    request_children = {}
+    connections = MODBUS_CONNECTIONS.labels(listener)
+    accepted = MODBUS_CONNECTIONS_ACCEPTED.labels(listener)
+
+    def connection_tracers():
+        pending = {}
+
+        def trace_pdu(sending, pdu):
+            if not sending:
+                pending[pdu.transaction_id] = (time.perf_counter(), pdu.function_code)
+                return pdu
+            started = pending.pop(pdu.transaction_id, None)
+            if started is None:
+                return pdu
+            start, function_code = started
+            key = (pdu.dev_id, function_code)
+            child = request_children.get(key)
+            if child is None:
+                device = devices.get(pdu.dev_id, "unknown")
+                child = request_children[key] = MODBUS_REQUEST_SECONDS.labels(device, str(function_code))
+            child.observe(time.perf_counter() - start)
+            if pdu.function_code & 0x80:
+                MODBUS_EXCEPTIONS.labels(devices.get(pdu.dev_id, "unknown"), str(function_code),
+                                         str(getattr(pdu, 'exception_code', 0))).inc()
+            return pdu
+
+        def trace_connect(connected):
+            if connected:
+                connections.inc()
+                accepted.inc()
+            else:
+                connections.dec()
+                pending.clear()
+
+        return trace_pdu, trace_connect
+
+    return connection_tracers
+
+
+class TimedLock:
+    """threading.Lock als Kontextmanager, der Warte- und Haltezeit misst."""
+
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self._wait = LOCK_WAIT_SECONDS.labels(name)
+        self._hold = LOCK_HOLD_SECONDS.labels(name)
+        self._acquired_at = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = acquired = time.perf_counter()
+        self._wait.observe(acquired - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._hold.observe(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+        return False
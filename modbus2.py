@@ -1,77 +1,485 @@
-# test_permanent.py
-#
-# Angepasste Version, die zyklisch einen Bereich von IP-Adressen abfragt.
-
-from pyModbusTCP.client import ModbusClient
-import time
-
-# --- Konfiguration ---
-# Liste der abzufragenden IP-Adressen
-INVERTER_IPS = [f'10.10.10.{i}' for i in range(120, 132)] # Erzeugt 10.10.10.120 bis 10.10.10.131
-
-INVERTER_PORT = 5020
-UNIT_ID = 1
-QUERY_INTERVAL = 30 # Sekunden Pause zwischen den Abfragezyklen
-
-def to_signed_int16(val):
-    """Wandelt einen 16-Bit-Wert (unsigned) in einen signed-Integer um."""
-    if val > 32767:
-        return val - 65536
-    return val
-
-def query_device(ip, port, unit_id):
-    """Fragt ein einzelnes Modbus-Gerät ab und gibt die Daten aus."""
-    print(f"--- Abfrage für Gerät: {ip} ---")
-
-    # Client für die Abfrage initialisieren
-    client = ModbusClient(host=ip, port=port, unit_id=unit_id, auto_open=True, timeout=5)
-    
-    # RTU over TCP Modus aktivieren
-    client.rtu_over_tcp = True
-
-    # Register lesen (Adresse 0, Anzahl 3)
-    response_regs = client.read_holding_registers(0, 3)
-    
-    # Verbindung wird durch die Bibliothek oder bei Zerstörung des Objekts geschlossen.
-    # explizites client.close() ist in kurzen Skripten dennoch eine gute Praxis.
-    client.close()
-
-    # Auswertung
-    if response_regs:
-        print(f"Daten von {ip} erfolgreich empfangen!")
-
-        # Werte auslesen und umrechnen
-        raw_voltage = to_signed_int16(response_regs[0])
-        raw_current = to_signed_int16(response_regs[1])
-        power = to_signed_int16(response_regs[2])
-
-        # Skalierungsfaktoren anwenden
-        voltage = raw_voltage / 10.0
-        current = raw_current / 10.0
-
-        print(f"  Spannung: {voltage:.1f} V")
-        print(f"  Strom:    {current:.1f} A")
-        print(f"  Leistung: {power} W")
-    else:
-        print(f"Fehler: Konnte keine Daten vom Gerät {ip} lesen.")
-
-# --- Hauptprogramm ---
-if __name__ == "__main__":
-    try:
-        print("Starte kontinuierliche Modbus-Abfrage. Zum Beenden Strg+C drücken.")
-        while True:
-            print("\n" + "="*40)
-            print(f"Starte neuen Abfragezyklus um {time.strftime('%H:%M:%S')}")
-            print("="*40)
-
-            for ip_address in INVERTER_IPS:
-                query_device(ip_address, INVERTER_PORT, UNIT_ID)
-                time.sleep(0.5) # Kurze Pause zwischen den Geräten, um sie nicht zu fluten
-
-            print("\n" + "="*40)
-            print(f"Alle Geräte abgefragt. Warte {QUERY_INTERVAL} Sekunden bis zum nächsten Zyklus.")
-            print("="*40)
-            time.sleep(QUERY_INTERVAL)
-
-    except KeyboardInterrupt:
-        print("\nSkript vom Benutzer beendet.")
\ No newline at end of file
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Abfrage-Client und Lastgenerator für den PV- und Wallbox-Simulator.
+
+Alle Geräte werden gleichzeitig über dauerhafte TCP-Verbindungen (Pool mit
+--connections Verbindungen je Gerät) abgefragt. Jede Anfrage liest mit FC3
+den kompletten Block: PV-Register 1-17 bzw. Wallbox-Register 20-26. Je
+Verbindung ist standardmäßig höchstens eine Anfrage offen, denn pymodbus
+bearbeitet von mehreren Anfragen in einem TCP-Segment nur die erste; mehr
+Parallelität entsteht über --connections. Mit --max-in-flight 0 werden
+Anfragen auf derselben Verbindung gepipelinet (Zuordnung über die
+Transaction-ID des Modbus-TCP-Headers), z.B. für Server ohne diese Grenze.
+
+    python3 modbus2.py                                  # Werte zyklisch anzeigen
+    python3 modbus2.py --mode load --duration 30 --concurrency 256
+    python3 modbus2.py --mode load --rate 5000 --pv-hosts 127.0.1.1-200 --wallbox-hosts ''
+    python3 modbus2.py --mode load --addressing unit --pv-count 500 --wallbox-count 500
+
+Mit --addressing port oder unit werden die Geräte wie im Simulator
+(addressing.py) über Ports bzw. Unit IDs auf --host adressiert; Geräte hinter
+einem Listener teilen sich dessen Verbindungen.
+
+Im Lastmodus werden Anfragen/s, Fehler sowie p50/p90/p99-Latenzen und ein
+Latenzhistogramm ausgegeben. Mit --rate wird die Latenz ab dem geplanten
+Sendezeitpunkt gemessen, Wartezeiten durch Überlast zählen also mit.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import struct
+import time
+
+import addressing
+from register_map import (
+    PV_BLOCK_START, PV_BLOCK_SIZE, WALLBOX_BLOCK_START, REMOTE_CONTROL_REGISTER,
+    decode_pv_register_image, decode_wallbox_register_image,
+)
+
+# --- Konfiguration ---
+# Liste der abzufragenden IP-Adressen
+INVERTER_IPS = [f'10.10.10.{i}' for i in range(120, 132)] # Erzeugt 10.10.10.120 bis 10.10.10.131
+WALLBOX_IPS = [f'10.10.10.{i}' for i in range(140, 152)]
+
+INVERTER_PORT = 5020
+UNIT_ID = 1
+QUERY_INTERVAL = 30 # Sekunden Pause zwischen den Abfragezyklen
+REQUEST_TIMEOUT = 5
+MAX_IN_FLIGHT = 1 # offene Anfragen je Verbindung; pymodbus bearbeitet je TCP-Segment nur eine
+RECONNECT_DELAY = 1.0
+REPORT_INTERVAL = 5
+
+# Register sind 1-basiert dokumentiert, auf dem Draht beginnt die Adresse bei 0
+PV_READ = (PV_BLOCK_START - 1, PV_BLOCK_SIZE)
+WALLBOX_READ = (WALLBOX_BLOCK_START - 1, REMOTE_CONTROL_REGISTER - WALLBOX_BLOCK_START + 1)
+
+READ_HOLDING_REGISTERS = 3
+MBAP = struct.Struct('>HHHB')
+READ_REQUEST = struct.Struct('>HHHBBHH')
+
+
+class ModbusError(Exception):
+    """Exception-Antwort des Servers (Funktionscode | 0x80)."""
+
+    def __init__(self, exception_code):
+        super().__init__(f"Modbus-Exception {exception_code:#04x}")
+        self.exception_code = exception_code
+
+
+class ModbusConnection:
+    """
+    Eine dauerhafte Modbus-TCP-Verbindung. Anfragen werden sofort gesendet;
+    ein Lese-Task ordnet die Antworten über die Transaction-ID zu, daher
+    können mehrere Anfragen gleichzeitig offen sein. max_in_flight begrenzt
+    das; gegen pymodbus auf 1, denn es bearbeitet von mehreren Anfragen in
+    einem TCP-Segment nur die erste.
+    """
+
+    def __init__(self, host, port=INVERTER_PORT, unit_id=UNIT_ID, max_in_flight=None):
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.transaction_ids = itertools.cycle(range(1, 0x10000))
+        self.read_task = None
+        self.connect_lock = asyncio.Lock()
+        self.retry_at = 0.0
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        async with self.connect_lock:
+            if self.connected:
+                return
+            now = time.monotonic()
+            if now < self.retry_at:
+                await asyncio.sleep(self.retry_at - now)
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), REQUEST_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                self.retry_at = time.monotonic() + RECONNECT_DELAY
+                raise
+            self.read_task = asyncio.create_task(self._read_responses(self.reader))
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                transaction_id, _protocol, length, _unit = MBAP.unpack(await reader.readexactly(MBAP.size))
+                pdu = await reader.readexactly(length - 1)
+                future = self.pending.pop(transaction_id, None)
+                if future is None or future.done():
+                    continue
+                if pdu[0] & 0x80:
+                    future.set_exception(ModbusError(pdu[1]))
+                else:
+                    byte_count = pdu[1]
+                    future.set_result(list(struct.unpack(f'>{byte_count // 2}H', pdu[2:2 + byte_count])))
+        except (OSError, asyncio.IncompleteReadError, struct.error) as e:
+            self._fail_pending(ConnectionError(f"Verbindung zu {self.host} verloren: {e!r}"))
+
+    def _fail_pending(self, error):
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = None
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def read_holding_registers(self, address, count, unit_id=None):
+        if self.in_flight is None:
+            return await self._read_holding_registers(address, count, unit_id)
+        async with self.in_flight:
+            return await self._read_holding_registers(address, count, unit_id)
+
+    async def _read_holding_registers(self, address, count, unit_id):
+        if not self.connected:
+            await self.connect()
+        transaction_id = next(self.transaction_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[transaction_id] = future
+        self.writer.write(READ_REQUEST.pack(transaction_id, 0, 6, self.unit_id if unit_id is None else unit_id,
+                                            READ_HOLDING_REGISTERS, address, count))
+        try:
+            return await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        finally:
+            self.pending.pop(transaction_id, None)
+
+    async def close(self):
+        if self.read_task is not None:
+            self.read_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class LatencyHistogram:
+    """Latenzen in logarithmischen Klassen (10 µs bis 100 s, 20 Klassen je Dekade)."""
+
+    BUCKETS_PER_DECADE = 20
+    MIN_SECONDS = 1e-5
+    BUCKET_COUNT = 7 * BUCKETS_PER_DECADE
+
+    def __init__(self):
+        self.counts = [0] * (self.BUCKET_COUNT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= self.MIN_SECONDS:
+            bucket = 0
+        else:
+            bucket = min(int(math.log10(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DECADE) + 1,
+                         self.BUCKET_COUNT)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def upper_bound(self, bucket):
+        return self.MIN_SECONDS * 10 ** (bucket / self.BUCKETS_PER_DECADE)
+
+    def percentile(self, fraction):
+        """Obergrenze der Klasse, in die das Quantil fraction fällt (in Sekunden)."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p90_ms": self.percentile(0.90) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+    def render(self, width=40):
+        """Textdarstellung der belegten Klassen."""
+        used = [bucket for bucket, bucket_count in enumerate(self.counts) if bucket_count]
+        if not used:
+            return "  (keine Messwerte)"
+        peak = max(self.counts)
+        lines = []
+        for bucket in range(used[0], used[-1] + 1):
+            bucket_count = self.counts[bucket]
+            bar = '#' * max(1 if bucket_count else 0, round(bucket_count / peak * width))
+            lines.append(f"  <= {self.upper_bound(bucket) * 1000:9.3f} ms {bucket_count:9d} {bar}")
+        return "\n".join(lines)
+
+
+class RatePacer:
+    """Verteilt Sendezeitpunkte gleichmäßig auf rate Anfragen pro Sekunde."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = time.perf_counter()
+
+    async def wait(self):
+        """Wartet auf den nächsten Sendezeitpunkt und liefert ihn zurück."""
+        slot = self.next_slot
+        self.next_slot += self.interval
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return slot
+
+
+class LoadStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.interval_histogram = LatencyHistogram()
+        self.errors = 0
+        self.exceptions = 0
+        self.error_types = {}
+
+    def add_error(self, error):
+        if isinstance(error, ModbusError):
+            self.exceptions += 1
+        else:
+            self.errors += 1
+        name = type(error).__name__
+        self.error_types[name] = self.error_types.get(name, 0) + 1
+
+
+def parse_hosts(text):
+    """'10.10.10.120-131,10.10.10.140' -> Liste einzelner IP-Adressen."""
+    hosts = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        prefix, _, last = item.rpartition('.')
+        if '-' in last:
+            first, end = (int(value) for value in last.split('-'))
+            hosts.extend(f"{prefix}.{i}" for i in range(first, end + 1))
+        else:
+            hosts.append(item)
+    return hosts
+
+
+def build_targets(pv_hosts, wallbox_hosts, port, unit_id, connections_per_device, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Liefert (sim_type, host, Verbindung, Adresse, Anzahl, Unit ID) je Verbindung;
+    max_in_flight offene Anfragen je Verbindung (None: unbegrenzt).
+    """
+    targets = []
+    for sim_type, hosts, (address, count) in (('pv', pv_hosts, PV_READ), ('wallbox', wallbox_hosts, WALLBOX_READ)):
+        for host in hosts:
+            for _ in range(connections_per_device):
+                targets.append((sim_type, host, ModbusConnection(host, port, unit_id, max_in_flight),
+                                address, count, unit_id))
+    return targets
+
+
+def build_shared_targets(mode, host, base_port, pv_count, wallbox_count, connections_per_listener,
+                         max_in_flight=MAX_IN_FLIGHT):
+    """
+    Ziele für die Adressierung 'port' oder 'unit' (addressing.py). Je Listener
+    werden connections_per_listener Verbindungen mit je max_in_flight offenen
+    Anfragen aufgebaut, die sich alle Geräte dahinter teilen; host ist dann die
+    Anzeigeadresse des Geräts.
+    """
+    listener_connections = {}
+    targets = []
+    for index in range(pv_count + wallbox_count):
+        sim_type, (address, count) = ('pv', PV_READ) if index < pv_count else ('wallbox', WALLBOX_READ)
+        device_host, port, unit_id = addressing.endpoint(mode, index, host, base_port)
+        connections = listener_connections.get((device_host, port))
+        if connections is None:
+            connections = listener_connections[(device_host, port)] = [
+                ModbusConnection(device_host, port, unit_id, max_in_flight) for _ in range(connections_per_listener)]
+        label = addressing.address_label(mode, device_host, port, unit_id)
+        targets.extend((sim_type, label, connection, address, count, unit_id) for connection in connections)
+    return targets
+
+
+async def run_load(targets, duration, concurrency, rate=0.0, report_interval=REPORT_INTERVAL):
+    """
+    Erzeugt duration Sekunden lang Last mit concurrency gleichzeitig offenen
+    Anfragen (optional auf rate Anfragen/s begrenzt) und liefert das Ergebnis als Dict.
+    """
+    stats = LoadStats()
+    pacer = RatePacer(rate) if rate > 0 else None
+    next_target = itertools.cycle(targets)
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker():
+        while True:
+            slot = await pacer.wait() if pacer is not None else time.perf_counter()
+            if slot >= deadline:
+                return
+            _sim_type, _host, connection, address, count, unit_id = next(next_target)
+            try:
+                await connection.read_holding_registers(address, count, unit_id)
+            except (ModbusError, OSError, ConnectionError, asyncio.TimeoutError) as e:
+                stats.add_error(e)
+                continue
+            latency = time.perf_counter() - slot
+            stats.histogram.add(latency)
+            stats.interval_histogram.add(latency)
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(report_interval)
+            interval, stats.interval_histogram = stats.interval_histogram, LatencyHistogram()
+            summary = interval.summary()
+            print(f"  {time.perf_counter() - start:6.1f} s  {summary['count'] / report_interval:9.0f} Anfragen/s  "
+                  f"p50 {summary['p50_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms  "
+                  f"Fehler {stats.errors + stats.exceptions}")
+
+    report_task = asyncio.create_task(reporter()) if report_interval else None
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if report_task is not None:
+            report_task.cancel()
+        for connection in {id(target[2]): target[2] for target in targets}.values():
+            await connection.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "devices": len({(sim_type, host) for sim_type, host, *_ in targets}),
+        "connections": len({id(target[2]) for target in targets}),
+        "concurrency": concurrency,
+        "target_rate": rate,
+        "duration_s": elapsed,
+        "requests": stats.histogram.count,
+        "requests_per_s": stats.histogram.count / elapsed if elapsed else 0.0,
+        "errors": stats.errors,
+        "modbus_exceptions": stats.exceptions,
+        "error_types": stats.error_types,
+        "latency": stats.histogram.summary(),
+        "histogram": stats.histogram,
+    }
+
+
+async def query_device(sim_type, host, connection, address, count, unit_id):
+    """Fragt ein einzelnes Gerät ab und gibt die Daten aus."""
+    try:
+        registers = await connection.read_holding_registers(address, count, unit_id)
+    except (ModbusError, OSError, ConnectionError, asyncio.TimeoutError) as e:
+        return f"--- {'PV' if sim_type == 'pv' else 'Wallbox'} {host}: Fehler: {e!r}"
+    if sim_type == 'pv':
+        values = decode_pv_register_image(registers)
+        return (f"--- PV {host}: {values['active_power']} W, {values['ac_voltage']:.1f} V, "
+                f"{values['ac_current']:.2f} A, Tagesertrag {values['daily_yield_wh']} Wh, "
+                f"Zustand {values['operating_state']}, Fehler {values['fault_code']}")
+    values = decode_wallbox_register_image(registers)
+    return (f"--- Wallbox {host}: Zustand {values['state']}, {values['charging_power']} W, "
+            f"SoC {values['soc']} %, geladen {values['charged_energy_wh']} Wh, Fehler {values['fault_code']}")
+
+
+async def monitor(targets, interval):
+    """Fragt alle Geräte zyklisch gleichzeitig ab (ein Abfragezyklus alle interval Sekunden)."""
+    try:
+        while True:
+            print("\n" + "="*40)
+            print(f"Starte neuen Abfragezyklus um {time.strftime('%H:%M:%S')}")
+            print("="*40)
+            started = time.perf_counter()
+            for line in await asyncio.gather(*(query_device(*target) for target in targets)):
+                print(line)
+            print(f"Alle {len(targets)} Geräte in {(time.perf_counter() - started) * 1000:.1f} ms abgefragt. "
+                  f"Warte {interval} Sekunden bis zum nächsten Zyklus.")
+            await asyncio.sleep(interval)
+    finally:
+        for connection in {id(target[2]): target[2] for target in targets}.values():
+            await connection.close()
+
+
+def print_load_result(result):
+    latency = result["latency"]
+    print(f"\n{result['requests']} Anfragen an {result['devices']} Geräte über {result['connections']} Verbindungen "
+          f"in {result['duration_s']:.1f} s: {result['requests_per_s']:.0f} Anfragen/s "
+          f"(Nebenläufigkeit {result['concurrency']}"
+          f"{', Zielrate %.0f/s' % result['target_rate'] if result['target_rate'] else ''}).")
+    print(f"Latenz: Mittel {latency['mean_ms']:.2f} ms, p50 {latency['p50_ms']:.2f} ms, "
+          f"p90 {latency['p90_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms, max {latency['max_ms']:.2f} ms")
+    print(f"Fehler: {result['errors']} Verbindung/Timeout, {result['modbus_exceptions']} Modbus-Exceptions "
+          f"{result['error_types'] or ''}")
+    print("Latenzhistogramm:")
+    print(result["histogram"].render())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Modbus-Abfrage und Lastgenerator für den PV-/Wallbox-Simulator")
+    parser.add_argument('--mode', choices=['monitor', 'load'], default='monitor',
+                        help="monitor: Werte zyklisch anzeigen (Standard), load: Lasttest")
+    parser.add_argument('--pv-hosts', type=parse_hosts, default=INVERTER_IPS,
+                        help="PV-Wechselrichter, z.B. 10.10.10.120-131 (Standard: INVERTER_IPS)")
+    parser.add_argument('--wallbox-hosts', type=parse_hosts, default=WALLBOX_IPS,
+                        help="Wallboxen, z.B. 10.10.10.140-151 ('' = keine)")
+    parser.add_argument('--port', type=int, default=INVERTER_PORT,
+                        help="Modbus-Port bzw. erster Port bei --addressing port/unit")
+    parser.add_argument('--unit-id', type=int, default=UNIT_ID)
+    parser.add_argument('--addressing', choices=addressing.MODES, default='ip',
+                        help="ip: Geräte aus --pv-hosts/--wallbox-hosts (Standard), port/unit: "
+                             "Geräte auf --host über Ports bzw. Unit IDs wie im Simulator")
+    parser.add_argument('--host', default='127.0.0.1', help="IP des Simulators bei --addressing port/unit")
+    parser.add_argument('--pv-count', type=int, default=len(INVERTER_IPS),
+                        help="Anzahl PV-Wechselrichter bei --addressing port/unit")
+    parser.add_argument('--wallbox-count', type=int, default=len(WALLBOX_IPS),
+                        help="Anzahl Wallboxen bei --addressing port/unit")
+    parser.add_argument('--connections', type=int, default=1,
+                        help="Dauerhafte Verbindungen je Gerät bzw. je Listener (Standard: 1)")
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help="Offene Anfragen je Verbindung (Standard: 1; 0 = Pipelining ohne Grenze)")
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help="Gleichzeitig offene Anfragen insgesamt im Lastmodus (Standard: 64)")
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="Anfragen pro Sekunde im Lastmodus; 0 = so viele wie möglich (Standard)")
+    parser.add_argument('--duration', type=float, default=30.0,
+                        help="Dauer des Lasttests in Sekunden (Standard: 30)")
+    parser.add_argument('--interval', type=float, default=QUERY_INTERVAL,
+                        help="Sekunden zwischen zwei Abfragezyklen im Monitor-Modus")
+    parser.add_argument('--json', metavar='DATEI',
+                        help="Ergebnis des Lasttests zusätzlich als JSON in diese Datei schreiben")
+    return parser.parse_args(argv)
+
+
+# --- Hauptprogramm ---
+def main(argv=None):
+    args = parse_args(argv)
+    if args.addressing == 'ip':
+        targets = build_targets(args.pv_hosts, args.wallbox_hosts, args.port, args.unit_id, args.connections,
+                                args.max_in_flight or None)
+    else:
+        targets = build_shared_targets(args.addressing, args.host, args.port, args.pv_count,
+                                       args.wallbox_count, args.connections, args.max_in_flight or None)
+    if not targets:
+        print("Keine Geräte angegeben.")
+        return
+    try:
+        if args.mode == 'monitor':
+            print("Starte kontinuierliche Modbus-Abfrage. Zum Beenden Strg+C drücken.")
+            asyncio.run(monitor(targets, args.interval))
+            return
+        print(f"Lasttest: {len({id(target[2]) for target in targets})} Verbindungen, Nebenläufigkeit {args.concurrency}, "
+              f"{'Rate %.0f/s' % args.rate if args.rate else 'maximale Rate'}, {args.duration:.0f} s")
+        result = asyncio.run(run_load(targets, args.duration, args.concurrency, args.rate))
+        print_load_result(result)
+        if args.json:
+            with open(args.json, 'w') as json_file:
+                json.dump({key: value for key, value in result.items() if key != "histogram"}, json_file, indent=2)
+    except KeyboardInterrupt:
+        print("\nSkript vom Benutzer beendet.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Startzustand der Geräte für den Endpunkt /ready.
+
+Jedes Gerät ist 'starting', bis sein Listener gebunden ist ('listening'),
+oder 'failed' mit der Fehlermeldung. expect() meldet Geräte an, listening()
+und failed() melden das Ergebnis eines Listeners für alle seine Geräte auf
+einmal. wait() blockiert, bis kein Gerät mehr startet; so kann der Start alle
+Listener gleichzeitig binden, statt nach jedem eine feste Zeit zu warten.
+"""
+
+import threading
+import time
+
+STARTING = 'starting'
+LISTENING = 'listening'
+FAILED = 'failed'
+
+
+class DeviceReadiness:
+    """Thread-sicherer Startzustand je Gerät (Schlüssel z.B. 'pv:3')."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.devices = {} # Schlüssel -> (Zustand, Fehlermeldung oder None)
+        self.counts = {STARTING: 0, LISTENING: 0, FAILED: 0}
+        self.started_at = None
+        self.settled_at = None
+        self.settled = threading.Event()
+        self.settled.set()
+
+    def _set(self, key, state, error=None):
+        previous = self.devices.get(key)
+        if previous is not None:
+            self.counts[previous[0]] -= 1
+        self.devices[key] = (state, error)
+        self.counts[state] += 1
+
+    def _update_events(self):
+        if self.counts[STARTING]:
+            self.settled.clear()
+            self.settled_at = None
+        else:
+            if self.settled_at is None:
+                self.settled_at = self.clock()
+            self.settled.set()
+
+    def expect(self, keys):
+        """Meldet Geräte als 'starting' an (auch erneut, z.B. beim Neustart eines Shards)."""
+        with self.lock:
+            if self.started_at is None or not self.counts[STARTING]:
+                self.started_at = self.clock()
+            for key in keys:
+                self._set(key, STARTING)
+            self._update_events()
+
+    def listening(self, keys):
+        with self.lock:
+            for key in keys:
+                self._set(key, LISTENING)
+            self._update_events()
+
+    def failed(self, keys, error):
+        with self.lock:
+            for key in keys:
+                self._set(key, FAILED, str(error))
+            self._update_events()
+
+    def update(self, states):
+        """Übernimmt {Schlüssel: (Zustand, Fehlermeldung)} aus states() eines anderen Prozesses."""
+        with self.lock:
+            for key, (state, error) in states.items():
+                self._set(key, state, error)
+            self._update_events()
+
+    def states(self):
+        with self.lock:
+            return dict(self.devices)
+
+    def wait(self, timeout=None):
+        """Wartet, bis kein Gerät mehr startet; False bei Zeitüberschreitung."""
+        return self.settled.wait(timeout)
+
+    @property
+    def ready(self):
+        """True, wenn mindestens ein Gerät angemeldet ist und alle lauschen."""
+        counts = self.counts
+        return bool(counts[LISTENING]) and not counts[STARTING] and not counts[FAILED]
+
+    def summary(self, detail=False):
+        """Zusammenfassung für /ready; detail=True listet den Zustand jedes Geräts."""
+        with self.lock:
+            end = self.settled_at if self.settled_at is not None else self.clock()
+            result = {
+                "ready": self.ready,
+                "devices": len(self.devices),
+                **self.counts,
+                "startup_seconds": None if self.started_at is None else round(end - self.started_at, 3),
+                "errors": {key: error for key, (state, error) in self.devices.items() if state == FAILED},
+            }
+            if detail:
+                result["device_states"] = {key: state for key, (state, _) in self.devices.items()}
+            return result
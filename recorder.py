@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Spaltenorientierte Aufzeichnung aller Register-Frames.
+
+FrameRecorder sammelt pro Takt den Registerstand aller Geräte in einem
+Puffer und schreibt ihn erst, wenn chunk_frames Takte voll sind, am Stück als
+Chunk in ein Verzeichnis:
+
+    meta.json                     Geräteliste, Registeranzahl, Taktintervall
+    chunk_000000.time.npy         float64[T]          Zeitstempel (Unix-Zeit)
+    chunk_000000.registers.npy    uint16[G, R, T]     Register je Gerät und Register über die Zeit
+
+Da die Zeitachse innen liegt, ist der Verlauf eines Registers eines Geräts
+innerhalb eines Chunks zusammenhängend. RecordingReader.query() öffnet nur
+die Chunks, die den angefragten Zeitraum überlappen, per Memory-Mapping und
+liest nur die angefragten Werte.
+"""
+
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+from frames import FRAME_REGISTERS
+
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_FRAMES = 1800 # eine Stunde bei 2 s Takt
+
+
+def _chunk_paths(directory, number):
+    base = os.path.join(directory, f"chunk_{number:06d}")
+    return f"{base}.time.npy", f"{base}.registers.npy"
+
+
+def _chunk_numbers(directory):
+    paths = glob.glob(os.path.join(glob.escape(directory), "chunk_*.registers.npy"))
+    return sorted(int(os.path.basename(path)[6:12]) for path in paths)
+
+
+class FrameRecorder:
+    """
+    Nimmt Frames (Zeitstempel, uint16-Array Geräte x Register) entgegen und
+    schreibt sie chunkweise. devices ist eine Liste von (sim_type, instance_id,
+    host_ip) in Zeilenreihenfolge. Ein bestehendes Verzeichnis wird fortgesetzt.
+    """
+
+    def __init__(self, directory, devices, interval, register_count=FRAME_REGISTERS,
+                 chunk_frames=DEFAULT_CHUNK_FRAMES):
+        self.directory = directory
+        self.devices = [list(device) for device in devices]
+        self.register_count = register_count
+        self.times = np.zeros(chunk_frames)
+        self.buffer = np.zeros((chunk_frames, len(self.devices), register_count), dtype=np.uint16)
+        self.buffered = 0
+        self.frames_written = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "devices": self.devices,
+            "register_count": register_count,
+            "interval_seconds": interval,
+        }
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as meta_file:
+                existing = json.load(meta_file)
+            if existing["devices"] != self.devices or existing["register_count"] != register_count:
+                raise ValueError(f"Aufzeichnung in {directory} passt nicht zur aktuellen Geräteliste")
+        else:
+            with open(meta_path, 'w') as meta_file:
+                json.dump(meta, meta_file, indent=2)
+        numbers = _chunk_numbers(directory)
+        self.next_chunk = numbers[-1] + 1 if numbers else 0
+
+    def add(self, timestamp, registers):
+        """Übernimmt einen Frame; registers darf breiter als register_count sein."""
+        with self.lock:
+            self.times[self.buffered] = timestamp
+            self.buffer[self.buffered] = registers[:, :self.register_count]
+            self.buffered += 1
+            if self.buffered == len(self.times):
+                self._write_chunk()
+
+    def flush(self):
+        """Schreibt auch einen unvollständigen Chunk (z.B. beim Beenden)."""
+        with self.lock:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        if not self.buffered:
+            return
+        time_path, registers_path = _chunk_paths(self.directory, self.next_chunk)
+        # (T, G, R) -> (G, R, T): Zeitreihen je Gerät und Register liegen zusammenhängend
+        columns = np.ascontiguousarray(self.buffer[:self.buffered].transpose(1, 2, 0))
+        np.save(registers_path, columns)
+        np.save(time_path, self.times[:self.buffered])
+        self.frames_written += self.buffered
+        self.next_chunk += 1
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+class RecordingReader:
+    """Liest Zeitreihen aus einem Aufzeichnungsverzeichnis, ohne ganze Chunks zu laden."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as meta_file:
+            self.meta = json.load(meta_file)
+        self.devices = [tuple(device) for device in self.meta["devices"]]
+        self.index_by_device = {(sim_type, instance_id): i
+                                for i, (sim_type, instance_id, _) in enumerate(self.devices)}
+
+    def device_index(self, sim_type, instance_id):
+        return self.index_by_device[(sim_type, instance_id)]
+
+    def chunks(self):
+        """Liefert (Zeitstempel, Register) je Chunk als Memory-Mappings."""
+        for number in _chunk_numbers(self.directory):
+            time_path, registers_path = _chunk_paths(self.directory, number)
+            yield np.load(time_path, mmap_mode='r'), np.load(registers_path, mmap_mode='r')
+
+    def query(self, device, register, start=None, end=None, count=1):
+        """
+        Verlauf von count Registern ab register für Gerät device (Zeilenindex
+        oder (sim_type, instance_id)) im Zeitraum start <= t < end (Unix-Zeit,
+        None = offen). Liefert (times float64[N], values uint16[N, count]).
+        """
+        if isinstance(device, tuple):
+            device = self.device_index(*device)
+        if register < 0 or register + count > self.meta["register_count"]:
+            raise IndexError(f"Register {register}..{register + count - 1} nicht aufgezeichnet")
+        times, values = [], []
+        for chunk_times, chunk_registers in self.chunks():
+            if not len(chunk_times):
+                continue
+            if (end is not None and chunk_times[0] >= end) or (start is not None and chunk_times[-1] < start):
+                continue
+            first = 0 if start is None else int(np.searchsorted(chunk_times, start, side='left'))
+            last = len(chunk_times) if end is None else int(np.searchsorted(chunk_times, end, side='left'))
+            times.append(np.array(chunk_times[first:last]))
+            values.append(np.array(chunk_registers[device, register:register + count, first:last]).T)
+        if not times:
+            return np.zeros(0), np.zeros((0, count), dtype=np.uint16)
+        return np.concatenate(times), np.concatenate(values)
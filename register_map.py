@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Register-Belegung der simulierten PV-Wechselrichter und Wallboxen."""
+
+from device_profiles import load_profile
+
+# --- PV-Register-Adressen (Holding Registers, beginnend bei 0) ---
+# Hinweis: Die Adressen sind um 1 verschoben gegenüber der üblichen Modbus-Dokumentation
+VOLTAGE_REGISTER = 1          # AC Spannung (U)
+CURRENT_REGISTER = 2          # AC Strom (I)
+APPARENT_POWER_REGISTER = 3   # Scheinleistung (S = U*I), ehemals POWER_REGISTER
+
+# NEUE REGISTER
+# Leistungswerte
+ACTIVE_POWER_REGISTER = 4     # Wirkleistung (P = S * cos(phi)), Einheit: W
+POWER_FACTOR_REGISTER = 5     # Leistungsfaktor (cos(phi)), skaliert * 100
+REACTIVE_POWER_REGISTER = 6   # Blindleistung (Q), Einheit: VAR
+
+# Netzparameter
+FREQUENCY_REGISTER = 7        # Netzfrequenz, skaliert * 100 (z.B. 5001 für 50.01 Hz)
+
+# Energiezähler (32-Bit Werte, belegen je 2 Register)
+DAILY_YIELD_REGISTER_H = 8    # Tagesertrag High Word, Einheit: Wh
+DAILY_YIELD_REGISTER_L = 9    # Tagesertrag Low Word
+TOTAL_YIELD_REGISTER_H = 10   # Gesamtertrag High Word, Einheit: kWh
+TOTAL_YIELD_REGISTER_L = 11   # Gesamtertrag Low Word
+
+# Status und Diagnose
+OPERATING_STATE_REGISTER = 12 # Betriebszustand (0=Aus, 1=Standby, 2=Einspeisung, 3=Fehler)
+DEVICE_TEMP_REGISTER = 13     # Gerätetemperatur, skaliert * 10 (°C)
+FAULT_CODE_REGISTER = 14      # Fehlercode
+
+# DC-Seite
+DC_VOLTAGE_REGISTER = 15      # DC-Spannung, skaliert * 10 (V)
+DC_CURRENT_REGISTER = 16      # DC-Strom, skaliert * 10 (A)
+DC_POWER_REGISTER = 17        # DC-Leistung (P_DC), Einheit: W
+
+# Skalierungsfaktoren
+VOLTAGE_SCALING = 10.0
+CURRENT_SCALING = 100.0
+POWER_FACTOR_SCALING = 100.0
+FREQUENCY_SCALING = 100.0
+TEMP_SCALING = 10.0
+DC_VOLTAGE_SCALING = 10.0
+DC_CURRENT_SCALING = 100.0
+
+# --- Wallbox-Register-Adressen ---
+WALLBOX_STATE_REGISTER = 20      # 1:Bereit, 2:Ladevorgang, 3:Fehler
+CHARGING_POWER_REGISTER = 21     # Ladeleistung in W
+STATE_OF_CHARGE_REGISTER = 22    # SoC in %
+CHARGED_ENERGY_REGISTER = 23     # Geladene Energie (UINT32), Wh
+WALLBOX_FAULT_CODE_REGISTER = 25 # Fehlercode (0=OK, 201=Ladefehler)
+REMOTE_CONTROL_REGISTER = 26     # Fernsteuerung (1=Start, 2=Stop)
+
+
+def split_32bit_value(value):
+    """Teilt einen 32-Bit-Wert in zwei 16-Bit-Werte (High und Low Word)."""
+    value = int(value)
+    high_word = (value >> 16) & 0xFFFF
+    low_word = value & 0xFFFF
+    return [high_word, low_word]
+
+
+# --- Registerabbilder ---
+# Die Simulation schreibt pro Zyklus ein zusammenhängendes Abbild je Block mit
+# einem einzigen setValues-Aufruf. So sieht ein Client (FC3) nie einen halb
+# aktualisierten Datensatz. Belegung, Typen und Skalierung der Blöcke stehen in
+# profiles/pv_inverter.json und profiles/wallbox.json (device_profiles.py).
+PV_PROFILE = load_profile("pv_inverter")
+WALLBOX_PROFILE = load_profile("wallbox")
+
+PV_BLOCK_START = PV_PROFILE.start
+PV_BLOCK_SIZE = PV_PROFILE.size
+
+# Register 26 (Fernsteuerung) gehört nicht zum Abbild, sonst würde ein zwischen
+# zwei Zyklen geschriebener Befehl beim nächsten Blockschreiben überschrieben.
+WALLBOX_BLOCK_START = WALLBOX_PROFILE.start
+WALLBOX_BLOCK_SIZE = WALLBOX_PROFILE.size
+
+
+# Die übersetzten Kodierer direkt, ohne zusätzliche Aufrufebene:
+# build_pv_register_image(ac_voltage, ..., dc_power) -> Register 1-17,
+# build_wallbox_register_image(state, charging_power, soc, charged_energy_wh,
+# fault_code) -> Register 20-25, decode_* als Umkehrung -> {Name: Messwert}
+# mit den Feldnamen des Profils (wie im UI-Status).
+build_pv_register_image = PV_PROFILE.encode
+build_wallbox_register_image = WALLBOX_PROFILE.encode
+decode_pv_register_image = PV_PROFILE.decode
+decode_wallbox_register_image = WALLBOX_PROFILE.decode
+
+# Virtueller Zähler mit den Summen der Flotte (aggregate.py), Register 1-22;
+# build_meter_register_image erwartet die Werte in der Reihenfolge von
+# METER_PROFILE.field_names.
+METER_PROFILE = load_profile("fleet_meter")
+METER_BLOCK_START = METER_PROFILE.start
+build_meter_register_image = METER_PROFILE.encode
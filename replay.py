@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Wiedergabe aufgezeichneter Register-Frames über die normalen Datenblöcke.
+
+TraceReplay liest eine Frame-Datei (frames.py, z.B. aus batch.py --output
+oder aus echten Messdaten konvertiert) per Memory-Mapping und schreibt pro
+Takt den zum Wiedergabezeitpunkt passenden Frame in die Datenblöcke der
+gebundenen Geräte. Es wird immer nur der aktuelle Frame gelesen, nie die
+ganze Datei. Die Wiedergabezeit läuft mit speed-facher Geschwindigkeit und
+wird aus der tatsächlich vergangenen Zeit (dt des TickScheduler) fortgeschrieben;
+seek() springt an eine beliebige Stelle, mit loop beginnt sie am Ende von vorn.
+"""
+
+import bisect
+import threading
+
+from frames import open_frames
+from register_map import PV_BLOCK_START, PV_BLOCK_SIZE, WALLBOX_BLOCK_START, WALLBOX_BLOCK_SIZE
+
+BLOCKS = {
+    'pv': (PV_BLOCK_START, PV_BLOCK_SIZE),
+    'wallbox': (WALLBOX_BLOCK_START, WALLBOX_BLOCK_SIZE),
+}
+
+
+class _TimeColumn:
+    """Sequenz der Frame-Zeitstempel für bisect, ohne die Spalte zu kopieren."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return float(self.frames[index]['time'])
+
+
+class TraceReplay:
+    """
+    Spielt eine Frame-Datei ab. bind() ordnet Geräte der Flotte den Zeilen der
+    Trace zu (über sim_type und instance_id, optional nur die in only enthaltenen
+    Paare); step(_, dt) passt in den TickScheduler.
+    on_frame(sim_type, instance_id, host_ip, registers) wird je Gerät mit dem
+    geschriebenen Block aufgerufen (z.B. für das Web-UI).
+    """
+
+    def __init__(self, path, speed=1.0, loop=False, start=None, on_frame=None, only=None):
+        self.path = path
+        self.header, self.frames = open_frames(path)
+        if not len(self.frames):
+            raise ValueError(f"Trace {path} enthält keine Frames")
+        self.times = _TimeColumn(self.frames)
+        self.first_time = self.times[0]
+        self.last_time = self.times[len(self.frames) - 1]
+        self.interval = self.header["interval_seconds"]
+        self.rows = {(sim_type, instance_id): row
+                     for row, (sim_type, instance_id, _) in enumerate(self.header["devices"])}
+        self.speed = speed
+        self.loop = loop
+        self.on_frame = on_frame
+        self.only = only
+        self.targets = []
+        self.position = 0
+        self.written_position = None
+        self.trace_time = self.first_time
+        self.loops = 0
+        self.lock = threading.Lock()
+        if start is not None:
+            self.seek(start)
+
+    @property
+    def duration(self):
+        """Abgedeckte Zeitspanne inklusive des letzten Frames."""
+        return self.last_time - self.first_time + self.interval
+
+    def bind(self, devices, datablocks):
+        """
+        Bindet alle Geräte aus devices, die in der Trace vorkommen, an ihre
+        Datenblöcke. Liefert die Menge der gebundenen (sim_type, instance_id).
+        """
+        bound = set()
+        for sim_type, instance_id, host_ip in devices:
+            key = (sim_type, instance_id)
+            if key not in self.rows or (self.only is not None and key not in self.only):
+                continue
+            self.targets.append((self.rows[key], sim_type, instance_id, host_ip, datablocks[key]))
+            bound.add(key)
+        return bound
+
+    def seek(self, timestamp):
+        """Springt zum Frame, der zum Zeitpunkt timestamp (Unix-Zeit der Trace) gilt."""
+        with self.lock:
+            self.trace_time = min(max(timestamp, self.first_time), self.last_time)
+            self.position = max(bisect.bisect_right(self.times, self.trace_time) - 1, 0)
+
+    def advance(self, seconds):
+        """Stellt die Wiedergabezeit um seconds vor und sucht den gültigen Frame."""
+        with self.lock:
+            trace_time = self.trace_time + seconds
+            if trace_time >= self.last_time + self.interval:
+                if self.loop:
+                    loops, offset = divmod(trace_time - self.first_time, self.duration)
+                    trace_time = self.first_time + offset
+                    self.position = 0
+                    self.loops += int(loops)
+                else:
+                    trace_time = self.last_time
+            self.trace_time = trace_time
+            # Normalfall: wenige Frames weiter, sonst binäre Suche
+            position = self.position
+            for _ in range(8):
+                if position + 1 < len(self.frames) and self.times[position + 1] <= trace_time:
+                    position += 1
+                else:
+                    break
+            else:
+                position = max(bisect.bisect_right(self.times, trace_time, lo=position) - 1, 0)
+            self.position = position
+
+    def write_frame(self):
+        """Schreibt den aktuellen Frame in die Datenblöcke aller gebundenen Geräte."""
+        position = self.position
+        if position == self.written_position:
+            return False
+        registers = self.frames[position]['registers']
+        for row, sim_type, instance_id, host_ip, datablock in self.targets:
+            start, size = BLOCKS[sim_type]
+            block = registers[row, start:start + size].tolist()
+            datablock.setValues(start, block)
+            if self.on_frame is not None:
+                self.on_frame(sim_type, instance_id, host_ip, block)
+        self.written_position = position
+        return True
+
+    def step(self, _datablock, dt):
+        if self.written_position is not None: # erster Takt zeigt den Startframe
+            self.advance(dt * self.speed)
+        self.write_frame()
+
+    def report_error(self, e):
+        print(f"Fehler bei der Wiedergabe von {self.path}: {e}")
+
+    def status(self):
+        return {
+            "path": self.path,
+            "devices": len(self.targets),
+            "frames": len(self.frames),
+            "position": self.position,
+            "trace_time": self.trace_time,
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "speed": self.speed,
+            "loop": self.loop,
+            "loops": self.loops,
+        }
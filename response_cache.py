@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Vorkodierte FC3-Antworten für die häufig gelesenen Registerfenster.
+
+SCADA-Systeme lesen dieselben Fenster (z.B. PV 1-17, Wallbox 20-26) viele
+Male pro Sekunde, die Register ändern sich aber nur einmal pro Takt oder bei
+einem Schreibzugriff. CachingModbusTcpServer beantwortet FC3-Anfragen direkt
+aus den empfangenen Bytes: die Antwort (ohne Transaktions-ID) wird beim
+ersten Lesen nach einer Änderung kodiert und danach unverändert gesendet,
+ohne PDU-Dekodierung, Datastore-Zugriff und Task je Anfrage. Mehrere
+FC3-Anfragen in einem Paket (Pipelining) werden so auch gleich beantwortet.
+
+Ein Eintrag gilt, solange sich die Version des Datenblocks nicht ändert
+(VersionedDataBlock und SharedMemoryDataBlock erhöhen sie bei jedem
+setValues, also im Takt der Simulation und bei jedem Client-Schreibzugriff).
+Schreibzugriffe anderer Prozesse auf den gemeinsamen Registerspeicher ändern
+die Version nicht und werden erst mit dem nächsten Takt des Geräts sichtbar.
+Alle anderen Anfragen gehen unverändert an pymodbus.
+"""
+
+import struct
+
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+from connection_limits import LimitedModbusTcpServer, LimitedRequestHandler
+
+MAX_WINDOWS_PER_DEVICE = 8 # mehr verschiedene Fenster je Gerät (z.B. ein Scanner) werden nicht gespeichert
+MAX_READ_COUNT = 125 # Grenze für FC3 laut Modbus-Spezifikation
+
+# MBAP-Kopf und PDU einer FC3-Anfrage: Transaktions-ID, Protokoll, Länge, Unit ID, FC, Adresse, Anzahl
+_REQUEST = struct.Struct('>HHHBBHH')
+# Antwort ab dem Protokollfeld: Protokoll, Länge, Unit ID, FC, Byteanzahl
+_RESPONSE_HEADER = struct.Struct('>HHBBB')
+
+
+class VersionedDataBlock(ModbusSequentialDataBlock):
+    """ModbusSequentialDataBlock, dessen version jedes setValues erhöht."""
+
+    def __init__(self, address, values):
+        super().__init__(address, values)
+        self.version = 0
+
+    def setValues(self, address, values):
+        result = super().setValues(address, values)
+        self.version += 1 # erst nach dem Schreiben, damit kein Eintrag neue Werte mit alter Version hält
+        return result
+
+
+class ResponseCache:
+    """Zähler aller CachingModbusTcpServer eines Prozesses (und gemeldete Zähler der Shards)."""
+
+    def __init__(self):
+        self.servers = []
+        self.remote = {} # z.B. Shard-ID -> Zähler aus counts() des Shards
+
+    def counts(self):
+        totals = {"hits": 0, "misses": 0, "bypassed": 0, "entries": 0}
+        for server in list(self.servers):
+            totals["hits"] += server.hits
+            totals["misses"] += server.misses
+            totals["bypassed"] += server.bypassed
+            totals["entries"] += sum(len(windows) for windows in server.responses.values())
+        for remote in list(self.remote.values()):
+            for name in totals:
+                totals[name] += remote.get(name, 0)
+        return totals
+
+    def as_dict(self):
+        counts = self.counts()
+        lookups = counts["hits"] + counts["misses"]
+        return dict(counts, hit_ratio=counts["hits"] / lookups if lookups else 0.0)
+
+
+class CachingRequestHandler(LimitedRequestHandler):
+    """Beantwortet FC3-Anfragen aus dem Cache des Servers (Grenzen wie LimitedRequestHandler)."""
+
+    def cached_answer(self, data, offset):
+        if len(data) - offset < _REQUEST.size:
+            return None
+        _, _, length, unit_id, function_code, address, count = _REQUEST.unpack_from(data, offset)
+        if length != 6 or function_code != 3:
+            return None
+        return self.server.cached_response(unit_id, address, count)
+
+
+class CachingModbusTcpServer(LimitedModbusTcpServer):
+    """
+    LimitedModbusTcpServer mit vorkodierten FC3-Antworten je (Unit ID, Adresse,
+    Anzahl). Datenblöcke ohne version werden nicht zwischengespeichert.
+    """
+
+    handler_class = CachingRequestHandler
+
+    def __init__(self, context, cache=None, **kwargs):
+        super().__init__(context, **kwargs)
+        self.datablocks = {unit_id: device.store['h'] for unit_id, device in context
+                           if hasattr(device.store['h'], 'version')}
+        self.responses = {unit_id: {} for unit_id in self.datablocks} # -> {(Adresse, Anzahl): (Version, Bytes)}
+        self.hits = self.misses = self.bypassed = 0
+        if cache is not None:
+            cache.servers.append(self)
+
+    def cached_response(self, unit_id, address, count):
+        """Antwort ab dem Protokollfeld oder None, wenn pymodbus die Anfrage bearbeiten soll."""
+        datablock = self.datablocks.get(unit_id)
+        if datablock is None:
+            self.bypassed += 1
+            return None
+        version = datablock.version
+        windows = self.responses[unit_id]
+        entry = windows.get((address, count))
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        if not 1 <= count <= MAX_READ_COUNT or (entry is None and len(windows) >= MAX_WINDOWS_PER_DEVICE):
+            self.bypassed += 1
+            return None
+        values = datablock.getValues(address + 1, count) # wie ModbusDeviceContext: Protokolladresse + 1
+        if isinstance(values, ExcCodes):
+            self.bypassed += 1 # Exception-Antwort kommt von pymodbus
+            return None
+        response = _RESPONSE_HEADER.pack(0, 3 + 2 * count, unit_id, 3, 2 * count) + struct.pack(f'>{count}H', *values)
+        windows[(address, count)] = (version, response)
+        self.misses += 1
+        return response
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Zentraler Takt für alle Simulationen.
+
+Statt dass jede Simulation nach ihrer Arbeit time.sleep(UPDATE_INTERVAL_SECONDS)
+aufruft (die tatsächliche Periode ist dann Intervall + Rechenzeit und driftet
+unter Last), feuert TickScheduler alle registrierten Simulationen auf festen
+Deadlines der monotonen Uhr. Jede Simulation bekommt die tatsächlich seit
+ihrem letzten Schritt vergangene Zeit (dt) für die Energieintegration.
+Verspätungen und ausgelassene Takte werden gezählt. call_soon() führt
+Arbeit zwischen den Takten aus (z.B. Steuerbefehle), ohne auf den nächsten
+Takt zu warten.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+ERROR_RETRY_SECONDS = 10
+
+
+class SchedulerStats:
+    """Zähler für Takte, Verspätungen und ausgelassene Takte."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.late_ticks = 0
+        self.missed_ticks = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.last_tick_duration = 0.0
+        self.max_tick_duration = 0.0
+
+    def as_dict(self):
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "missed_ticks": self.missed_ticks,
+            "last_lateness_ms": self.last_lateness * 1000,
+            "max_lateness_ms": self.max_lateness * 1000,
+            "mean_lateness_ms": self.total_lateness / self.ticks * 1000 if self.ticks else 0.0,
+            "last_tick_duration_ms": self.last_tick_duration * 1000,
+            "max_tick_duration_ms": self.max_tick_duration * 1000,
+        }
+
+
+class _Entry:
+    __slots__ = ("simulation", "datablock", "label", "histograms", "last_step", "retry_at")
+
+    def __init__(self, simulation, datablock, label, histograms):
+        self.simulation = simulation
+        self.datablock = datablock
+        self.label = label
+        self.histograms = histograms
+        self.last_step = None
+        self.retry_at = 0.0
+
+
+class TickScheduler:
+    """
+    Führt step(datablock, dt) aller registrierten Simulationen alle interval
+    Sekunden aus. Ein Takt gilt als verspätet, wenn er mehr als late_threshold
+    nach seiner Deadline beginnt; liegt er mehr als ein Intervall zurück,
+    werden die verpassten Deadlines übersprungen und als missed gezählt.
+    on_tick und alle mit add_tick_callback() registrierten Funktionen werden nach
+    jedem Takt aufgerufen (z.B. um die UI-Daten zu veröffentlichen). Mit
+    call_soon() eingeplante Funktionen laufen sofort im Takt-Thread bzw. -Task
+    (run_forever/run_async), spätestens aber vor dem nächsten Takt.
+    Mit metrics (metrics.SchedulerMetrics) werden Dauer, Verspätung und
+    Fehler jeder Simulation unter ihrem label erfasst.
+    """
+
+    def __init__(self, interval, clock=time.monotonic, late_threshold=0.05, on_tick=None, metrics=None):
+        self.interval = interval
+        self.clock = clock
+        self.late_threshold = late_threshold
+        self.tick_callbacks = [] if on_tick is None else [on_tick]
+        self.entries = []
+        self.stats = SchedulerStats()
+        self.lock = threading.Lock()
+        self.next_deadline = None
+        self.metrics = metrics
+        self.pending_calls = deque()
+        self.wakeup = threading.Event()
+        self.loop = None # Event-Loop von run_async, dann weckt call_soon über async_wakeup
+        self.async_wakeup = None
+
+    def add(self, simulation, datablock, label=None):
+        label = label or type(simulation).__name__
+        histograms = self.metrics.device(label) if self.metrics is not None else None
+        with self.lock:
+            self.entries.append(_Entry(simulation, datablock, label, histograms))
+
+    def add_tick_callback(self, callback):
+        self.tick_callbacks.append(callback)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def call_soon(self, func):
+        """Plant func() im Takt-Thread bzw. -Task ein; aus jedem Thread aufrufbar."""
+        self.pending_calls.append(func)
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.async_wakeup.set)
+        else:
+            self.wakeup.set()
+
+    def run_pending(self):
+        """Führt alle mit call_soon() eingeplanten Funktionen aus."""
+        pending_calls = self.pending_calls
+        while pending_calls:
+            func = pending_calls.popleft()
+            try:
+                func()
+            except Exception as e:
+                print(f"Fehler in eingeplanter Funktion {func!r}: {e}")
+
+    def run_tick(self):
+        """
+        Führt einen Takt aus, falls die nächste Deadline erreicht ist, und
+        liefert die Wartezeit bis zur folgenden Deadline in Sekunden.
+        """
+        if self.pending_calls:
+            self.run_pending()
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        if now < self.next_deadline:
+            return self.next_deadline - now
+
+        stats = self.stats
+        lateness = now - self.next_deadline
+        if lateness >= self.interval:
+            missed = int(lateness // self.interval)
+            stats.missed_ticks += missed
+            self.next_deadline += missed * self.interval
+            lateness = now - self.next_deadline
+        stats.ticks += 1
+        stats.last_lateness = lateness
+        stats.total_lateness += lateness
+        stats.max_lateness = max(stats.max_lateness, lateness)
+        if lateness > self.late_threshold:
+            stats.late_ticks += 1
+
+        with self.lock:
+            entries = list(self.entries)
+        metrics = self.metrics
+        deadline = self.next_deadline
+        step_start = now
+        for entry in entries:
+            if now < entry.retry_at:
+                if metrics is not None:
+                    step_start = self.clock() # der übersprungene Eintrag zählt nicht zum nächsten Schritt
+                continue
+            dt = self.interval if entry.last_step is None else now - entry.last_step
+            entry.last_step = now
+            try:
+                entry.simulation.step(entry.datablock, dt)
+            except Exception as e:
+                entry.simulation.report_error(e)
+                entry.retry_at = now + ERROR_RETRY_SECONDS
+                entry.last_step = None # nach der Pause nicht über die Fehlerzeit integrieren
+                if metrics is not None:
+                    metrics.count_error(entry.label, e)
+            if metrics is not None:
+                # Ende dieses Schritts = Beginn des nächsten, spart einen Uhrzugriff
+                step_end = self.clock()
+                duration_histogram, lateness_histogram = entry.histograms
+                duration_histogram.observe(step_end - step_start)
+                lateness_histogram.observe(step_start - deadline)
+                step_start = step_end
+        for callback in self.tick_callbacks:
+            callback()
+
+        finished = self.clock()
+        stats.last_tick_duration = finished - now
+        stats.max_tick_duration = max(stats.max_tick_duration, stats.last_tick_duration)
+        self.next_deadline += self.interval
+        return max(0.0, self.next_deadline - finished)
+
+    def run_forever(self):
+        """Taktschleife für einen eigenen Thread; call_soon() weckt sie vor der Deadline."""
+        wakeup = self.wakeup
+        while True:
+            if wakeup.wait(self.run_tick()):
+                wakeup.clear()
+                self.run_pending()
+
+    async def run_async(self):
+        """Taktschleife als Task in einer asyncio Event-Loop; call_soon() weckt sie vor der Deadline."""
+        self.async_wakeup = wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        if self.pending_calls:
+            wakeup.set()
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.run_tick())
+            except asyncio.TimeoutError:
+                continue
+            wakeup.clear()
+            self.run_pending()
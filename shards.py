@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verteilter Start der PV- und Wallbox-Flotte auf mehrere Prozesse (Shards).
+
+Der Supervisor teilt PV_HOST_IPS/WALLBOX_HOST_IPS in N Teile und startet je
+Teil einen Worker-Prozess mit eigener asyncio Event-Loop (main.serve_all_async).
+Die Register liegen im gemeinsamen SharedRegisterStore, der Status jedes Shards
+wird über eine Queue an den Supervisor gemeldet und dort in dessen ui_state
+zusammengeführt, sodass das Web-UI unverändert alle Geräte zeigt.
+Steuerbefehle aus dem Web-UI leitet der Supervisor an den zuständigen Shard
+weiter. Abgestürzte Shards werden automatisch neu gestartet.
+
+    python3 shards.py --shards 4 --pv-engine vector
+"""
+
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import main
+from connection_limits import ConnectionLimits
+from control import CommandQueue
+from shared_store import REGISTERS_PER_DEVICE, SharedRegisterStore
+
+STATUS_INTERVAL_SECONDS = main.UPDATE_INTERVAL_SECONDS
+FORWARD_INTERVAL_SECONDS = 0.1
+RESTART_DELAY_SECONDS = 2
+MAX_RESTART_DELAY_SECONDS = 60
+
+
+def partition_devices(devices, shard_count):
+    """
+    Teilt die Geräteliste in shard_count zusammenhängende, etwa gleich große Teile.
+    Geräte hinter einem gemeinsamen Listener (Adressierung 'unit') bleiben im selben Shard.
+    """
+    listeners = [[device for _, device in members] for members in main.group_listeners(devices).values()]
+    shard_count = max(1, min(shard_count, len(listeners)))
+    shards = [[] for _ in range(shard_count)]
+    assigned = 0
+    for members in listeners:
+        # Shard nach der Position des mittleren Geräts des Listeners
+        shards[(2 * assigned + len(members)) * shard_count // (2 * len(devices))].extend(members)
+        assigned += len(members)
+    return [shard for shard in shards if shard]
+
+
+# --- Worker-Prozess ---
+
+def _apply_commands(command_queue):
+    """Übernimmt weitergeleitete UI-Befehle in die lokalen Steuer-Dicts des Shards."""
+    while True:
+        command = command_queue.get()
+        if command is None:
+            return
+        kind = command[0]
+        if kind == 'inject_fault':
+            main.fault_flags[command[1]] = True
+        elif kind == 'wallbox':
+            _, instance_id, action, value = command
+            main.wallbox_commands.setdefault(instance_id, CommandQueue()).put(action, value)
+        elif kind == 'cycle_speed':
+            main.day_cycle_increment = command[1]
+
+
+def _report_status(shard_id, status_queue):
+    """
+    Meldet den Status und Startzustand aller Geräte des Shards und die Zähler
+    des FC3-Antwort-Caches und der Verbindungen periodisch an den Supervisor,
+    das erste Mal sobald alle Listener gebunden sind.
+    """
+    main.device_readiness.wait(STATUS_INTERVAL_SECONDS)
+    while True:
+        snapshot = main.ui_state.current
+        status_queue.put((shard_id, snapshot.sections["servers"], snapshot.sections["wallboxes"],
+                          main.device_readiness.states(), main.response_cache.counts(),
+                          main.connection_limits.counts()))
+        time.sleep(STATUS_INTERVAL_SECONDS)
+
+
+def run_shard(shard_id, devices, host_ips, endpoint_config, store_name, pv_engine, response_cache,
+              limits, status_queue, command_queue):
+    """
+    Einstiegspunkt eines Worker-Prozesses: bedient seine Geräte in einer
+    Event-Loop. limits: ConnectionLimits.settings() des Supervisors, die
+    Verbindungsgrenze je Prozess gilt damit je Shard.
+    """
+    main.RESPONSE_CACHE = response_cache
+    main.connection_limits = ConnectionLimits(**limits)
+    # Gleiche Flottenkonfiguration wie der Supervisor, damit device_index() und device_endpoint() übereinstimmen
+    main.PV_HOST_IPS, main.WALLBOX_HOST_IPS = host_ips
+    main.ADDRESSING, main.LISTEN_HOST, main.TCP_PORT = endpoint_config
+    device_count = len(main.PV_HOST_IPS) + len(main.WALLBOX_HOST_IPS)
+    main.register_store = SharedRegisterStore.attach(store_name, device_count, REGISTERS_PER_DEVICE)
+    for sim_type, instance_id, _ in devices:
+        if sim_type == 'pv':
+            main.fault_flags[instance_id] = False
+        else:
+            main.wallbox_commands[instance_id] = CommandQueue()
+
+    # Vor dem Statusmelder anmelden, damit dessen erste Meldung auf das Binden der Listener wartet
+    main.device_readiness.expect(main.device_label(sim_type, instance_id) for sim_type, instance_id, _ in devices)
+    for target, args in ((_apply_commands, (command_queue,)), (_report_status, (shard_id, status_queue))):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    print(f"[Shard {shard_id}] PID {os.getpid()} startet {len(devices)} Geräte.")
+    try:
+        asyncio.run(main.serve_all_async(pv_engine=pv_engine, devices=devices))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        main.register_store.close()
+
+
+# --- Supervisor ---
+
+class ShardSupervisor:
+    """Startet, überwacht und startet bei Bedarf die Worker-Prozesse neu."""
+
+    def __init__(self, shard_count, pv_engine='reference'):
+        self.context = multiprocessing.get_context('spawn')
+        self.devices = list(main.iter_devices())
+        self.shards = partition_devices(self.devices, shard_count)
+        self.pv_engine = pv_engine
+        self.status_queue = self.context.Queue()
+        self.command_queues = [self.context.Queue() for _ in self.shards]
+        self.processes = [None] * len(self.shards)
+        self.restart_counts = [0] * len(self.shards)
+        self.shard_by_device = {}
+        for shard_id, shard_devices in enumerate(self.shards):
+            for sim_type, instance_id, _ in shard_devices:
+                self.shard_by_device[(sim_type, instance_id)] = shard_id
+        self.last_cycle_increment = main.day_cycle_increment
+        self.running = True
+        for instance_id, commands in main.wallbox_commands.items():
+            commands.connect(functools.partial(self.forward_wallbox_commands, instance_id))
+
+    def start_shard(self, shard_id):
+        process = self.context.Process(
+            target=run_shard,
+            name=f"shard-{shard_id}",
+            args=(shard_id, self.shards[shard_id], (main.PV_HOST_IPS, main.WALLBOX_HOST_IPS),
+                  (main.ADDRESSING, main.LISTEN_HOST, main.TCP_PORT), main.register_store.name,
+                  self.pv_engine, main.RESPONSE_CACHE, main.connection_limits.settings(), self.status_queue,
+                  self.command_queues[shard_id]),
+        )
+        main.device_readiness.expect(self.device_labels(shard_id))
+        process.daemon = True
+        process.start()
+        self.processes[shard_id] = process
+        # Neuer Shard startet mit der aktuellen Simulationsgeschwindigkeit
+        self.command_queues[shard_id].put(('cycle_speed', main.day_cycle_increment))
+
+    def mark_shard_down(self, shard_id, message):
+        for sim_type, instance_id, host_ip in self.shards[shard_id]:
+            main.set_device_status(host_ip, instance_id, sim_type, message, commit=False)
+        main.ui_state.commit()
+        main.device_readiness.failed(self.device_labels(shard_id), message)
+
+    def device_labels(self, shard_id):
+        return [main.device_label(sim_type, instance_id) for sim_type, instance_id, _ in self.shards[shard_id]]
+
+    def collect_status(self):
+        """Führt die Statusmeldungen (Rohwerte, Cache- und Verbindungszähler) der Shards im Supervisor zusammen."""
+        while self.running:
+            try:
+                shard_id, servers, wallboxes, readiness, cache_counts, connection_counts = self.status_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            main.device_readiness.update(readiness)
+            main.response_cache.remote[shard_id] = cache_counts
+            main.connection_limits.remote[shard_id] = connection_counts
+            main.ui_state.stage("servers", servers)
+            main.ui_state.stage("wallboxes", wallboxes)
+            main.ui_state.commit()
+
+    def forward_wallbox_commands(self, instance_id):
+        """Leitet Wallbox-Befehle aus dem Web-UI sofort an den zuständigen Shard weiter."""
+        shard_id = self.shard_by_device.get(('wallbox', instance_id))
+        for action, value in main.wallbox_commands[instance_id].drain():
+            if shard_id is not None:
+                self.command_queues[shard_id].put(('wallbox', instance_id, action, value))
+
+    def forward_controls(self):
+        """Leitet Befehle aus dem Web-UI (fault_flags, Geschwindigkeit) weiter."""
+        while self.running:
+            for instance_id, flag in list(main.fault_flags.items()):
+                if flag:
+                    main.fault_flags[instance_id] = False
+                    shard_id = self.shard_by_device.get(('pv', instance_id))
+                    if shard_id is not None:
+                        self.command_queues[shard_id].put(('inject_fault', instance_id))
+            if main.day_cycle_increment != self.last_cycle_increment:
+                self.last_cycle_increment = main.day_cycle_increment
+                for command_queue in self.command_queues:
+                    command_queue.put(('cycle_speed', self.last_cycle_increment))
+            time.sleep(FORWARD_INTERVAL_SECONDS)
+
+    def supervise(self):
+        """Überwacht die Shards und startet abgestürzte mit wachsender Wartezeit neu."""
+        restart_at = {}
+        while self.running:
+            now = time.monotonic()
+            for shard_id, process in enumerate(self.processes):
+                if shard_id in restart_at:
+                    if now >= restart_at[shard_id]:
+                        del restart_at[shard_id]
+                        self.restart_counts[shard_id] += 1
+                        print(f"Starte Shard {shard_id} neu ({self.restart_counts[shard_id]}. Neustart).")
+                        self.start_shard(shard_id)
+                elif not process.is_alive():
+                    delay = min(RESTART_DELAY_SECONDS * 2 ** self.restart_counts[shard_id],
+                                MAX_RESTART_DELAY_SECONDS)
+                    print(f"Shard {shard_id} (PID {process.pid}) beendet mit Code {process.exitcode}, "
+                          f"Neustart in {delay} s.")
+                    self.mark_shard_down(shard_id, f"Error: Shard {shard_id} abgestürzt")
+                    restart_at[shard_id] = now + delay
+            time.sleep(0.5)
+
+    def run(self):
+        for shard_id, shard_devices in enumerate(self.shards):
+            for sim_type, instance_id, host_ip in shard_devices:
+                main.init_device_status(host_ip, instance_id, sim_type, commit=False)
+            main.ui_state.commit()
+            self.start_shard(shard_id)
+            print(f"Shard {shard_id} mit {len(shard_devices)} Geräten gestartet (PID {self.processes[shard_id].pid}).")
+
+        for target in (self.collect_status, self.forward_controls):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+        if main.meter_datablock is not None:
+            # Die Summen entstehen aus den Statusmeldungen der Shards, daher bedient der Supervisor den Zähler
+            main.device_readiness.expect([main.device_label('meter', 1)])
+            thread = threading.Thread(target=main.serve_listener, args=main.meter_listener())
+            thread.daemon = True
+            thread.start()
+
+        print(f"{len(self.devices)} Geräte auf {len(self.shards)} Prozesse verteilt.")
+        print("Drücken Sie Strg+C zum Beenden.")
+        try:
+            self.supervise()
+        except KeyboardInterrupt:
+            print("Shards werden heruntergefahren...")
+        finally:
+            self.running = False
+            for process in self.processes:
+                if process is not None and process.is_alive():
+                    process.terminate()
+            for process in self.processes:
+                if process is not None:
+                    process.join(timeout=5)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PV- und Wallbox-Simulator, verteilt auf mehrere Prozesse")
+    parser.add_argument('--shards', type=int, default=os.cpu_count() or 1,
+                        help="Anzahl der Worker-Prozesse (Standard: Anzahl CPU-Kerne)")
+    parser.add_argument('--pv-engine', choices=['reference', 'vector'], default='reference',
+                        help="Simulations-Engine für die PV-Wechselrichter in jedem Shard")
+    main.add_addressing_arguments(parser)
+    main.add_serving_arguments(parser)
+    args = parser.parse_args(argv)
+    main.apply_addressing_arguments(parser, args)
+    return args
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    main.apply_serving_arguments(args)
+    for i in range(len(main.PV_HOST_IPS)):
+        main.fault_flags[i + 1] = False
+    for i in range(len(main.WALLBOX_HOST_IPS)):
+        main.wallbox_commands[i + 1] = CommandQueue()
+
+    main.create_register_store()
+    if args.meter:
+        main.enable_meter()
+    try:
+        ui_thread = threading.Thread(target=main.run_flask_app)
+        ui_thread.daemon = True
+        ui_thread.start()
+        ShardSupervisor(args.shards, args.pv_engine).run()
+    finally:
+        main.register_store.close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Gemeinsamer Registerspeicher für die ganze Flotte in einem SharedMemory-Segment.
+
+Alle Geräte teilen sich ein zusammenhängendes uint16-Array; jedes Gerät ist
+ein Fenster mit festem Offset (REGISTERS_PER_DEVICE Register) in diesem Array.
+SharedMemoryDataBlock stellt ein solches Fenster als pymodbus-Datenblock bereit.
+Simulations-Worker in anderen Prozessen können über attach() dieselben Register
+beschreiben, die die Modbus-Server lesen, ohne Pickling oder Kopien.
+
+Hinweis: Schreiben und Lesen innerhalb eines Prozesses ist durch den GIL je
+setValues-Aufruf atomar. Zwischen Prozessen gibt es keine Sperre; ein Leser
+kann in seltenen Fällen einen Block sehen, der gerade beschrieben wird.
+"""
+
+from array import array
+from multiprocessing import shared_memory
+
+from pymodbus.constants import ExcCodes
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+REGISTERS_PER_DEVICE = 100
+REGISTER_BYTES = 2
+
+
+class SharedRegisterStore:
+    """
+    SharedMemory-Segment mit device_count * registers_per_device Registern.
+    create() legt ein neues Segment an, attach() öffnet ein bestehendes per Name.
+    """
+
+    def __init__(self, shm, device_count, registers_per_device=REGISTERS_PER_DEVICE, owner=False):
+        self.shm = shm
+        self.device_count = device_count
+        self.registers_per_device = registers_per_device
+        self.owner = owner
+        self.registers = shm.buf.cast('H')[:device_count * registers_per_device]
+
+    @classmethod
+    def create(cls, device_count, registers_per_device=REGISTERS_PER_DEVICE, name=None):
+        size = max(device_count * registers_per_device * REGISTER_BYTES, 1)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        return cls(shm, device_count, registers_per_device, owner=True)
+
+    @classmethod
+    def attach(cls, name, device_count, registers_per_device=REGISTERS_PER_DEVICE):
+        # Nur der Ersteller gibt das Segment frei. Mit multiprocessing gestartete
+        # Worker teilen sich den resource_tracker des Erstellers; fremde Prozesse
+        # dürfen das Segment ab Python 3.13 gar nicht erst beim Tracker anmelden.
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, device_count, registers_per_device, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def device_view(self, index):
+        """Liefert das Registerfenster (memoryview, uint16) für Gerät index."""
+        if not 0 <= index < self.device_count:
+            raise IndexError(f"Geräteindex {index} außerhalb von 0..{self.device_count - 1}")
+        start = index * self.registers_per_device
+        return self.registers[start:start + self.registers_per_device]
+
+    def as_array(self):
+        """NumPy-Sicht (device_count x registers_per_device) ohne Kopie, z.B. für PvFleet."""
+        import numpy as np
+        return np.ndarray((self.device_count, self.registers_per_device), dtype=np.uint16,
+                          buffer=self.shm.buf)
+
+    def datablock(self, index):
+        return SharedMemoryDataBlock(self, index)
+
+    def close(self):
+        """Gibt das Segment frei (Ersteller) bzw. löst die Verbindung (attach)."""
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.registers.release()
+            self.shm.close()
+        except BufferError:
+            pass # Es existieren noch Sichten (z.B. as_array); die Abbildung endet mit dem Prozess
+
+
+class SharedMemoryDataBlock(ModbusSequentialDataBlock):
+    """
+    Holding-Register-Block von Gerät index in einem SharedRegisterStore.
+    Adressierung wie ModbusSequentialDataBlock(0, [0] * 100). Der Block hält
+    keine dauerhafte Sicht, sondern adressiert den Speicher bei jedem Zugriff.
+    version zählt die Schreibzugriffe dieses Prozesses (response_cache.py).
+    """
+
+    def __init__(self, store, index, address=0):
+        store.device_view(index).release() # prüft den Index
+        self.store = store
+        self.offset = index * store.registers_per_device
+        self.size = store.registers_per_device
+        self.address = address
+        self.default_value = 0
+        self.version = 0
+
+    @property
+    def values(self):
+        return self.store.registers[self.offset:self.offset + self.size].tolist()
+
+    def reset(self):
+        self.store.registers[self.offset:self.offset + self.size] = array('H', bytes(self.size * REGISTER_BYTES))
+        self.version += 1
+
+    def getValues(self, address, count=1):
+        start = address - self.address
+        if start < 0 or self.size < start + count:
+            return ExcCodes.ILLEGAL_ADDRESS
+        start += self.offset
+        return self.store.registers[start:start + count].tolist()
+
+    def setValues(self, address, values):
+        if not isinstance(values, list):
+            values = [values]
+        start = address - self.address
+        if start < 0 or self.size < start + len(values):
+            return ExcCodes.ILLEGAL_ADDRESS
+        start += self.offset
+        try:
+            self.store.registers[start:start + len(values)] = array('H', values)
+        except (OverflowError, TypeError):
+            return ExcCodes.ILLEGAL_VALUE
+        self.version += 1
+        return None
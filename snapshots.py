@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Versionierte, unveränderliche Schnappschüsse der UI-Daten.
+
+Die Simulationen legen pro Gerät nur noch Rohwerte (Zahlen) ab: stage() merkt
+Änderungen vor, commit() baut daraus einen neuen Snapshot und tauscht die
+Referenz in einem Schritt aus (einmal pro Takt statt einmal pro Gerät).
+Leser holen sich store.current ohne Sperre und sehen immer einen vollständigen,
+konsistenten Stand. Aus den Änderungen abgeleitete Einzelwerte (z.B. die
+Summen aus aggregate.py) berechnet derive() im selben commit(). Abgeleitete
+Darstellungen (formatierte Werte, fertige JSON-Bytes für /data) berechnet
+Snapshot.cached() erst bei Bedarf und nur einmal pro Version, egal wie viele
+Clients abfragen.
+"""
+
+import threading
+
+
+class Snapshot:
+    """
+    Ein Stand der UI-Daten. sections: Abschnitt -> {Geräte-ID: Rohwerte-Dict},
+    values: einfache Einzelwerte. Wird nach dem Veröffentlichen nicht mehr verändert.
+    """
+
+    __slots__ = ("version", "sections", "values", "_cache")
+
+    def __init__(self, version, sections, values):
+        self.version = version
+        self.sections = sections
+        self.values = values
+        self._cache = {}
+
+    def cached(self, name, build):
+        """Liefert build(self), beim ersten Aufruf je Version berechnet und zwischengespeichert."""
+        try:
+            return self._cache[name]
+        except KeyError:
+            # Rechnen zwei Leser gleichzeitig, gewinnt einfach das letzte (gleiche) Ergebnis
+            result = self._cache[name] = build(self)
+            return result
+
+
+class SnapshotStore:
+    """
+    Copy-on-Write-Ablage für Snapshots. Nur Schreiber sperren untereinander;
+    Leser lesen store.current (ein atomarer Attributzugriff). lock ersetzt die
+    Schreibsperre, z.B. durch eine messende metrics.TimedLock. derive(sections,
+    pending) bekommt bei jedem commit() mit vorgemerkten Änderungen die bisherigen
+    Abschnitte und die Änderungen und liefert zusätzliche Einzelwerte.
+    """
+
+    def __init__(self, sections, values=None, lock=None, derive=None):
+        self.current = Snapshot(0, {name: {} for name in sections}, dict(values or {}))
+        self.pending = {}
+        self.lock = lock or threading.Lock()
+        self.derive = derive
+
+    def stage(self, section, updates):
+        """Merkt geänderte Geräte-Dicts für den nächsten commit() vor."""
+        with self.lock:
+            self.pending.setdefault(section, {}).update(updates)
+
+    def commit(self, **values):
+        """Veröffentlicht alle vorgemerkten Änderungen (und Einzelwerte) als neue Version."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            current = self.current
+            if pending and self.derive is not None:
+                values = {**values, **self.derive(current.sections, pending)}
+            changed_values = {key: value for key, value in values.items()
+                              if current.values.get(key) != value}
+            if not pending and not changed_values:
+                return current
+            sections = dict(current.sections)
+            for section, updates in pending.items():
+                sections[section] = {**sections.get(section, {}), **updates}
+            snapshot = Snapshot(current.version + 1, sections,
+                                {**current.values, **changed_values} if changed_values else current.values)
+            self.current = snapshot
+            return snapshot
+
+    def publish(self, section, updates):
+        """stage() und commit() in einem Schritt, für einzelne Änderungen außerhalb des Takts."""
+        self.stage(section, updates)
+        return self.commit()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Auslieferung des Web-UI und der JSON-API.
+
+serve() startet die Flask-App mit einem Produktionsserver: waitress (ein
+Pool von Worker-Threads hinter einer asynchronen I/O-Schleife, falls
+installiert) oder dem Thread-Server von werkzeug ohne Debugger. 'dev' ist
+der Flask-Entwicklungsserver mit debug=True wie bisher.
+
+json_response() liefert fertig serialisierte Bytes mit ETag und beantwortet
+ein passendes If-None-Match mit 304, bevor die Antwort gebaut wird. Nimmt der
+Client gzip an, geht die Antwort ab GZIP_MIN_BYTES komprimiert hinaus.
+
+Jeder offene Live-Stream (/stream) hält einen Worker-Thread. stream_limit()
+begrenzt die Streams bei waitress so, dass immer FREE_THREADS Worker für
+/data, /ready, /metrics und die Steuerung frei bleiben.
+"""
+
+import gzip
+import importlib.util
+import os
+import time
+
+from flask import Response, request
+
+SERVERS = ("waitress", "threaded", "dev")
+DEFAULT_THREADS = 16
+FREE_THREADS = 4 # Worker von waitress, die nie ein Live-Stream belegt
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Trennt die ETags verschiedener Prozessläufe, die Snapshot-Versionen beginnen nach einem Neustart wieder bei 0
+BOOT_ID = f"{os.getpid():x}{int(time.time()):x}"
+
+
+def compress(body):
+    """gzip ohne Zeitstempel, damit gleiche Bytes gleich komprimiert werden."""
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def json_response(tag, body, compressed=None):
+    """
+    tag kennzeichnet den Inhalt eindeutig (z.B. die Snapshot-Version), body()
+    liefert die JSON-Bytes, compressed() optional die zwischengespeicherte
+    gzip-Fassung davon (sonst wird body() bei Bedarf komprimiert).
+    """
+    use_gzip = request.accept_encodings["gzip"] > 0
+    etag = f"{BOOT_ID}-{tag}-gzip" if use_gzip else f"{BOOT_ID}-{tag}"
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+    data = body()
+    if use_gzip and len(data) >= GZIP_MIN_BYTES:
+        data = compressed() if compressed is not None else compress(data)
+        headers["Content-Encoding"] = "gzip"
+    response = Response(data, mimetype="application/json", headers=headers)
+    response.set_etag(etag)
+    return response
+
+
+def stream_limit(server, threads, requested):
+    """
+    Höchstzahl gleichzeitiger Live-Streams für serve(server, threads=threads);
+    requested ist die gewünschte Zahl (None: unbegrenzt). Die Server von
+    werkzeug starten je Verbindung einen eigenen Thread.
+    """
+    if server == "waitress" and importlib.util.find_spec("waitress") is not None:
+        available = max(threads - FREE_THREADS, 0)
+        return available if requested is None else min(requested, available)
+    return requested
+
+
+def serve(app, host, port, server="waitress", threads=DEFAULT_THREADS):
+    """
+    Blockiert, solange der Server läuft. Bei waitress hält jeder offene
+    Live-Stream (/stream) einen der threads Worker-Threads, siehe stream_limit().
+    """
+    if server == "waitress":
+        try:
+            import waitress
+        except ImportError:
+            print("waitress ist nicht installiert, verwende den Thread-Server von werkzeug.")
+            server = "threaded"
+        else:
+            waitress.serve(app, host=host, port=port, threads=threads, ident=None, _quiet=True)
+            return
+    if server == "threaded":
+        from werkzeug.serving import make_server
+        make_server(host, port, app, threaded=True).serve_forever()
+    else:
+        app.run(host=host, port=port, debug=True, use_reloader=False)